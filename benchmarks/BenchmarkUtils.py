@@ -0,0 +1,154 @@
+#
+# File: BenchmarkUtils.py
+# Date:  19-Oct-2026
+#
+# Updates:
+##
+"""
+Common reporting for the benchmark scripts - latency summaries, JSON reports and comparison of a report
+with a baseline from an earlier commit.
+
+A report is a JSON document:
+
+    {"suite": "publisher",
+     "environment": {"python": ..., "pika": ..., "platform": ..., "commit": ..., "timestamp": ...},
+     "options": {...},
+     "results": [{"name": ..., "params": {...}, "count": ..., "elapsedSeconds": ..., "messagesPerSecond": ...,
+                  "latencyMs": {"mean": ..., "p50": ..., "p95": ..., "p99": ..., "max": ...}}, ...]}
+
+Results are matched between reports by name and params.
+
+This software was developed as part of the World Wide Protein Data Bank
+Common Deposition and Annotation System Project
+
+"""
+
+__docformat__ = "restructuredtext en"
+__license__ = "Creative Commons Attribution 3.0 Unported"
+__version__ = "V0.07"
+
+import json
+import logging
+import os
+import platform
+import subprocess
+import time
+
+import pika
+
+logger = logging.getLogger()
+
+
+def percentile(sortedValues, pct):
+    """Return the pct percentile of sortedValues by linear interpolation between closest ranks."""
+    if not sortedValues:
+        return None
+    rank = (len(sortedValues) - 1) * pct / 100.0
+    lower = int(rank)
+    upper = min(lower + 1, len(sortedValues) - 1)
+    return sortedValues[lower] + (sortedValues[upper] - sortedValues[lower]) * (rank - lower)
+
+
+def summarizeLatencies(latencies):
+    """Return mean, p50, p95, p99 and max of latencies (seconds) in milliseconds."""
+    values = sorted(latencies)
+    if not values:
+        return {"mean": None, "p50": None, "p95": None, "p99": None, "max": None}
+    return {
+        "mean": round(1000.0 * sum(values) / len(values), 4),
+        "p50": round(1000.0 * percentile(values, 50), 4),
+        "p95": round(1000.0 * percentile(values, 95), 4),
+        "p99": round(1000.0 * percentile(values, 99), 4),
+        "max": round(1000.0 * values[-1], 4),
+    }
+
+
+def summarize(name, params, latencies, elapsed, **extra):
+    """Return the result of a benchmark case -
+
+    :param str name: case name
+    :param dict params: case parameters
+    :param latencies: per message latencies in seconds
+    :param float elapsed: wall clock seconds for the whole case
+    :param extra: additional result fields
+
+    """
+    result = {
+        "name": name,
+        "params": params,
+        "count": len(latencies),
+        "elapsedSeconds": round(elapsed, 4),
+        "messagesPerSecond": round(len(latencies) / elapsed, 1) if elapsed > 0 else None,
+        "latencyMs": summarizeLatencies(latencies),
+    }
+    result.update(extra)
+    return result
+
+
+def getEnvironment():
+    commit = None
+    try:
+        output = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)), stderr=subprocess.DEVNULL)  # noqa: S603,S607
+        commit = output.decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        pass
+    return {
+        "python": platform.python_version(),
+        "pika": pika.__version__,
+        "platform": platform.platform(),
+        "cpuCount": os.cpu_count(),
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+
+def writeReport(filePath, suite, options, results):
+    """Write the JSON report of a benchmark run to filePath and return it."""
+    report = {"suite": suite, "environment": getEnvironment(), "options": options, "results": results}
+    with open(filePath, "w") as ofh:
+        json.dump(report, ofh, indent=2)
+    logger.info("Wrote %s benchmark report %s", suite, filePath)
+    return report
+
+
+def readReport(filePath):
+    with open(filePath) as ifh:
+        return json.load(ifh)
+
+
+def _resultKey(result):
+    return (result["name"], json.dumps(result["params"], sort_keys=True))
+
+
+def _formatParams(params):
+    return " ".join("%s=%s" % (ky, params[ky]) for ky in sorted(params))
+
+
+def formatResults(results):
+    """Return a text table of results."""
+    lines = ["%-14s %-48s %10s %9s %9s %9s" % ("case", "params", "msg/s", "p50 ms", "p95 ms", "p99 ms")]
+    for result in results:
+        latency = result["latencyMs"]
+        lines.append(
+            "%-14s %-48s %10s %9s %9s %9s" % (result["name"], _formatParams(result["params"]), result["messagesPerSecond"], latency["p50"], latency["p95"], latency["p99"])
+        )
+    return "\n".join(lines)
+
+
+def compareReports(baseline, report):
+    """Return a text table comparing the throughput and p99 latency of report with a baseline report (ratios current / baseline)."""
+    baselineResults = {_resultKey(result): result for result in baseline["results"]}
+    lines = [
+        "baseline %s (%s) -> current %s (%s)"
+        % (baseline["environment"].get("commit"), baseline["environment"].get("timestamp"), report["environment"].get("commit"), report["environment"].get("timestamp")),
+        "%-14s %-48s %12s %12s" % ("case", "params", "msg/s ratio", "p99 ratio"),
+    ]
+    for result in report["results"]:
+        base = baselineResults.get(_resultKey(result))
+        if base is None:
+            lines.append("%-14s %-48s %12s %12s" % (result["name"], _formatParams(result["params"]), "new", "new"))
+            continue
+        rateRatio = result["messagesPerSecond"] / base["messagesPerSecond"] if base["messagesPerSecond"] else None
+        p99Ratio = result["latencyMs"]["p99"] / base["latencyMs"]["p99"] if base["latencyMs"]["p99"] else None
+        lines.append("%-14s %-48s %12s %12s" % (result["name"], _formatParams(result["params"]), "%.2f" % rateRatio if rateRatio else "-", "%.2f" % p99Ratio if p99Ratio else "-"))
+    return "\n".join(lines)
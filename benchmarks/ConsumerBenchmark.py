@@ -0,0 +1,327 @@
+#
+# File: ConsumerBenchmark.py
+# Date:  19-Oct-2026
+#
+# Updates:
+##
+"""
+End to end consumer benchmark - throughput and latency of MessageConsumerBase and MessageSubscriberBase
+across concurrency settings.
+
+Each configuration (consumer type, execution mode, number of workers, prefetch count, simulated handler
+cost and message size) is measured in two steps:
+
+    saturation  a burst of --count messages is published and the completion rate of the consumer is its
+                maximum throughput
+    load        for each --loads fraction, --count messages are published open loop at that fraction of
+                the maximum throughput and the achieved rate and end to end latency are recorded
+
+End to end latency runs from the publish of a message to the completion of its workerMethod call, as seen
+by workerCompleted() on the connection thread, so it includes the time spent queued in the broker and in the
+dispatcher.  The load points of a configuration form its saturation curve - latency stays close to the
+handler cost below saturation and grows with the backlog above it.
+
+MessageSubscriberBase processes messages in a single worker thread, so only its prefetch count is varied.
+
+By default the in-process broker (InMemoryBroker) is used; with --local the configurations run against
+RabbitMQ on localhost.
+
+    python benchmarks/ConsumerBenchmark.py --modes thread,process --workers 1,4 --costs 0,0.005 --output consumer.json
+    python benchmarks/ConsumerBenchmark.py --output current.json --compare consumer.json
+
+This software was developed as part of the World Wide Protein Data Bank
+Common Deposition and Annotation System Project
+
+"""
+
+__docformat__ = "restructuredtext en"
+__license__ = "Creative Commons Attribution 3.0 Unported"
+__version__ = "V0.07"
+
+import itertools
+import logging
+import sys
+import threading
+import time
+from optparse import OptionParser  # pylint: disable=deprecated-module
+
+import pika
+
+if __package__ is None or __package__ == "":
+    from os import path
+
+    sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
+    import BenchmarkUtils  # type: ignore[import-not-found] # pylint: disable=import-error
+else:
+    from . import BenchmarkUtils
+
+from wwpdb.utils.message_queue.InMemoryBroker import InMemoryBroker
+from wwpdb.utils.message_queue.MessageConsumerBase import MessageConsumerBase
+from wwpdb.utils.message_queue.MessageSubscriberBase import MessageSubscriberBase
+from wwpdb.utils.message_queue.MessageTransport import PikaTransport
+
+logger = logging.getLogger()
+
+QUEUE_NAME = "bench_consumer_queue"
+EXCHANGE_NAME = "bench_subscriber_exchange"
+SENT_HEADER = "x-bench-sent-us"
+
+
+def simulateCost(costSeconds, costMode="sleep"):
+    """Spend costSeconds in the handler - sleeping (I/O bound) or in a busy loop (CPU bound)."""
+    if costSeconds <= 0:
+        return
+    if costMode == "cpu":
+        deadline = time.perf_counter() + costSeconds
+        while time.perf_counter() < deadline:
+            pass
+    else:
+        time.sleep(costSeconds)
+
+
+class LatencyRecorder:
+    """Collect the end to end latency of completed messages from their publish time header."""
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__done = threading.Event()
+        self.reset(0)
+
+    def reset(self, expected):
+        with self.__lock:
+            self.latencies = []
+            self.failures = 0
+            self.lastCompletion = None
+            self.__expected = expected
+            self.__done.clear()
+
+    def record(self, properties, exc):
+        now = time.time()
+        sentUs = (properties.headers or {}).get(SENT_HEADER)
+        with self.__lock:
+            if exc is not None:
+                self.failures += 1
+            elif sentUs is not None:
+                self.latencies.append(max(0.0, now - sentUs / 1000000.0))
+            self.lastCompletion = now
+            if len(self.latencies) + self.failures >= self.__expected:
+                self.__done.set()
+
+    def wait(self, timeout):
+        return self.__done.wait(timeout)
+
+
+class SyntheticConsumer(MessageConsumerBase):
+    def __init__(self, recorder, costSeconds=0.0, costMode="sleep", prefetchCount=None, **kwargs):
+        super().__init__(**kwargs)
+        self.recorder = recorder
+        self.costSeconds = costSeconds
+        self.costMode = costMode
+        self.prefetchCount = prefetchCount
+
+    def __getstate__(self):
+        # The recorder stays in the parent process, where workerCompleted() is called
+        state = super().__getstate__()
+        state["recorder"] = None
+        return state
+
+    def openConsumer(self, connection, channel, executor=None, prefetchCount=None):
+        return super().openConsumer(connection, channel, executor=executor, prefetchCount=prefetchCount or self.prefetchCount)
+
+    def workerMethod(self, msgBody, deliveryTag=None):  # noqa: ARG002
+        simulateCost(self.costSeconds, self.costMode)
+        return True
+
+    def workerCompleted(self, properties, result, exc):  # noqa: ARG002
+        self.recorder.record(properties, exc)
+
+
+class SyntheticSubscriber(MessageSubscriberBase):
+    def __init__(self, recorder, costSeconds=0.0, costMode="sleep", **kwargs):
+        self.recorder = recorder
+        self.costSeconds = costSeconds
+        self.costMode = costMode
+        super().__init__(**kwargs)
+
+    def workerMethod(self, msgBody, deliveryTag=None):  # noqa: ARG002
+        simulateCost(self.costSeconds, self.costMode)
+        return True
+
+    def workerCompleted(self, properties, result, exc):  # noqa: ARG002
+        self.recorder.record(properties, exc)
+
+
+class ConsumerBenchmark:
+    """Run the consumer benchmark configurations -
+
+    :param bool local: run against RabbitMQ on localhost rather than the in-process broker
+    :param int count: messages published per measurement
+    :param int warmup: messages processed before measuring each configuration
+    :param float timeout: seconds to wait for the messages of a measurement to complete
+
+    """
+
+    def __init__(self, local=False, count=500, warmup=20, timeout=120.0):
+        self.__local = local
+        self.__count = count
+        self.__warmup = warmup
+        self.__timeout = timeout
+
+    def run(self, configs, loads=(0.5, 0.9, 1.0, 1.1)):
+        """Measure each configuration (dict of the getConfigs() keys) and return the list of results."""
+        results = []
+        for config in configs:
+            results.extend(self.runConfig(config, loads))
+        return results
+
+    @staticmethod
+    def getConfigs(types, modes, workers, prefetches, costs, costMode, sizes):
+        """Return the configurations for the product of the settings, without repeating subscriber configurations."""
+        configs = []
+        for consumerType, mode, numWorkers, prefetch, cost, size in itertools.product(types, modes, workers, prefetches, costs, sizes):
+            if consumerType == "subscriber":
+                mode, numWorkers = "thread", 1
+            config = {"type": consumerType, "mode": mode, "workers": numWorkers, "prefetch": prefetch, "cost": cost, "costMode": costMode, "size": size}
+            if config not in configs:
+                configs.append(config)
+        return configs
+
+    def runConfig(self, config, loads):
+        """Return the saturation result and the result at each load fraction for config."""
+        transport = PikaTransport() if self.__local else InMemoryBroker()
+        recorder = LatencyRecorder()
+        if config["type"] == "subscriber":
+            consumer = SyntheticSubscriber(
+                recorder, costSeconds=config["cost"], costMode=config["costMode"], amqpUrl="", local=self.__local, transport=transport, prefetchCount=config["prefetch"] or 1
+            )
+            consumer.add_exchange(EXCHANGE_NAME)
+            exchange, routingKey = EXCHANGE_NAME, "subscriber_routing_key"
+
+            def isReady():
+                return bool(consumer._channel.consumer_tags)  # noqa: SLF001 pylint: disable=protected-access
+
+            def stopFn():
+                consumer._connection.add_callback_threadsafe(consumer._channel.stop_consuming)  # noqa: SLF001 pylint: disable=protected-access
+
+        else:
+            consumer = SyntheticConsumer(
+                recorder, costSeconds=config["cost"], costMode=config["costMode"], prefetchCount=config["prefetch"], amqpUrl="", local=self.__local, transport=transport
+            )
+            consumer.setQueue(QUEUE_NAME, None)
+            consumer.setExecutionMode(config["mode"], numWorkers=config["workers"])
+            exchange, routingKey = "", QUEUE_NAME
+            isReady = consumer.isConsuming
+
+            def stopFn():
+                consumer.requestDrain(timeout=self.__timeout)
+
+        thread = threading.Thread(target=consumer.run, name="BenchmarkConsumer")
+        thread.start()
+        connection = transport.connect(local=True)
+        results = []
+        try:
+            deadline = time.time() + self.__timeout
+            while not isReady() and thread.is_alive() and time.time() < deadline:
+                time.sleep(0.01)
+            if not isReady():
+                logger.error("Consumer %r did not start", config)
+                return results
+            channel = connection.channel()
+            body = b"x" * config["size"]
+            # Warm up the workers (process pools start their processes on the first messages)
+            self.__measure(connection, channel, exchange, routingKey, body, recorder, self.__warmup, None)
+            saturation = self.__measure(connection, channel, exchange, routingKey, body, recorder, self.__count, None)
+            results.append(BenchmarkUtils.summarize(config["type"], dict(config, load="max"), *saturation[:2], **saturation[2]))
+            maxRate = results[-1]["messagesPerSecond"]
+            logger.info("%r saturates at %s msg/s", config, maxRate)
+            for load in loads:
+                if results[-1]["timedOut"] or not maxRate:
+                    break
+                offeredRate = load * maxRate
+                point = self.__measure(connection, channel, exchange, routingKey, body, recorder, self.__count, offeredRate)
+                results.append(BenchmarkUtils.summarize(config["type"], dict(config, load=load), *point[:2], offeredRate=round(offeredRate, 1), **point[2]))
+                logger.info("%r at %.1f msg/s offered: %s msg/s p99 %s ms", config, offeredRate, results[-1]["messagesPerSecond"], results[-1]["latencyMs"]["p99"])
+        finally:
+            stopFn()
+            thread.join(self.__timeout)
+            connection.close()
+            if self.__local:
+                self.__cleanup(transport, config["type"])
+        return results
+
+    def __measure(self, connection, channel, exchange, routingKey, body, recorder, count, rate):
+        """Publish count messages (a burst, or open loop at rate messages per second) and wait for them to complete.
+
+        :returns: (latencies, elapsed seconds from the first publish to the last completion, extra result fields)
+
+        """
+        recorder.reset(count)
+        startTime = time.time()
+        for ii in range(count):
+            if rate:
+                delay = startTime + ii / rate - time.time()
+                if delay > 0:
+                    connection.sleep(delay)
+            properties = pika.BasicProperties(headers={SENT_HEADER: int(time.time() * 1000000)})
+            channel.basic_publish(exchange=exchange, routing_key=routingKey, body=body, properties=properties)
+        timedOut = not recorder.wait(self.__timeout)
+        if timedOut:
+            logger.error("Timed out with %d of %d messages complete", len(recorder.latencies) + recorder.failures, count)
+        elapsed = (recorder.lastCompletion or time.time()) - startTime
+        return list(recorder.latencies), elapsed, {"failures": recorder.failures, "timedOut": timedOut}
+
+    @staticmethod
+    def __cleanup(transport, consumerType):
+        connection = transport.connect(local=True)
+        channel = connection.channel()
+        if consumerType == "subscriber":
+            channel.exchange_delete(exchange=EXCHANGE_NAME)
+        else:
+            channel.queue_delete(queue=QUEUE_NAME)
+        connection.close()
+
+
+def main():
+    usage = "usage: %prog [options]"
+    parser = OptionParser(usage)
+    parser.add_option("--local", default=False, action="store_true", help="run against RabbitMQ on localhost (default the in-process broker)")
+    parser.add_option("--count", default=500, type="int", help="messages published per measurement (default=500)")
+    parser.add_option("--warmup", default=20, type="int", help="messages processed before measuring each configuration (default=20)")
+    parser.add_option("--timeout", default=120.0, type="float", help="seconds to wait for the messages of a measurement (default=120)")
+    parser.add_option("--types", default="consumer,subscriber", help="comma separated consumer types - consumer, subscriber (default=consumer,subscriber)")
+    parser.add_option("--modes", default="thread,process", help="comma separated execution modes of MessageConsumerBase (default=thread,process)")
+    parser.add_option("--workers", default="1,4", help="comma separated numbers of workers (default=1,4)")
+    parser.add_option("--prefetch", default="0", help="comma separated prefetch counts, 0 for the consumer default (default=0)")
+    parser.add_option("--costs", default="0,0.002", help="comma separated simulated handler costs in seconds (default=0,0.002)")
+    parser.add_option("--cost-mode", dest="costMode", default="sleep", help="handler cost as sleep (I/O bound) or cpu (busy loop) (default=sleep)")
+    parser.add_option("--sizes", default="1024", help="comma separated message sizes in bytes (default=1024)")
+    parser.add_option("--loads", default="0.5,0.9,1.0,1.1", help="comma separated fractions of the saturation rate offered open loop (default=0.5,0.9,1.0,1.1)")
+    parser.add_option("--output", default=None, help="write the JSON report to this file")
+    parser.add_option("--compare", default=None, help="compare with the JSON report of an earlier run")
+    options, _args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s [%(levelname)s]-%(module)s.%(funcName)s: %(message)s")
+    configs = ConsumerBenchmark.getConfigs(
+        options.types.split(","),
+        options.modes.split(","),
+        [int(numWorkers) for numWorkers in options.workers.split(",")],
+        [int(prefetch) for prefetch in options.prefetch.split(",")],
+        [float(cost) for cost in options.costs.split(",")],
+        options.costMode,
+        [int(size) for size in options.sizes.split(",")],
+    )
+    loads = [float(load) for load in options.loads.split(",")]
+    benchmark = ConsumerBenchmark(local=options.local, count=options.count, warmup=options.warmup, timeout=options.timeout)
+    results = benchmark.run(configs, loads=loads)
+    print(BenchmarkUtils.formatResults(results))  # noqa: T201
+    runOptions = {"local": options.local, "count": options.count, "warmup": options.warmup, "configs": configs, "loads": loads}
+    if options.output:
+        report = BenchmarkUtils.writeReport(options.output, "consumer", runOptions, results)
+    else:
+        report = {"suite": "consumer", "environment": {}, "options": runOptions, "results": results}
+    if options.compare:
+        print(BenchmarkUtils.compareReports(BenchmarkUtils.readReport(options.compare), report))  # noqa: T201
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+#
+# File: PublisherBenchmark.py
+# Date:  19-Oct-2026
+#
+# Updates:
+##
+"""
+Publisher throughput and latency benchmark.
+
+Sweeps message sizes over the publish paths of the package and reports messages per second and
+p50/p95/p99 publish latency for each case:
+
+    publish        MessagePublisher.publish() - a connection per message, with and without priority
+    publishDirect  MessagePublisher.publishDirect() to a direct, topic (routingKey) or headers exchange
+    channel        basic_publish on one long-lived channel, the path used by pipeline stages
+                   (StageContext), transient or persistent and with or without publisher confirms
+
+By default the in-process broker (InMemoryBroker) is used, so the results measure the client side
+with no network; with --local the cases run against RabbitMQ on localhost.
+
+    python benchmarks/PublisherBenchmark.py --count 2000 --sizes 64,4096,65536 --output publisher.json
+    python benchmarks/PublisherBenchmark.py --output current.json --compare publisher.json
+
+This software was developed as part of the World Wide Protein Data Bank
+Common Deposition and Annotation System Project
+
+"""
+
+__docformat__ = "restructuredtext en"
+__license__ = "Creative Commons Attribution 3.0 Unported"
+__version__ = "V0.07"
+
+import logging
+import sys
+import time
+from optparse import OptionParser  # pylint: disable=deprecated-module
+
+import pika
+
+if __package__ is None or __package__ == "":
+    from os import path
+
+    sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
+    import BenchmarkUtils  # type: ignore[import-not-found] # pylint: disable=import-error
+else:
+    from . import BenchmarkUtils
+
+from wwpdb.utils.message_queue.InMemoryBroker import InMemoryBroker
+from wwpdb.utils.message_queue.MessagePublisher import MessagePublisher
+from wwpdb.utils.message_queue.MessageTransport import PikaTransport
+
+logger = logging.getLogger()
+
+EXCHANGE_NAME = "bench_exchange"
+ROUTING_KEY = "bench_routing_key"
+
+
+class PublisherBenchmark:
+    """Run the publisher benchmark cases -
+
+    :param bool local: run against RabbitMQ on localhost rather than the in-process broker
+    :param int count: messages published per case
+    :param int warmup: messages published before timing each case
+
+    """
+
+    def __init__(self, local=False, count=1000, warmup=20):
+        self.__local = local
+        self.__count = count
+        self.__warmup = warmup
+
+    def run(self, sizes, cases=("publish", "publishDirect", "channel")):
+        """Run the selected cases for each message size and return the list of results."""
+        results = []
+        for size in sizes:
+            body = b"x" * size
+            if "publish" in cases:
+                for priority in (None, 5):
+                    results.append(self.__runPublish(body, priority))
+            if "publishDirect" in cases:
+                for exchangeType in ("direct", "topic", "headers"):
+                    results.append(self.__runPublishDirect(body, exchangeType))
+            if "channel" in cases:
+                for deliveryMode in (1, 2):
+                    for confirm in (False, True):
+                        results.append(self.__runChannel(body, deliveryMode, confirm))
+        return results
+
+    def __newTransport(self):
+        # A fresh in-process broker per case so queued messages do not carry over
+        return PikaTransport() if self.__local else InMemoryBroker()
+
+    def __timeCalls(self, name, params, publishFn):
+        for _ in range(self.__warmup):
+            publishFn()
+        latencies = []
+        failures = 0
+        startTime = time.perf_counter()
+        for _ in range(self.__count):
+            callStart = time.perf_counter()
+            ok = publishFn()
+            latencies.append(time.perf_counter() - callStart)
+            if ok is False:
+                failures += 1
+        elapsed = time.perf_counter() - startTime
+        result = BenchmarkUtils.summarize(name, params, latencies, elapsed, failures=failures)
+        logger.info("%s %r: %s msg/s p99 %s ms", name, params, result["messagesPerSecond"], result["latencyMs"]["p99"])
+        return result
+
+    def __runPublish(self, body, priority):
+        transport = self.__newTransport()
+        queueName = "bench_publish_queue" if priority is None else "bench_publish_priority_queue"
+        publisher = MessagePublisher(local=True, transport=transport)
+        try:
+            return self.__timeCalls(
+                "publish",
+                {"size": len(body), "priority": priority},
+                lambda: publisher.publish(body, exchangeName=EXCHANGE_NAME, queueName=queueName, routingKey=ROUTING_KEY, priority=priority),
+            )
+        finally:
+            self.__cleanup(transport, queues=[queueName], exchanges=[EXCHANGE_NAME])
+
+    def __runPublishDirect(self, body, exchangeType):
+        transport = self.__newTransport()
+        exchangeName = "bench_%s_exchange" % exchangeType
+        queueName = "bench_direct_queue"
+        routingKey = "bench.deposition.uploaded" if exchangeType == "topic" else None
+        headers = {"site": "bench"} if exchangeType == "headers" else None
+        # Bind a sink queue the way a subscriber would, so that every message is routed
+        connection = transport.connect(local=True)
+        channel = connection.channel()
+        channel.exchange_declare(exchange=exchangeName, exchange_type=exchangeType, durable=True, auto_delete=False)
+        channel.queue_declare(queue=queueName, durable=True)
+        if exchangeType == "headers":
+            channel.queue_bind(exchange=exchangeName, queue=queueName, routing_key="", arguments={"site": "bench", "x-match": "all"})
+        else:
+            channel.queue_bind(exchange=exchangeName, queue=queueName, routing_key="bench.#" if exchangeType == "topic" else "subscriber_routing_key")
+        connection.close()
+        publisher = MessagePublisher(local=True, transport=transport)
+        try:
+            return self.__timeCalls(
+                "publishDirect",
+                {"size": len(body), "exchangeType": exchangeType},
+                lambda: publisher.publishDirect(body, exchangeName, routingKey=routingKey, headers=headers),
+            )
+        finally:
+            self.__cleanup(transport, queues=[queueName], exchanges=[exchangeName])
+
+    def __runChannel(self, body, deliveryMode, confirm):
+        transport = self.__newTransport()
+        queueName = "bench_channel_queue"
+        connection = transport.connect(local=True)
+        channel = connection.channel()
+        channel.queue_declare(queue=queueName, durable=True)
+        if confirm:
+            channel.confirm_delivery()
+        properties = pika.BasicProperties(delivery_mode=deliveryMode)
+
+        def publishFn():
+            channel.basic_publish(exchange="", routing_key=queueName, body=body, properties=properties, mandatory=confirm)
+
+        try:
+            return self.__timeCalls("channel", {"size": len(body), "deliveryMode": deliveryMode, "confirm": confirm}, publishFn)
+        finally:
+            connection.close()
+            self.__cleanup(transport, queues=[queueName])
+
+    @staticmethod
+    def __cleanup(transport, queues=(), exchanges=()):
+        connection = transport.connect(local=True)
+        channel = connection.channel()
+        for queueName in queues:
+            channel.queue_delete(queue=queueName)
+        for exchangeName in exchanges:
+            channel.exchange_delete(exchange=exchangeName)
+        connection.close()
+
+
+def main():
+    usage = "usage: %prog [options]"
+    parser = OptionParser(usage)
+    parser.add_option("--local", default=False, action="store_true", help="run against RabbitMQ on localhost (default the in-process broker)")
+    parser.add_option("--count", default=1000, type="int", help="messages published per case (default=1000)")
+    parser.add_option("--warmup", default=20, type="int", help="messages published before timing each case (default=20)")
+    parser.add_option("--sizes", default="64,1024,16384,262144", help="comma separated message sizes in bytes (default=64,1024,16384,262144)")
+    parser.add_option("--cases", default="publish,publishDirect,channel", help="comma separated cases to run (default=publish,publishDirect,channel)")
+    parser.add_option("--output", default=None, help="write the JSON report to this file")
+    parser.add_option("--compare", default=None, help="compare with the JSON report of an earlier run")
+    options, _args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s [%(levelname)s]-%(module)s.%(funcName)s: %(message)s")
+    sizes = [int(size) for size in options.sizes.split(",")]
+    cases = options.cases.split(",")
+    results = PublisherBenchmark(local=options.local, count=options.count, warmup=options.warmup).run(sizes, cases=cases)
+    print(BenchmarkUtils.formatResults(results))  # noqa: T201
+    runOptions = {"local": options.local, "count": options.count, "warmup": options.warmup, "sizes": sizes, "cases": cases}
+    if options.output:
+        report = BenchmarkUtils.writeReport(options.output, "publisher", runOptions, results)
+    else:
+        report = {"suite": "publisher", "environment": {}, "options": runOptions, "results": results}
+    if options.compare:
+        print(BenchmarkUtils.compareReports(BenchmarkUtils.readReport(options.compare), report))  # noqa: T201
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+#
+# File: AsyncMessageConsumerBaseTests.py
+# Date:  19-Oct-2026
+#
+# Updates:
+#  19-Oct-2026       run against the in-process broker and cover acknowledgement, rejection and stop
+#  19-Oct-2026       acknowledgements on the event loop thread, no connection thread
+##
+"""
+Publish a set of messages and consume them concurrently with an AsyncMessageConsumerBase subclass.
+"""
+
+__docformat__ = "restructuredtext en"
+__license__ = "Creative Commons Attribution 3.0 Unported"
+__version__ = "V0.07"
+
+import asyncio
+import logging
+import sys
+import threading
+import time
+import unittest
+
+if __package__ is None or __package__ == "":
+    from os import path
+
+    sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
+    from commonsetup import TESTOUTPUT  # type: ignore[import-not-found] # pylint: disable=import-error,unused-import
+else:
+    from .commonsetup import TESTOUTPUT  # noqa: F401
+
+from wwpdb.utils.message_queue import MessageMetrics
+from wwpdb.utils.message_queue.AsyncMessageConsumerBase import AsyncMessageConsumerBase
+from wwpdb.utils.message_queue.InMemoryBroker import InMemoryBroker
+from wwpdb.utils.message_queue.MessagePublisher import MessagePublisher
+
+logging.basicConfig(level=logging.INFO, format="\n[%(levelname)s]-%(module)s.%(funcName)s: %(message)s")
+logger = logging.getLogger()
+
+
+class AsyncMessageConsumer(AsyncMessageConsumerBase):
+    def __init__(self, amqpUrl, maxConcurrency=10, transport=None):
+        super().__init__(amqpUrl, local=True, maxConcurrency=maxConcurrency, transport=transport)
+        self.received = []
+        self.acks = []
+        self.rejects = []
+        self.maxInFlight = 0
+
+    async def workerMethod(self, msgBody, deliveryTag=None):  # noqa: ARG002
+        self.maxInFlight = max(self.maxInFlight, self.getInFlightCount())
+        if msgBody == b"quit":
+            self.stop()
+            return True
+        await asyncio.sleep(0.25)
+        if msgBody == b"fail":
+            raise ValueError("bad message %s" % deliveryTag)
+        self.received.append(msgBody)
+        return True
+
+    def acknowledgeMessage(self, deliveryTag):
+        self.acks.append((deliveryTag, threading.current_thread().name))
+        super().acknowledgeMessage(deliveryTag)
+
+    def rejectMessage(self, deliveryTag, requeue=False):
+        self.rejects.append((deliveryTag, requeue))
+        super().rejectMessage(deliveryTag, requeue=requeue)
+
+
+class AsyncMessageConsumerBaseTests(unittest.TestCase):
+    exchangeName = "test_async_exchange"
+    queueName = "test_async_queue"
+    routingKey = "text_message"
+
+    def setUp(self):
+        self.__broker = InMemoryBroker()
+        self.__publisher = MessagePublisher(local=True, transport=self.__broker)
+
+    def tearDown(self):
+        MessageMetrics.REGISTRY.setEnabled(False)
+
+    def __publish(self, message):
+        self.assertTrue(self.__publisher.publish(message, exchangeName=self.exchangeName, queueName=self.queueName, routingKey=self.routingKey))
+
+    def __consumer(self):
+        mc = AsyncMessageConsumer("", maxConcurrency=10, transport=self.__broker)
+        mc.setQueue(queueName=self.queueName, routingKey=self.routingKey)
+        mc.setExchange(exchange=self.exchangeName, exchangeType="topic")
+        return mc
+
+    def testPublishConsume(self):
+        """Test case:  publish messages and consume them concurrently"""
+        numMessages = 20
+        startTime = time.time()
+        for ii in range(1, numMessages + 1):
+            self.__publish("Test message %5d" % ii)
+        self.__publish("quit")
+        mc = self.__consumer()
+        mc.run()
+        self.assertEqual(len(mc.received), numMessages)
+        self.assertGreater(mc.maxInFlight, 1)
+        # 20 messages sleeping 0.25 seconds each, 10 at a time
+        self.assertLess(time.time() - startTime, 2.5)
+        self.assertEqual(len(mc.acks), numMessages + 1)
+        # Acknowledged on the event loop, in the thread calling run()
+        self.assertEqual({name for _tag, name in mc.acks}, {threading.current_thread().name})
+        self.assertEqual(self.__broker.getQueueDepth(self.queueName), 0)
+
+    def testAcknowledgeReject(self):
+        """Test case:  a worker exception rejects the delivery without requeue, the others are acknowledged and counted"""
+        MessageMetrics.REGISTRY.setEnabled(True)
+        for message in ("one", "fail", "two", "quit"):
+            self.__publish(message)
+        mc = self.__consumer()
+        mc.run()
+        self.assertEqual(sorted(mc.received), [b"one", b"two"])
+        self.assertEqual(sorted(tag for tag, _name in mc.acks), [1, 3, 4])
+        self.assertEqual(mc.rejects, [(2, False)])
+        self.assertEqual(self.__broker.getQueueDepth(self.queueName), 0)
+        self.assertEqual(MessageMetrics.CONSUMED_MESSAGES.getValue(self.queueName), 4)
+        self.assertEqual(MessageMetrics.ACKS.getValue(self.queueName), 3)
+        self.assertEqual(MessageMetrics.NACKS.getValue(self.queueName, "false"), 1)
+        self.assertEqual(MessageMetrics.WORKER_SECONDS.getValue(self.queueName)[0], 4)
+        self.assertEqual(MessageMetrics.WORKER_IN_FLIGHT.getValue(self.queueName), 0)
+
+    def testStopFromThread(self):
+        """Test case:  stop() from another thread lets in-flight tasks finish and returns unstarted deliveries to the queue"""
+        for ii in range(30):
+            self.__publish("Test message %5d" % ii)
+        mc = self.__consumer()
+        threadsBefore = set(threading.enumerate())
+        thread = threading.Thread(target=mc.run, name="AsyncConsumerLoop")
+        thread.start()
+        deadline = time.time() + 5.0
+        while mc.getInFlightCount() < 10 and time.time() < deadline:
+            time.sleep(0.01)
+        # The connection is driven by the event loop - no other thread is started
+        self.assertEqual(set(threading.enumerate()) - threadsBefore, {thread})
+        mc.stop()
+        thread.join(10.0)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(len(mc.received), len(mc.acks))
+        self.assertEqual({name for _tag, name in mc.acks}, {"AsyncConsumerLoop"})
+        self.assertEqual(mc.rejects, [])
+        self.assertEqual(self.__broker.getQueueDepth(self.queueName), 30 - len(mc.acks))
+        self.assertLess(len(mc.acks), 30)
+
+
+def suiteAsyncConsumer():
+    suite = unittest.TestSuite()
+    suite.addTest(AsyncMessageConsumerBaseTests("testPublishConsume"))
+    suite.addTest(AsyncMessageConsumerBaseTests("testAcknowledgeReject"))
+    suite.addTest(AsyncMessageConsumerBaseTests("testStopFromThread"))
+    return suite
+
+
+if __name__ == "__main__":
+    runner = unittest.TextTestRunner(failfast=True)
+    runner.run(suiteAsyncConsumer())
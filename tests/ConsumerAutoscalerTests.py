@@ -0,0 +1,80 @@
+#
+# File: ConsumerAutoscalerTests.py
+# Date:  19-Oct-2026
+#
+# Updates:
+##
+"""
+Tests of the scaling decisions made by ConsumerAutoscaler from queue depth and worker utilization samples.
+"""
+
+__docformat__ = "restructuredtext en"
+__license__ = "Creative Commons Attribution 3.0 Unported"
+__version__ = "V0.07"
+
+import logging
+import sys
+import unittest
+
+if __package__ is None or __package__ == "":
+    from os import path
+
+    sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
+    from commonsetup import TESTOUTPUT  # type: ignore[import-not-found] # pylint: disable=import-error,unused-import
+else:
+    from .commonsetup import TESTOUTPUT  # noqa: F401
+
+from wwpdb.utils.message_queue.ConsumerAutoscaler import ConsumerAutoscaler
+
+logging.basicConfig(level=logging.INFO, format="\n[%(levelname)s]-%(module)s.%(funcName)s: %(message)s")
+logger = logging.getLogger()
+
+
+class ConsumerAutoscalerTests(unittest.TestCase):
+    def setUp(self):
+        self.__autoscaler = ConsumerAutoscaler(minWorkers=2, maxWorkers=8, scaleUpBacklog=2.0, upSamples=2, downSamples=3, cooldown=30.0)
+
+    def testScaleUp(self):
+        # A single backlog sample is not enough
+        self.assertEqual(self.__autoscaler.evaluate(100, 2, 2, now=0.0), 2)
+        self.assertEqual(self.__autoscaler.evaluate(100, 2, 2, now=5.0), 3)
+        # Within the cool down period the pool size is held
+        self.assertEqual(self.__autoscaler.evaluate(100, 3, 3, now=10.0), 3)
+        self.assertEqual(self.__autoscaler.evaluate(100, 3, 3, now=20.0), 3)
+        self.assertEqual(self.__autoscaler.evaluate(100, 3, 3, now=40.0), 5)
+        self.assertEqual(self.__autoscaler.evaluate(100, 5, 5, now=75.0), 5)
+        self.assertEqual(self.__autoscaler.evaluate(100, 5, 5, now=80.0), 8)
+        # Never beyond the upper bound
+        for ii in range(5):
+            self.assertEqual(self.__autoscaler.evaluate(100, 8, 8, now=200.0 + ii * 50.0), 8)
+
+    def testScaleDown(self):
+        self.assertEqual(self.__autoscaler.evaluate(0, 0, 4, now=0.0), 4)
+        self.assertEqual(self.__autoscaler.evaluate(0, 0, 4, now=5.0), 4)
+        self.assertEqual(self.__autoscaler.evaluate(0, 0, 4, now=10.0), 3)
+        for ii in range(3):
+            self.assertEqual(self.__autoscaler.evaluate(0, 0, 3, now=50.0 + ii * 5.0), 3 if ii < 2 else 2)
+        # Never below the lower bound
+        for ii in range(5):
+            self.assertEqual(self.__autoscaler.evaluate(0, 0, 2, now=100.0 + ii * 50.0), 2)
+
+    def testHysteresis(self):
+        # Busy workers with an empty queue - neither grow nor shrink
+        for ii in range(10):
+            self.assertEqual(self.__autoscaler.evaluate(0, 4, 4, now=ii * 5.0), 4)
+        # An intermittent backlog resets the growth count
+        for ii in range(10):
+            self.assertEqual(self.__autoscaler.evaluate(20 if ii % 2 else 1, 4, 4, now=100.0 + ii * 5.0), 4)
+
+
+def suiteAutoscaler():
+    suite = unittest.TestSuite()
+    suite.addTest(ConsumerAutoscalerTests("testScaleUp"))
+    suite.addTest(ConsumerAutoscalerTests("testScaleDown"))
+    suite.addTest(ConsumerAutoscalerTests("testHysteresis"))
+    return suite
+
+
+if __name__ == "__main__":
+    runner = unittest.TextTestRunner(failfast=True)
+    runner.run(suiteAutoscaler())
@@ -0,0 +1,188 @@
+#
+# File: ConsumerHostTests.py
+# Date:  19-Oct-2026
+#
+# Updates:
+#  19-Oct-2026       hosted consumers over the in-process broker, checking both queues and the lane weights
+##
+"""
+Tests of weighted scheduling in the shared worker pool and of several consumers hosted on one connection.
+"""
+
+__docformat__ = "restructuredtext en"
+__license__ = "Creative Commons Attribution 3.0 Unported"
+__version__ = "V0.07"
+
+import argparse
+import logging
+import sys
+import threading
+import time
+import unittest
+
+if __package__ is None or __package__ == "":
+    from os import path
+
+    sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
+    from commonsetup import TESTOUTPUT  # type: ignore[import-not-found] # pylint: disable=import-error,unused-import
+else:
+    from .commonsetup import TESTOUTPUT  # noqa: F401
+
+from wwpdb.utils.testing.Features import Features
+
+from wwpdb.utils.message_queue.ConsumerHost import ConsumerHost, WeightedWorkerPool
+from wwpdb.utils.message_queue.InMemoryBroker import InMemoryBroker
+from wwpdb.utils.message_queue.MessageConsumerBase import MessageConsumerBase
+from wwpdb.utils.message_queue.MessagePublisher import MessagePublisher
+from wwpdb.utils.message_queue.MessageQueueConnection import MessageQueueConnection
+
+logging.basicConfig(level=logging.INFO, format="\n[%(levelname)s]-%(module)s.%(funcName)s: %(message)s")
+logger = logging.getLogger()
+
+
+class WeightedWorkerPoolTests(unittest.TestCase):
+    def testWeightedOrder(self):
+        pool = WeightedWorkerPool(1)
+        order = []
+        release = threading.Event()
+        laneA = pool.addLane(weight=1, name="A")
+        laneB = pool.addLane(weight=3, name="B")
+        laneC = pool.addLane(weight=1, name="C")
+        # Hold the only thread while both lanes fill up
+        laneC.submit(release.wait)
+        time.sleep(0.1)
+        for _ in range(10):
+            laneA.submit(order.append, "A")
+            laneB.submit(order.append, "B")
+        release.set()
+        pool.shutdown(wait=True)
+        self.assertEqual(len(order), 20)
+        self.assertEqual(order[:8].count("B"), 6)
+        self.assertEqual(order[-4:], ["A", "A", "A", "A"])
+
+    def testLaneConcurrency(self):
+        pool = WeightedWorkerPool(4)
+        lane = pool.addLane()
+        lane.resize(2)
+        lock = threading.Lock()
+        counts = {"running": 0, "max": 0}
+
+        def work():
+            with lock:
+                counts["running"] += 1
+                counts["max"] = max(counts["max"], counts["running"])
+            time.sleep(0.05)
+            with lock:
+                counts["running"] -= 1
+            return True
+
+        futures = [lane.submit(work) for _ in range(8)]
+        self.assertTrue(all(future.result(timeout=5) for future in futures))
+        pool.shutdown(wait=True)
+        self.assertEqual(counts["max"], 2)
+
+
+class HostedConsumer(MessageConsumerBase):
+    def __init__(self, amqpUrl, local=False, transport=None):
+        super().__init__(amqpUrl, local=local, transport=transport)
+        self.received = []
+        self.served = []
+        self.host = None
+        self.workSeconds = 0.0
+
+    def workerMethod(self, msgBody, deliveryTag=None):  # noqa: ARG002
+        if msgBody == b"quit":
+            self.host.requestDrain(5.0)
+        else:
+            time.sleep(self.workSeconds)
+            self.received.append(msgBody)
+            self.served.append(self)
+        return True
+
+
+def hostConsumers(url, local=False, transport=None, numMessages=10, numWorkers=2, prefetchCount=None, workSeconds=0.0):
+    """Serve queues a (weight 1) and b (weight 2) from one host until b's quit message drains it.
+
+    Returns the two consumers and the consumers in the order their messages completed.
+
+    """
+    mp = MessagePublisher(local=local, transport=transport)
+    for queueName in ("test_host_queue_a", "test_host_queue_b"):
+        for ii in range(numMessages):
+            mp.publish("Test message %5d" % ii, exchangeName="test_host_exchange", queueName=queueName, routingKey=queueName)
+    mp.publish("quit", exchangeName="test_host_exchange", queueName="test_host_queue_b", routingKey="test_host_queue_b")
+
+    host = ConsumerHost(url, local=local, numWorkers=numWorkers, transport=transport)
+    consumers = []
+    served = []
+    for queueName, weight in (("test_host_queue_a", 1), ("test_host_queue_b", 2)):
+        mc = HostedConsumer(None, local=local, transport=transport)
+        mc.host = host
+        mc.served = served
+        mc.workSeconds = workSeconds
+        mc.setQueue(queueName=queueName, routingKey=queueName)
+        mc.setExchange(exchange="test_host_exchange", exchangeType="topic")
+        mc.setExecutionMode("thread", numWorkers=numWorkers)
+        host.addConsumer(mc, weight=weight, prefetchCount=prefetchCount)
+        consumers.append(mc)
+    host.run()
+    return consumers, served
+
+
+@unittest.skipUnless((len(sys.argv) > 1 and sys.argv[1] == "--local") or Features().haveRbmqTestServer(), "require Rbmq Test Environment")
+class ConsumerHostTests(unittest.TestCase):
+    LOCAL = False
+
+    def testHostConsumers(self):
+        """Test case:  two consumers with separate queues served over one connection"""
+        numMessages = 10
+        try:
+            url = "localhost" if self.LOCAL else MessageQueueConnection()._getDefaultConnectionUrl()  # pylint: disable=protected-access
+            consumers, _served = hostConsumers(url, local=self.LOCAL, numMessages=numMessages)
+            self.assertEqual(len(consumers[0].received), numMessages)
+            self.assertEqual(len(consumers[1].received), numMessages)
+        except Exception:
+            logger.exception("Consumer host failing")
+            self.fail()
+
+
+class InMemoryConsumerHostTests(unittest.TestCase):
+    def testHostConsumers(self):
+        """Test case:  two consumers with separate queues served over one connection to the in-process broker"""
+        numMessages = 10
+        broker = InMemoryBroker()
+        # One worker thread, with each queue's whole backlog prefetched, so that the lane weights decide the order
+        consumers, served = hostConsumers("", local=True, transport=broker, numMessages=numMessages, numWorkers=1, prefetchCount=numMessages + 1, workSeconds=0.01)
+        self.assertEqual(len(consumers[0].received), numMessages)
+        self.assertEqual(len(consumers[1].received), numMessages)
+        self.assertEqual(len(served), 2 * numMessages)
+        # While both queues are backlogged queue b (weight 2) is served at least as fast as queue a (weight 1)
+        firstServed = served[:numMessages]
+        self.assertGreaterEqual(firstServed.count(consumers[1]), firstServed.count(consumers[0]))
+        self.assertGreater(firstServed.count(consumers[1]), numMessages // 2)
+        self.assertEqual(broker.getQueueDepth("test_host_queue_a"), 0)
+        self.assertEqual(broker.getQueueDepth("test_host_queue_b"), 0)
+
+
+def suiteWeightedPool():
+    suite = unittest.TestSuite()
+    suite.addTest(WeightedWorkerPoolTests("testWeightedOrder"))
+    suite.addTest(WeightedWorkerPoolTests("testLaneConcurrency"))
+    return suite
+
+
+def suiteConsumerHost():
+    suite = unittest.TestSuite()
+    suite.addTest(InMemoryConsumerHostTests("testHostConsumers"))
+    suite.addTest(ConsumerHostTests("testHostConsumers"))
+    return suite
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("--local", action="store_true", help="run on local host")
+    args = parser.parse_args()
+    ConsumerHostTests.LOCAL = args.local
+    runner = unittest.TextTestRunner(failfast=True)
+    runner.run(suiteWeightedPool())
+    runner.run(suiteConsumerHost())
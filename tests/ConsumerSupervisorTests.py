@@ -0,0 +1,107 @@
+#
+# File: ConsumerSupervisorTests.py
+# Date:  19-Oct-2026
+#
+# Updates:
+##
+"""
+Tests of forking, restarting and draining consumer children with ConsumerSupervisor.
+"""
+
+__docformat__ = "restructuredtext en"
+__license__ = "Creative Commons Attribution 3.0 Unported"
+__version__ = "V0.07"
+
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import unittest
+
+if __package__ is None or __package__ == "":
+    from os import path
+
+    sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
+    from commonsetup import TESTOUTPUT  # type: ignore[import-not-found] # pylint: disable=import-error,unused-import
+else:
+    from .commonsetup import TESTOUTPUT  # noqa: F401
+
+from wwpdb.utils.message_queue.ConsumerSupervisor import ConsumerSupervisor
+
+logging.basicConfig(level=logging.INFO, format="\n[%(levelname)s]-%(module)s.%(funcName)s: %(message)s")
+logger = logging.getLogger()
+
+
+class CrashOnceWorker:
+    """Worker stand-in - the first one started fails, the others run until drained."""
+
+    def __init__(self, markerFile):
+        self.__markerFile = markerFile
+        self.__drained = False
+
+    def run(self):
+        try:
+            os.close(os.open(self.__markerFile, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        except FileExistsError:
+            pass
+        else:
+            raise RuntimeError("failing first start")
+        while not self.__drained:
+            time.sleep(0.05)
+
+    def drain(self, timeout=30.0):  # noqa: ARG002
+        self.__drained = True
+
+
+@unittest.skipUnless(hasattr(os, "fork"), "requires os.fork()")
+class ConsumerSupervisorTests(unittest.TestCase):
+    def setUp(self):
+        self.__statusFile = os.path.join(TESTOUTPUT, "consumer_supervisor_status.json")
+        self.__markerFile = os.path.join(TESTOUTPUT, "consumer_supervisor_crash.marker")
+        self.tearDown()
+
+    def tearDown(self):
+        for fp in (self.__statusFile, self.__markerFile):
+            if os.path.exists(fp):
+                os.remove(fp)
+
+    def __readChildren(self):
+        with open(self.__statusFile) as ifh:
+            return json.load(ifh)["children"]
+
+    def testRestartAndDrain(self):
+        supervisor = ConsumerSupervisor(lambda: CrashOnceWorker(self.__markerFile), numChildren=2, statusFile=self.__statusFile, drainTimeout=5.0, restartDelay=0.1)
+        thread = threading.Thread(target=supervisor.run)
+        thread.start()
+        try:
+            deadline = time.time() + 10.0
+            while time.time() < deadline:
+                time.sleep(0.2)
+                if os.path.exists(self.__statusFile):
+                    children = self.__readChildren()
+                    if sum(child["restarts"] for child in children) == 1 and all(child["state"] == "running" for child in children):
+                        break
+            else:
+                self.fail("children not restarted")
+            report = ConsumerSupervisor.readStatus(self.__statusFile)
+            logger.info("Status:\n%s", report)
+            self.assertEqual(report.count("state running"), 2)
+        finally:
+            supervisor.stop()
+            thread.join(20.0)
+        self.assertFalse(thread.is_alive())
+        children = self.__readChildren()
+        self.assertTrue(all(child["state"] == "stopped" and child["lastExit"] == 0 for child in children))
+
+
+def suiteSupervisor():
+    suite = unittest.TestSuite()
+    suite.addTest(ConsumerSupervisorTests("testRestartAndDrain"))
+    return suite
+
+
+if __name__ == "__main__":
+    runner = unittest.TextTestRunner(failfast=True)
+    runner.run(suiteSupervisor())
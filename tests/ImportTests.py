@@ -26,10 +26,26 @@ if __package__ is None or __package__ == "":
 else:
     from .commonsetup import TESTOUTPUT  # noqa: F401
 
-import wwpdb.utils.message_queue.DetachedMessageConsumerExample
-import wwpdb.utils.message_queue.MessageConsumerBase
-import wwpdb.utils.message_queue.MessagePublisher
+import wwpdb.utils.message_queue.AsyncMessageConsumerBase  # noqa: F401
+import wwpdb.utils.message_queue.ConsumerAutoscaler  # noqa: F401
+import wwpdb.utils.message_queue.ConsumerHost  # noqa: F401
+import wwpdb.utils.message_queue.ConsumerSupervisor  # noqa: F401
+import wwpdb.utils.message_queue.DetachedMessageConsumerExample  # noqa: F401
+import wwpdb.utils.message_queue.InMemoryBroker  # noqa: F401
+import wwpdb.utils.message_queue.LoadGenerator  # noqa: F401
+import wwpdb.utils.message_queue.MessageConsumerBase  # noqa: F401
+import wwpdb.utils.message_queue.MessageDispatcher  # noqa: F401
+import wwpdb.utils.message_queue.MessageMetrics  # noqa: F401
+import wwpdb.utils.message_queue.MessageProfiler  # noqa: F401
+import wwpdb.utils.message_queue.MessagePublisher  # noqa: F401
 import wwpdb.utils.message_queue.MessageQueueConnection  # noqa: F401
+import wwpdb.utils.message_queue.MessageRetryPolicy  # noqa: F401
+import wwpdb.utils.message_queue.MessageTransport  # noqa: F401
+import wwpdb.utils.message_queue.RpcClient  # noqa: F401
+import wwpdb.utils.message_queue.RpcServer  # noqa: F401
+import wwpdb.utils.message_queue.ScatterGather  # noqa: F401
+import wwpdb.utils.message_queue.StageContext  # noqa: F401
+import wwpdb.utils.message_queue.TraceContext  # noqa: F401
 
 
 class ImportTests(unittest.TestCase):
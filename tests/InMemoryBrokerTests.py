@@ -0,0 +1,375 @@
+#
+# File: InMemoryBrokerTests.py
+# Date:  19-Oct-2026
+#
+# Updates:
+#  19-Oct-2026       publisher confirms, mandatory returns and x-death counts
+#  19-Oct-2026       subscriber group joined with other backlog bounds
+#  19-Oct-2026       asyncio driven connections
+##
+"""
+Tests of the in-process broker and of publishing and consuming through it.
+"""
+
+__docformat__ = "restructuredtext en"
+__license__ = "Creative Commons Attribution 3.0 Unported"
+__version__ = "V0.07"
+
+import asyncio
+import logging
+import sys
+import threading
+import time
+import unittest
+
+import pika
+
+if __package__ is None or __package__ == "":
+    from os import path
+
+    sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
+    from commonsetup import TESTOUTPUT  # type: ignore[import-not-found] # pylint: disable=import-error,unused-import
+else:
+    from .commonsetup import TESTOUTPUT  # noqa: F401
+
+from wwpdb.utils.message_queue.InMemoryBroker import InMemoryBroker, topicMatches
+from wwpdb.utils.message_queue.MessageConsumerBase import MessageConsumerBase
+from wwpdb.utils.message_queue.MessagePublisher import MessagePublisher
+from wwpdb.utils.message_queue.MessageSubscriberBase import MessageSubscriberBase
+
+logging.basicConfig(level=logging.INFO, format="\n[%(levelname)s]-%(module)s.%(funcName)s: %(message)s")
+logger = logging.getLogger()
+
+
+class CollectingConsumer(MessageConsumerBase):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.received = []
+
+    def workerMethod(self, msgBody, deliveryTag=None):  # noqa: ARG002
+        self.received.append(msgBody)
+        return True
+
+
+class StageConsumer(MessageConsumerBase):
+    def workerMethod(self, msgBody, deliveryTag=None, context=None):  # noqa: ARG002
+        for part in msgBody.split(b","):
+            context.publish(part, "test_stage2_queue")
+        return True
+
+
+class CollectingSubscriber(MessageSubscriberBase):
+    def __init__(self, *args, **kwargs):
+        self.received = []
+        super().__init__(*args, **kwargs)
+
+    def workerMethod(self, msgBody, deliveryTag=None):  # noqa: ARG002
+        self.received.append(msgBody)
+        return True
+
+
+def waitFor(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+class InMemoryBrokerTests(unittest.TestCase):
+    def setUp(self):
+        self.__broker = InMemoryBroker()
+
+    def testTopicMatches(self):
+        self.assertTrue(topicMatches("wf.*.done", "wf.annotation.done"))
+        self.assertFalse(topicMatches("wf.*.done", "wf.a.b.done"))
+        self.assertTrue(topicMatches("wf.#", "wf"))
+        self.assertTrue(topicMatches("#.done", "wf.a.b.done"))
+        self.assertFalse(topicMatches("wf.#.done", "wf.a.b.failed"))
+
+    def testPriorityAndRouting(self):
+        channel = self.__broker.connect().channel()
+        channel.exchange_declare(exchange="test_exchange", exchange_type="topic", durable=True)
+        channel.queue_declare(queue="prio_queue", durable=True, arguments={"x-max-priority": 10})
+        channel.queue_bind(queue="prio_queue", exchange="test_exchange", routing_key="job.#")
+        for body, priority in ((b"low", 1), (b"high", 9), (b"none", None), (b"mid", 5)):
+            channel.basic_publish(exchange="test_exchange", routing_key="job.run.now", body=body, properties=pika.BasicProperties(priority=priority))
+        channel.basic_publish(exchange="test_exchange", routing_key="other.run", body=b"unroutable")
+        self.assertEqual(self.__broker.getQueueDepth("prio_queue"), 4)
+        bodies = [channel.basic_get("prio_queue", auto_ack=True)[2] for _ in range(5)]
+        self.assertEqual(bodies, [b"high", b"mid", b"low", b"none", None])
+        # A declare with inequivalent arguments closes the channel
+        with self.assertRaises(pika.exceptions.ChannelClosedByBroker):
+            channel.queue_declare(queue="prio_queue", durable=True)
+        self.assertFalse(channel.is_open)
+
+    def testPrefetchAndRequeue(self):
+        channel = self.__broker.connect().channel()
+        channel.queue_declare(queue="work_queue", durable=True)
+        for ii in range(5):
+            channel.basic_publish(exchange="", routing_key="work_queue", body=b"msg-%d" % ii)
+        connection = self.__broker.connect()
+        consumerChannel = connection.channel()
+        consumerChannel.basic_qos(prefetch_count=2)
+        deliveries = []
+        consumerChannel.basic_consume("work_queue", lambda ch, method, properties, body: deliveries.append((method.delivery_tag, body)))
+        connection.process_data_events(time_limit=0.1)
+        self.assertEqual([body for _tag, body in deliveries], [b"msg-0", b"msg-1"])
+        consumerChannel.basic_ack(deliveries[0][0])
+        connection.process_data_events(time_limit=0.1)
+        self.assertEqual(len(deliveries), 3)
+        self.assertEqual(self.__broker.getQueueDepth("work_queue"), 2)
+        # Unacknowledged deliveries return to the head of the queue when the connection closes
+        connection.close()
+        self.assertEqual(self.__broker.getQueueDepth("work_queue"), 4)
+        method, _properties, body = channel.basic_get("work_queue", auto_ack=True)
+        self.assertEqual(body, b"msg-1")
+        self.assertTrue(method.redelivered)
+
+    def testConfirmsAndReturns(self):
+        connection = self.__broker.connect()
+        channel = connection.channel()
+        channel.queue_declare(queue="bounded_queue", durable=True, arguments={"x-max-length": 1, "x-overflow": "reject-publish"})
+        returned = []
+        channel.add_on_return_callback(lambda ch, method, properties, body: returned.append((method.reply_code, method.routing_key, body)))
+        # Without confirms unroutable mandatory messages are returned, others are dropped
+        channel.basic_publish(exchange="", routing_key="no_such_queue", body=b"dropped")
+        channel.basic_publish(exchange="", routing_key="no_such_queue", body=b"returned", mandatory=True)
+        connection.process_data_events(time_limit=0.1)
+        self.assertEqual(returned, [(312, "no_such_queue", b"returned")])
+        channel.confirm_delivery()
+        with self.assertRaises(pika.exceptions.UnroutableError) as cm:
+            channel.basic_publish(exchange="", routing_key="no_such_queue", body=b"unroutable", mandatory=True)
+        self.assertEqual(cm.exception.messages[0].body, b"unroutable")
+        channel.basic_publish(exchange="", routing_key="bounded_queue", body=b"first", mandatory=True)
+        # A full reject-publish queue nacks the publish
+        with self.assertRaises(pika.exceptions.NackError):
+            channel.basic_publish(exchange="", routing_key="bounded_queue", body=b"second")
+        self.assertEqual(self.__broker.getQueueDepth("bounded_queue"), 1)
+        self.assertTrue(channel.is_open)
+
+    def testDeadLetterCount(self):
+        channel = self.__broker.connect().channel()
+        channel.exchange_declare(exchange="test_dlx_exchange", exchange_type="direct", durable=True)
+        channel.queue_declare(queue="test_work_queue", durable=True, arguments={"x-dead-letter-exchange": "test_dlx_exchange"})
+        channel.queue_bind(queue="test_work_queue", exchange="test_dlx_exchange", routing_key="test_work_queue")
+        channel.basic_publish(exchange="", routing_key="test_work_queue", body=b"cycle")
+        # Each rejection dead-letters the message back onto the same queue
+        for _ in range(3):
+            method, _properties, _body = channel.basic_get("test_work_queue")
+            channel.basic_reject(method.delivery_tag, requeue=False)
+        _method, properties, body = channel.basic_get("test_work_queue", auto_ack=True)
+        self.assertEqual(body, b"cycle")
+        self.assertEqual(len(properties.headers["x-death"]), 1)
+        self.assertEqual(properties.headers["x-death"][0]["count"], 3)
+        self.assertEqual(properties.headers["x-death"][0]["reason"], "rejected")
+
+    def testAsyncioConnection(self):
+        loop = asyncio.new_event_loop()
+        opened = loop.create_future()
+        closed = loop.create_future()
+        connection = self.__broker.connectAsync(loop, on_open_callback=opened.set_result, on_close_callback=lambda conn, reason: closed.set_result(reason))
+        try:
+            self.assertIs(loop.run_until_complete(opened), connection)
+            channel = connection.channel()
+            declared = loop.create_future()
+            channel.queue_declare(queue="async_queue", durable=True, callback=declared.set_result)
+            self.assertEqual(loop.run_until_complete(declared).method.queue, "async_queue")
+            bodies = []
+            received = loop.create_future()
+
+            def onMessage(ch, method, properties, body):  # noqa: ARG001
+                ch.basic_ack(method.delivery_tag)
+                bodies.append(body)
+                if len(bodies) == 3:
+                    received.set_result(threading.current_thread())
+
+            channel.basic_consume("async_queue", onMessage)
+
+            def publish():
+                publishChannel = self.__broker.connect().channel()
+                for ii in range(3):
+                    publishChannel.basic_publish(exchange="", routing_key="async_queue", body=b"msg-%d" % ii)
+
+            # Published from another thread and delivered on the loop as the broker queues them
+            publisher = threading.Thread(target=publish)
+            publisher.start()
+            self.assertIs(loop.run_until_complete(asyncio.wait_for(received, 5.0)), threading.current_thread())
+            publisher.join()
+            self.assertEqual(bodies, [b"msg-0", b"msg-1", b"msg-2"])
+            self.assertEqual(self.__broker.getQueueDepth("async_queue"), 0)
+            # A broker error closes the channel and is passed to its close callbacks
+            channelClosed = loop.create_future()
+            channel.add_on_close_callback(lambda ch, reason: channelClosed.set_result(reason))
+            channel.queue_declare(queue="no_such_queue", passive=True)
+            reason = loop.run_until_complete(channelClosed)
+            self.assertIsInstance(reason, pika.exceptions.ChannelClosedByBroker)
+            self.assertEqual(reason.reply_code, 404)
+            connection.close()
+            self.assertIsInstance(loop.run_until_complete(closed), pika.exceptions.ConnectionClosedByClient)
+            self.assertTrue(connection.is_closed)
+        finally:
+            loop.close()
+
+    def testPublishConsume(self):
+        publisher = MessagePublisher(local=True, transport=self.__broker)
+        for ii in range(10):
+            self.assertTrue(publisher.publish("message %d" % ii, exchangeName="test_exchange", queueName="test_queue", routingKey="test_routing_key"))
+        consumer = CollectingConsumer(amqpUrl="", transport=self.__broker)
+        consumer.setQueue("test_queue", "test_routing_key")
+        consumer.setExchange("test_exchange")
+        consumer.setExecutionMode("thread", numWorkers=3)
+        thread = threading.Thread(target=consumer.run)
+        thread.start()
+        try:
+            self.assertTrue(waitFor(lambda: len(consumer.received) == 10))
+        finally:
+            consumer.requestDrain(timeout=5.0)
+            thread.join(10.0)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(sorted(consumer.received), sorted(b"message %d" % ii for ii in range(10)))
+        self.assertEqual(self.__broker.getQueueDepth("test_queue"), 0)
+
+    def testSubscriberFanout(self):
+        subscribers = [CollectingSubscriber(amqpUrl="", transport=self.__broker) for _ in range(2)]
+        threads = []
+        for subscriber in subscribers:
+            subscriber.add_exchange("test_subscriber_exchange")
+            threads.append(threading.Thread(target=subscriber.run))
+            threads[-1].start()
+        publisher = MessagePublisher(local=True, transport=self.__broker)
+        for ii in range(3):
+            self.assertTrue(publisher.publishDirect("broadcast %d" % ii, exchangeName="test_subscriber_exchange"))
+        try:
+            self.assertTrue(waitFor(lambda: all(len(subscriber.received) == 3 for subscriber in subscribers)))
+        finally:
+            for subscriber in subscribers:
+                subscriber._connection.add_callback_threadsafe(subscriber._channel.stop_consuming)  # noqa: SLF001 pylint: disable=protected-access
+            for thread in threads:
+                thread.join(10.0)
+        self.assertFalse(any(thread.is_alive() for thread in threads))
+
+    def testSubscriptionGroup(self):
+        publisher = MessagePublisher(local=True, transport=self.__broker)
+        members = [CollectingSubscriber(amqpUrl="", transport=self.__broker, group="test_group", prefetchCount=2) for _ in range(2)]
+        threads = []
+        for member in members:
+            member.add_exchange("test_group_exchange")
+            self.assertEqual(member.getQueueName(), "test_group")
+            threads.append(threading.Thread(target=member.run))
+            threads[-1].start()
+        self.assertTrue(waitFor(lambda: all(member._channel.consumer_tags for member in members)))  # noqa: SLF001 pylint: disable=protected-access
+        for ii in range(6):
+            self.assertTrue(publisher.publishDirect("shared %d" % ii, exchangeName="test_group_exchange"))
+        try:
+            self.assertTrue(waitFor(lambda: sum(len(member.received) for member in members) == 6))
+        finally:
+            for member in members:
+                member._connection.add_callback_threadsafe(member._channel.stop_consuming)  # noqa: SLF001 pylint: disable=protected-access
+            for thread in threads:
+                thread.join(10.0)
+        # Each message is delivered to one member of the group
+        self.assertEqual(sorted(body for member in members for body in member.received), sorted(b"shared %d" % ii for ii in range(6)))
+        self.assertTrue(all(member.received for member in members))
+        for member in members:
+            member.closeConnection()
+        # Messages published while no member is running are kept for the group
+        publisher.publishDirect("while down", exchangeName="test_group_exchange")
+        self.assertEqual(self.__broker.getQueueDepth("test_group"), 1)
+
+    def testSubscriberFilters(self):
+        topicSubscriber = CollectingSubscriber(amqpUrl="", transport=self.__broker)
+        topicSubscriber.add_exchange("test_topic_exchange", routingKeys=["deposition.*.uploaded", "annotation.#"])
+        headerSubscriber = CollectingSubscriber(amqpUrl="", transport=self.__broker)
+        headerSubscriber.add_exchange("test_headers_exchange", headers={"site": "rcsb", "priority": None}, matchAll=True)
+        subscribers = [topicSubscriber, headerSubscriber]
+        threads = [threading.Thread(target=subscriber.run) for subscriber in subscribers]
+        for thread in threads:
+            thread.start()
+        publisher = MessagePublisher(local=True, transport=self.__broker)
+        for routingKey in ("deposition.D_1.uploaded", "deposition.D_1.deleted", "annotation.D_1.ligand.done"):
+            self.assertTrue(publisher.publishDirect(routingKey, exchangeName="test_topic_exchange", routingKey=routingKey))
+        for site, priority in (("rcsb", 1), ("pdbe", 1), ("rcsb", None)):
+            headers = {"site": site} if priority is None else {"site": site, "priority": priority}
+            self.assertTrue(publisher.publishDirect("%s %s" % (site, priority), exchangeName="test_headers_exchange", headers=headers))
+        try:
+            self.assertTrue(waitFor(lambda: len(topicSubscriber.received) == 2 and len(headerSubscriber.received) == 1))
+        finally:
+            for subscriber in subscribers:
+                subscriber._connection.add_callback_threadsafe(subscriber._channel.stop_consuming)  # noqa: SLF001 pylint: disable=protected-access
+            for thread in threads:
+                thread.join(10.0)
+        self.assertEqual(topicSubscriber.received, [b"deposition.D_1.uploaded", b"annotation.D_1.ligand.done"])
+        self.assertEqual(headerSubscriber.received, [b"rcsb 1"])
+
+    def testSubscriberBacklog(self):
+        subscriber = CollectingSubscriber(amqpUrl="", transport=self.__broker, group="test_backlog", backlogLength=3, backlogMinutes=5)
+        subscriber.add_exchange("test_backlog_exchange")
+        subscriber.closeConnection()
+        # Only the latest backlogLength messages published while the subscriber is away are kept
+        publisher = MessagePublisher(local=True, transport=self.__broker)
+        for ii in range(5):
+            self.assertTrue(publisher.publishDirect("missed %d" % ii, exchangeName="test_backlog_exchange"))
+        self.assertEqual(self.__broker.getQueueDepth("test_backlog"), 3)
+        subscriber = CollectingSubscriber(amqpUrl="", transport=self.__broker, group="test_backlog", backlogLength=3, backlogMinutes=5)
+        subscriber.add_exchange("test_backlog_exchange")
+        thread = threading.Thread(target=subscriber.run)
+        thread.start()
+        try:
+            self.assertTrue(waitFor(lambda: len(subscriber.received) == 3))
+            self.assertTrue(publisher.publishDirect("live", exchangeName="test_backlog_exchange"))
+            self.assertTrue(waitFor(lambda: len(subscriber.received) == 4))
+        finally:
+            subscriber._connection.add_callback_threadsafe(subscriber._channel.stop_consuming)  # noqa: SLF001 pylint: disable=protected-access
+            thread.join(10.0)
+        self.assertEqual(subscriber.received, [b"missed 2", b"missed 3", b"missed 4", b"live"])
+        with self.assertRaises(ValueError):
+            CollectingSubscriber(amqpUrl="", transport=self.__broker, backlogLength=3)
+        # Joining the group with other backlog bounds is refused with a clear error
+        with self.assertRaisesRegex(ValueError, "test_backlog"):
+            CollectingSubscriber(amqpUrl="", transport=self.__broker, group="test_backlog", backlogLength=10)
+        self.assertEqual(self.__broker.getQueueDepth("test_backlog"), 0)
+
+    def testPipelineStage(self):
+        channel = self.__broker.connect().channel()
+        for queueName in ("test_stage1_queue", "test_stage2_queue"):
+            channel.queue_declare(queue=queueName, durable=True)
+        for ii in range(5):
+            channel.basic_publish(exchange="", routing_key="test_stage1_queue", body=b"%d-a,%d-b" % (ii, ii))
+        consumer = StageConsumer(amqpUrl="", transport=self.__broker)
+        consumer.setQueue("test_stage1_queue", None)
+        consumer.setExecutionMode("thread", numWorkers=2)
+        consumer.setPipelineStage(confirm=True)
+        thread = threading.Thread(target=consumer.run)
+        thread.start()
+        try:
+            self.assertTrue(waitFor(lambda: self.__broker.getQueueDepth("test_stage2_queue") == 10))
+            self.assertTrue(waitFor(lambda: self.__broker.getQueueDepth("test_stage1_queue") == 0))
+        finally:
+            consumer.requestDrain(timeout=5.0)
+            thread.join(10.0)
+        bodies = sorted(channel.basic_get("test_stage2_queue", auto_ack=True)[2] for _ in range(10))
+        self.assertEqual(bodies, sorted(b"%d-%s" % (ii, part) for ii in range(5) for part in (b"a", b"b")))
+        # Every input was acknowledged after its hand-off, none were requeued
+        self.assertEqual(self.__broker.getQueueDepth("test_stage1_queue"), 0)
+
+
+def suiteInMemoryBroker():
+    suite = unittest.TestSuite()
+    suite.addTest(InMemoryBrokerTests("testTopicMatches"))
+    suite.addTest(InMemoryBrokerTests("testPriorityAndRouting"))
+    suite.addTest(InMemoryBrokerTests("testPrefetchAndRequeue"))
+    suite.addTest(InMemoryBrokerTests("testConfirmsAndReturns"))
+    suite.addTest(InMemoryBrokerTests("testDeadLetterCount"))
+    suite.addTest(InMemoryBrokerTests("testAsyncioConnection"))
+    suite.addTest(InMemoryBrokerTests("testPublishConsume"))
+    suite.addTest(InMemoryBrokerTests("testSubscriberFanout"))
+    suite.addTest(InMemoryBrokerTests("testSubscriptionGroup"))
+    suite.addTest(InMemoryBrokerTests("testSubscriberFilters"))
+    suite.addTest(InMemoryBrokerTests("testSubscriberBacklog"))
+    suite.addTest(InMemoryBrokerTests("testPipelineStage"))
+    return suite
+
+
+if __name__ == "__main__":
+    runner = unittest.TextTestRunner(failfast=True)
+    runner.run(suiteInMemoryBroker())
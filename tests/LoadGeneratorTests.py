@@ -0,0 +1,98 @@
+#
+# File: LoadGeneratorTests.py
+# Date:  19-Oct-2026
+#
+# Updates:
+##
+"""
+Tests of the synthetic traffic load generator.
+"""
+
+__docformat__ = "restructuredtext en"
+__license__ = "Creative Commons Attribution 3.0 Unported"
+__version__ = "V0.07"
+
+import logging
+import random
+import sys
+import unittest
+
+if __package__ is None or __package__ == "":
+    from os import path
+
+    sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
+    from commonsetup import TESTOUTPUT  # type: ignore[import-not-found] # pylint: disable=import-error,unused-import
+else:
+    from .commonsetup import TESTOUTPUT  # noqa: F401
+
+from wwpdb.utils.message_queue.InMemoryBroker import InMemoryBroker
+from wwpdb.utils.message_queue.LoadGenerator import (
+    LoadGenerator,
+    SizeDistribution,
+    WeightedMix,
+)
+
+logging.basicConfig(level=logging.INFO, format="\n[%(levelname)s]-%(module)s.%(funcName)s: %(message)s")
+logger = logging.getLogger()
+
+
+class LoadGeneratorTests(unittest.TestCase):
+    def testMixes(self):
+        rng = random.Random(1)
+        mix = WeightedMix("a:9,b:1,c")
+        counts = {"a": 0, "b": 0, "c": 0}
+        for _ in range(11000):
+            counts[mix.choose(rng)] += 1
+        self.assertGreater(counts["a"], 8 * counts["b"])
+        self.assertLess(abs(counts["b"] - counts["c"]), 200)
+        sizes = SizeDistribution("100-200")
+        self.assertTrue(all(100 <= sizes.choose(rng) <= 200 for _ in range(100)))
+        self.assertEqual({SizeDistribution("64:1,4096:1").choose(rng) for _ in range(100)}, {64, 4096})
+        self.assertRaises(ValueError, WeightedMix, "a:0")
+        self.assertRaises(ValueError, LoadGenerator, "test_load_exchange", queueName="test_load_queue", priorities="0:1,5:1")
+        self.assertRaises(ValueError, LoadGenerator, "test_load_exchange", queueName="test_load_queue", arrival="bursty")
+
+    def testRate(self):
+        broker = InMemoryBroker()
+        generator = LoadGenerator(
+            "test_load_exchange", queueName="test_load_queue", routingKeys="test_load_key", sizes="10-20", priorities="1:3,9:1", rate=200.0, local=True, transport=broker, seed=7
+        )
+        reports = []
+        summary = generator.run(producers=2, count=100, interval=0.1, reportFn=reports.append)
+        self.assertEqual(summary["sent"], 100)
+        self.assertEqual(summary["errors"], 0)
+        self.assertLessEqual(sum(stats["sent"] for stats in reports), 100)
+        self.assertTrue(reports)
+        # 100 messages at 200 per second take about half a second
+        self.assertGreater(summary["elapsed"], 0.4)
+        self.assertLess(summary["rate"], 250.0)
+        self.assertIsNotNone(summary["latencyMs"]["p99"])
+        self.assertEqual(broker.getQueueDepth("test_load_queue"), 100)
+
+    def testPoissonDirect(self):
+        broker = InMemoryBroker()
+        channel = broker.connect().channel()
+        channel.exchange_declare(exchange="test_load_exchange", exchange_type="topic", durable=True)
+        channel.queue_declare(queue="test_uploaded_queue", durable=True)
+        channel.queue_bind(exchange="test_load_exchange", queue="test_uploaded_queue", routing_key="deposition.uploaded")
+        generator = LoadGenerator(
+            "test_load_exchange", routingKeys="deposition.uploaded:1,deposition.other:1", rate=500.0, arrival="poisson", direct=True, local=True, transport=broker, seed=3
+        )
+        summary = generator.run(producers=3, count=90, interval=0.1, reportFn=lambda stats: None)
+        self.assertEqual(summary["sent"], 90)
+        depth = broker.getQueueDepth("test_uploaded_queue")
+        self.assertGreater(depth, 20)
+        self.assertLess(depth, 70)
+
+
+def suiteLoadGenerator():
+    suite = unittest.TestSuite()
+    suite.addTest(LoadGeneratorTests("testMixes"))
+    suite.addTest(LoadGeneratorTests("testRate"))
+    suite.addTest(LoadGeneratorTests("testPoissonDirect"))
+    return suite
+
+
+if __name__ == "__main__":
+    runner = unittest.TextTestRunner(failfast=True)
+    runner.run(suiteLoadGenerator())
@@ -0,0 +1,150 @@
+#
+# File: MessageConsumerBatchTests.py
+# Date:  19-Oct-2026
+#
+# Updates:
+##
+"""
+Tests of batch consumption (setBatch()/workerMethodBatch()) through the in-process broker.
+"""
+
+__docformat__ = "restructuredtext en"
+__license__ = "Creative Commons Attribution 3.0 Unported"
+__version__ = "V0.07"
+
+import logging
+import sys
+import threading
+import time
+import unittest
+
+if __package__ is None or __package__ == "":
+    from os import path
+
+    sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
+    from commonsetup import TESTOUTPUT  # type: ignore[import-not-found] # pylint: disable=import-error,unused-import
+else:
+    from .commonsetup import TESTOUTPUT  # noqa: F401
+
+from wwpdb.utils.message_queue.InMemoryBroker import InMemoryBroker
+from wwpdb.utils.message_queue.MessageConsumerBase import MessageConsumerBase
+
+logging.basicConfig(level=logging.INFO, format="\n[%(levelname)s]-%(module)s.%(funcName)s: %(message)s")
+logger = logging.getLogger()
+
+
+class BatchConsumer(MessageConsumerBase):
+    """Batch consumer failing messages b"fail" and holding a batch containing b"hang" until released."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.batches = []
+        self.acks = []
+        self.rejects = []
+        self.release = threading.Event()
+
+    def workerMethodBatch(self, msgBodies, deliveryTags):
+        self.batches.append((list(msgBodies), time.time()))
+        if b"hang" in msgBodies:
+            self.release.wait(10.0)
+        return [deliveryTag for msgBody, deliveryTag in zip(msgBodies, deliveryTags) if msgBody == b"fail"]
+
+    def acknowledgeMessage(self, deliveryTag, multiple=False):
+        self.acks.append((deliveryTag, multiple))
+        super().acknowledgeMessage(deliveryTag, multiple=multiple)
+
+    def rejectMessage(self, deliveryTag, requeue=False):
+        self.rejects.append((deliveryTag, requeue))
+        super().rejectMessage(deliveryTag, requeue=requeue)
+
+
+class MessageConsumerBatchTests(unittest.TestCase):
+    queueName = "test_batch_queue"
+
+    def setUp(self):
+        self.__broker = InMemoryBroker()
+        channel = self.__broker.connect().channel()
+        channel.queue_declare(queue=self.queueName, durable=True)
+        self.__channel = channel
+        self.__consumer = BatchConsumer(amqpUrl="", transport=self.__broker)
+        self.__consumer.setQueue(self.queueName, None)
+        self.__thread = None
+
+    def tearDown(self):
+        self.__consumer.release.set()
+        if self.__thread is not None:
+            self.__consumer.requestDrain(timeout=5.0)
+            self.__thread.join(10.0)
+
+    def __publish(self, *msgBodies):
+        for msgBody in msgBodies:
+            self.__channel.basic_publish(exchange="", routing_key=self.queueName, body=msgBody)
+
+    def __run(self, numSettled):
+        """Start the consumer and wait for numSettled acknowledged or rejected deliveries (a multiple-ack counts once)."""
+        self.__thread = threading.Thread(target=self.__consumer.run)
+        self.__thread.start()
+        deadline = time.time() + 5.0
+        while len(self.__consumer.acks) + len(self.__consumer.rejects) < numSettled and time.time() < deadline:
+            time.sleep(0.01)
+
+    def testFullBatch(self):
+        self.__consumer.setBatch(3, batchWaitMs=5000)
+        self.__publish(b"m1", b"m2", b"m3", b"m4", b"m5", b"m6")
+        startTime = time.time()
+        self.__run(2)
+        # Full batches are dispatched at once rather than after batchWaitMs
+        self.assertLess(time.time() - startTime, 2.0)
+        self.assertEqual([msgBodies for msgBodies, _time in self.__consumer.batches], [[b"m1", b"m2", b"m3"], [b"m4", b"m5", b"m6"]])
+        self.assertEqual(self.__consumer.acks, [(3, True), (6, True)])
+        self.assertEqual(self.__broker.getQueueDepth(self.queueName), 0)
+
+    def testPartialBatch(self):
+        self.__consumer.setBatch(10, batchWaitMs=200)
+        self.__publish(b"m1", b"m2", b"m3")
+        startTime = time.time()
+        self.__run(1)
+        self.assertEqual(len(self.__consumer.batches), 1)
+        msgBodies, dispatchTime = self.__consumer.batches[0]
+        self.assertEqual(msgBodies, [b"m1", b"m2", b"m3"])
+        self.assertGreaterEqual(dispatchTime - startTime, 0.15)
+        self.assertEqual(self.__consumer.acks, [(3, True)])
+
+    def testFailedBatch(self):
+        self.__consumer.setBatch(4, batchWaitMs=5000)
+        self.__consumer.setRejectFailed()
+        self.__publish(b"ok", b"fail", b"ok", b"fail")
+        self.__run(3)
+        # Only the failed messages are rejected, the others acknowledged together
+        self.assertEqual(self.__consumer.rejects, [(2, False), (4, False)])
+        self.assertEqual(self.__consumer.acks, [(3, True)])
+        self.assertEqual(self.__broker.getQueueDepth(self.queueName), 0)
+
+    def testInterleavedBatches(self):
+        self.__consumer.setBatch(2, batchWaitMs=5000)
+        self.__consumer.setExecutionMode("thread", numWorkers=2)
+        self.__publish(b"hang", b"m2", b"m3", b"m4")
+        self.__run(2)
+        # The second batch completes while the first (tags 1 and 2) is outstanding - a multiple-ack of 4 would cover them
+        self.assertEqual(self.__consumer.acks, [(3, False), (4, False)])
+        self.__consumer.release.set()
+        deadline = time.time() + 5.0
+        while len(self.__consumer.acks) < 3 and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.__consumer.acks, [(3, False), (4, False), (2, True)])
+        self.assertEqual(self.__consumer.rejects, [])
+        self.assertTrue(self.__consumer.isConsuming())
+
+
+def suiteMessageConsumerBatch():
+    suite = unittest.TestSuite()
+    suite.addTest(MessageConsumerBatchTests("testFullBatch"))
+    suite.addTest(MessageConsumerBatchTests("testPartialBatch"))
+    suite.addTest(MessageConsumerBatchTests("testFailedBatch"))
+    suite.addTest(MessageConsumerBatchTests("testInterleavedBatches"))
+    return suite
+
+
+if __name__ == "__main__":
+    runner = unittest.TextTestRunner(failfast=True)
+    runner.run(suiteMessageConsumerBatch())
@@ -0,0 +1,169 @@
+#
+# File: MessageConsumerDrainTests.py
+# Date:  19-Oct-2026
+#
+# Updates:
+#  19-Oct-2026       work queued for a busy worker is cancelled when the drain times out
+##
+"""
+Tests of draining a running consumer (requestDrain()/signalDrain()) through the in-process broker.
+"""
+
+__docformat__ = "restructuredtext en"
+__license__ = "Creative Commons Attribution 3.0 Unported"
+__version__ = "V0.07"
+
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+import unittest
+
+if __package__ is None or __package__ == "":
+    from os import path
+
+    sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
+    from commonsetup import TESTOUTPUT  # type: ignore[import-not-found] # pylint: disable=import-error,unused-import
+else:
+    from .commonsetup import TESTOUTPUT  # noqa: F401
+
+from wwpdb.utils.message_queue.ConsumerHost import ConsumerHost
+from wwpdb.utils.message_queue.InMemoryBroker import InMemoryBroker
+from wwpdb.utils.message_queue.MessageConsumerBase import MessageConsumerBase
+
+logging.basicConfig(level=logging.INFO, format="\n[%(levelname)s]-%(module)s.%(funcName)s: %(message)s")
+logger = logging.getLogger()
+
+
+class SlowConsumer(MessageConsumerBase):
+    """Consumer taking workSeconds per message, or blocking until released if workSeconds is None."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.workSeconds = 0.3
+        self.started = []
+        self.finished = []
+        self.acks = []
+        self.rejects = []
+        self.release = threading.Event()
+
+    def workerMethod(self, msgBody, deliveryTag=None):
+        self.started.append(deliveryTag)
+        if self.workSeconds is None:
+            self.release.wait(10.0)
+        else:
+            time.sleep(self.workSeconds)
+        self.finished.append(deliveryTag)
+        return True
+
+    def acknowledgeMessage(self, deliveryTag, multiple=False):
+        self.acks.append(deliveryTag)
+        super().acknowledgeMessage(deliveryTag, multiple=multiple)
+
+    def rejectMessage(self, deliveryTag, requeue=False):
+        self.rejects.append((deliveryTag, requeue))
+        super().rejectMessage(deliveryTag, requeue=requeue)
+
+
+class MessageConsumerDrainTests(unittest.TestCase):
+    queueName = "test_drain_queue"
+    numMessages = 6
+
+    def setUp(self):
+        self.__broker = InMemoryBroker()
+        channel = self.__broker.connect().channel()
+        channel.queue_declare(queue=self.queueName, durable=True)
+        for ii in range(self.numMessages):
+            channel.basic_publish(exchange="", routing_key=self.queueName, body=b"message %d" % ii)
+        self.__consumer = SlowConsumer(amqpUrl="", transport=self.__broker)
+        self.__consumer.setQueue(self.queueName, None)
+        self.__consumer.setExecutionMode("thread", numWorkers=2)
+        self.__thread = threading.Thread(target=self.__consumer.run)
+
+    def tearDown(self):
+        self.__consumer.release.set()
+        self.__thread.join(10.0)
+
+    def __startConsuming(self):
+        self.__thread.start()
+        deadline = time.time() + 5.0
+        while len(self.__consumer.started) < 2 and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(len(self.__consumer.started), 2)
+
+    def testDrainCompletesInFlight(self):
+        self.__startConsuming()
+        self.__consumer.requestDrain(timeout=5.0)
+        self.__thread.join(10.0)
+        self.assertFalse(self.__thread.is_alive())
+        # The two messages being worked on complete and are acknowledged before the connection closes
+        self.assertEqual(sorted(self.__consumer.finished), sorted(self.__consumer.started))
+        self.assertEqual(sorted(self.__consumer.acks), sorted(self.__consumer.started))
+        self.assertEqual(self.__consumer.rejects, [])
+        self.assertEqual(self.__broker.getQueueDepth(self.queueName), self.numMessages - len(self.__consumer.acks))
+
+    def testDrainTimeoutRequeues(self):
+        self.__consumer.workSeconds = None
+        self.__startConsuming()
+        startTime = time.time()
+        self.__consumer.requestDrain(timeout=0.3)
+        self.__thread.join(10.0)
+        self.assertFalse(self.__thread.is_alive())
+        self.assertLess(time.time() - startTime, 2.0)
+        # Work still running at the deadline is requeued and its late completion ignored
+        self.assertEqual(self.__consumer.finished, [])
+        self.assertEqual(self.__consumer.acks, [])
+        self.assertEqual(sorted(self.__consumer.rejects), [(1, True), (2, True)])
+        self.assertEqual(self.__broker.getQueueDepth(self.queueName), self.numMessages)
+
+    def testDrainTimeoutCancelsQueued(self):
+        """Deliveries queued behind a busy worker when the drain times out are requeued and never run here."""
+        self.__consumer.setExecutionMode("thread", numWorkers=1)
+        self.__consumer.workSeconds = None
+        host = ConsumerHost(amqpUrl="", numWorkers=1, transport=self.__broker)
+        host.addConsumer(self.__consumer, prefetchCount=3)
+        self.__thread = threading.Thread(target=host.run)
+        self.__thread.start()
+        deadline = time.time() + 5.0
+        while len(self.__consumer.started) < 1 and time.time() < deadline:
+            time.sleep(0.01)
+        host.requestDrain(timeout=0.3)
+        self.__thread.join(10.0)
+        self.assertFalse(self.__thread.is_alive())
+        # Let the worker finish the message it was running; the two queued behind it must not start
+        self.__consumer.release.set()
+        time.sleep(0.5)
+        self.assertEqual(self.__consumer.started, [1])
+        self.assertEqual(sorted(self.__consumer.rejects), [(1, True), (2, True), (3, True)])
+        self.assertEqual(self.__consumer.acks, [])
+        self.assertEqual(self.__broker.getQueueDepth(self.queueName), self.numMessages)
+
+    def testSignalDrain(self):
+        """Drain on SIGTERM - the handler only records the request and the consumer starts the drain itself."""
+        previous = signal.signal(signal.SIGTERM, lambda signum, frame: self.__consumer.signalDrain(5.0))
+        try:
+            self.__startConsuming()
+            os.kill(os.getpid(), signal.SIGTERM)
+            self.__thread.join(10.0)
+        finally:
+            signal.signal(signal.SIGTERM, previous)
+        self.assertFalse(self.__thread.is_alive())
+        self.assertEqual(sorted(self.__consumer.acks), sorted(self.__consumer.started))
+        self.assertEqual(self.__consumer.rejects, [])
+        self.assertEqual(self.__broker.getQueueDepth(self.queueName), self.numMessages - len(self.__consumer.acks))
+
+
+def suiteMessageConsumerDrain():
+    suite = unittest.TestSuite()
+    suite.addTest(MessageConsumerDrainTests("testDrainCompletesInFlight"))
+    suite.addTest(MessageConsumerDrainTests("testDrainTimeoutRequeues"))
+    suite.addTest(MessageConsumerDrainTests("testDrainTimeoutCancelsQueued"))
+    suite.addTest(MessageConsumerDrainTests("testSignalDrain"))
+    return suite
+
+
+if __name__ == "__main__":
+    runner = unittest.TextTestRunner(failfast=True)
+    runner.run(suiteMessageConsumerDrain())
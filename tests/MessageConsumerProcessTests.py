@@ -0,0 +1,140 @@
+#
+# File: MessageConsumerProcessTests.py
+# Date:  19-Oct-2026
+#
+# Updates:
+#  19-Oct-2026       watchdog kill of the pool requeues the other messages it was working on
+##
+"""
+Tests of the process pool execution mode of MessageConsumerBase through the in-process broker.
+"""
+
+__docformat__ = "restructuredtext en"
+__license__ = "Creative Commons Attribution 3.0 Unported"
+__version__ = "V0.07"
+
+import logging
+import os
+import sys
+import threading
+import time
+import unittest
+
+import pika
+
+if __package__ is None or __package__ == "":
+    from os import path
+
+    sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
+    from commonsetup import TESTOUTPUT  # type: ignore[import-not-found] # pylint: disable=import-error,unused-import
+else:
+    from .commonsetup import TESTOUTPUT  # noqa: F401
+
+from wwpdb.utils.message_queue.InMemoryBroker import InMemoryBroker
+from wwpdb.utils.message_queue.MessageConsumerBase import MessageConsumerBase
+
+logging.basicConfig(level=logging.INFO, format="\n[%(levelname)s]-%(module)s.%(funcName)s: %(message)s")
+logger = logging.getLogger()
+
+
+class ProcessConsumer(MessageConsumerBase):
+    """Picklable consumer - workerMethod runs in a pool process, the hooks below in the parent."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.results = {}
+        self.acks = []
+        self.rejects = []
+
+    def workerMethod(self, msgBody, deliveryTag=None):
+        if msgBody == b"fail":
+            raise ValueError("bad message %s" % deliveryTag)
+        if msgBody == b"hang":
+            time.sleep(60.0)
+        elif msgBody == b"slow":
+            time.sleep(1.5)
+        return os.getpid()
+
+    def workerCompleted(self, properties, result, exc):  # noqa: ARG002
+        if exc is None:
+            self.results[properties.message_id] = result
+
+    def acknowledgeMessage(self, deliveryTag, multiple=False):
+        self.acks.append(deliveryTag)
+        super().acknowledgeMessage(deliveryTag, multiple=multiple)
+
+    def rejectMessage(self, deliveryTag, requeue=False):
+        self.rejects.append((deliveryTag, requeue))
+        super().rejectMessage(deliveryTag, requeue=requeue)
+
+
+class MessageConsumerProcessTests(unittest.TestCase):
+    def testProcessMode(self):
+        broker = InMemoryBroker()
+        channel = broker.connect().channel()
+        channel.queue_declare(queue="test_process_queue", durable=True)
+        for ii, body in enumerate((b"one", b"two", b"fail", b"three")):
+            channel.basic_publish(exchange="", routing_key="test_process_queue", body=body, properties=pika.BasicProperties(message_id=str(ii)))
+        consumer = ProcessConsumer(amqpUrl="", transport=broker)
+        consumer.setQueue("test_process_queue", None)
+        self.assertTrue(consumer.setExecutionMode("process", numWorkers=2))
+        self.assertTrue(consumer.setRejectFailed())
+        thread = threading.Thread(target=consumer.run)
+        thread.start()
+        try:
+            deadline = time.time() + 30.0
+            while len(consumer.acks) + len(consumer.rejects) < 4 and time.time() < deadline:
+                time.sleep(0.05)
+        finally:
+            consumer.requestDrain(timeout=10.0)
+            thread.join(30.0)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(sorted(consumer.results), ["0", "1", "3"])
+        self.assertNotIn(os.getpid(), consumer.results.values())
+        self.assertEqual(sorted(consumer.acks), [1, 2, 4])
+        self.assertEqual(consumer.rejects, [(3, False)])
+        self.assertEqual(broker.getQueueDepth("test_process_queue"), 0)
+
+    def testWatchdogKill(self):
+        broker = InMemoryBroker()
+        connection = broker.connect()
+        channel = connection.channel()
+        channel.queue_declare(queue="test_watchdog_queue", durable=True)
+        channel.basic_publish(exchange="", routing_key="test_watchdog_queue", body=b"hang", properties=pika.BasicProperties(message_id="0", headers={"x-worker-timeout": 1.0}))
+        channel.basic_publish(exchange="", routing_key="test_watchdog_queue", body=b"slow", properties=pika.BasicProperties(message_id="1"))
+        # Take both messages without acknowledging them so that they are redelivered to the consumer
+        for _ in range(2):
+            self.assertIsNotNone(channel.basic_get("test_watchdog_queue")[0])
+        connection.close()
+        consumer = ProcessConsumer(amqpUrl="", transport=broker)
+        consumer.setQueue("test_watchdog_queue", None)
+        self.assertTrue(consumer.setExecutionMode("process", numWorkers=2))
+        self.assertTrue(consumer.setWorkerTimeout(None))
+        self.assertTrue(consumer.setRejectFailed())
+        thread = threading.Thread(target=consumer.run)
+        thread.start()
+        try:
+            deadline = time.time() + 30.0
+            while not consumer.acks and time.time() < deadline:
+                time.sleep(0.05)
+        finally:
+            consumer.requestDrain(timeout=10.0)
+            thread.join(30.0)
+        self.assertFalse(thread.is_alive())
+        # The hung (redelivered) message is failed; the slow one, killed with the pool, is requeued and then completes
+        self.assertEqual(consumer.rejects, [(1, False), (2, True)])
+        self.assertEqual(consumer.acks, [3])
+        self.assertEqual(sorted(consumer.results), ["1"])
+        self.assertEqual(broker.getQueueDepth("test_watchdog_queue"), 0)
+
+
+def suiteMessageConsumerProcess():
+    suite = unittest.TestSuite()
+    suite.addTest(MessageConsumerProcessTests("testProcessMode"))
+    suite.addTest(MessageConsumerProcessTests("testWatchdogKill"))
+    return suite
+
+
+if __name__ == "__main__":
+    runner = unittest.TextTestRunner(failfast=True)
+    runner.run(suiteMessageConsumerProcess())
@@ -0,0 +1,357 @@
+#
+# File: MessageDispatcherTests.py
+# Date:  19-Oct-2026
+#
+# Updates:
+#  19-Oct-2026       completion on the connection thread and shutdown with work in flight
+#  19-Oct-2026       WorkerThreadPool concurrency, hooks, resize and shutdown with work in flight
+#  19-Oct-2026       failed messages are acknowledged unless setRejectFailed()
+##
+"""
+Tests of worker dispatch, acknowledgement and priority ordering in MessageDispatcher.
+"""
+
+__docformat__ = "restructuredtext en"
+__license__ = "Creative Commons Attribution 3.0 Unported"
+__version__ = "V0.07"
+
+import logging
+import queue
+import sys
+import threading
+import time
+import unittest
+
+import pika
+from pika.spec import Basic
+
+if __package__ is None or __package__ == "":
+    from os import path
+
+    sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
+    from commonsetup import TESTOUTPUT  # type: ignore[import-not-found] # pylint: disable=import-error,unused-import
+else:
+    from .commonsetup import TESTOUTPUT  # noqa: F401
+
+from wwpdb.utils.message_queue.MessageDispatcher import (
+    MessageDispatcher,
+    WorkerThreadPool,
+)
+
+logging.basicConfig(level=logging.INFO, format="\n[%(levelname)s]-%(module)s.%(funcName)s: %(message)s")
+logger = logging.getLogger()
+
+
+class QueuedConnection:
+    """Connection stand-in holding thread safe callbacks until the test runs them."""
+
+    def __init__(self):
+        self.callbacks = queue.Queue()
+
+    def add_callback_threadsafe(self, callback):
+        self.callbacks.put(callback)
+
+    def call_later(self, delay, callback):
+        timer = threading.Timer(delay, self.callbacks.put, args=(callback,))
+        timer.daemon = True
+        timer.start()
+        return timer
+
+    def remove_timeout(self, timer):
+        timer.cancel()
+
+    def runCallbacks(self, count, timeout=5.0):
+        for _ in range(count):
+            self.callbacks.get(timeout=timeout)()
+
+
+class RecordingChannel:
+    """Channel stand-in recording downstream publishes - publishing a body of b"unroutable" fails."""
+
+    def __init__(self):
+        self.published = []
+
+    def basic_publish(self, exchange, routing_key, body, properties=None, mandatory=False):  # noqa: ARG002
+        if body == b"unroutable":
+            raise pika.exceptions.UnroutableError([])
+        self.published.append((routing_key, body))
+
+
+class RecordingConsumer:
+    """Consumer stand-in recording the order of work and acknowledgements."""
+
+    def __init__(self):
+        self.processed = []
+        self.acks = []
+        self.ackThreads = []
+        self.rejects = []
+        self.timeouts = []
+        self.release = threading.Event()
+
+    def workerMethod(self, msgBody, deliveryTag=None, context=None):  # noqa: ARG002
+        self.processed.append(msgBody)
+        if context is not None:
+            context.publish(msgBody, "next_stage_queue")
+        if msgBody == b"fail":
+            raise ValueError("fail")
+        if msgBody == b"hang":
+            self.release.wait()
+        return True
+
+    def workerTimeout(self, deliveryTag):
+        self.timeouts.append(deliveryTag)
+
+    def workerSetup(self):
+        pass
+
+    def workerTeardown(self):
+        pass
+
+    def acknowledgeMessage(self, deliveryTag, multiple=False):
+        self.acks.append((deliveryTag, multiple))
+        self.ackThreads.append(threading.current_thread().name)
+
+    def rejectMessage(self, deliveryTag, requeue=False):
+        self.rejects.append((deliveryTag, requeue))
+
+
+class MessageDispatcherTests(unittest.TestCase):
+    def setUp(self):
+        self.__connection = QueuedConnection()
+        self.__consumer = RecordingConsumer()
+        self.__dispatcher = MessageDispatcher(self.__consumer, mode="thread", numWorkers=1)
+
+    def tearDown(self):
+        self.__consumer.release.set()
+        self.__dispatcher.shutdown(wait=True)
+
+    def __dispatch(self, deliveryTag, body, priority=None, headers=None):
+        self.__dispatcher.dispatch(Basic.Deliver(delivery_tag=deliveryTag), pika.BasicProperties(priority=priority, headers=headers), body)
+
+    def testAcknowledge(self):
+        self.__dispatcher.start(self.__connection)
+        self.__dispatch(1, b"ok")
+        self.__dispatch(2, b"fail")
+        self.__connection.runCallbacks(2)
+        # A failed message is logged and acknowledged by default
+        self.assertEqual(self.__consumer.acks, [(1, False), (2, False)])
+        self.assertEqual(self.__consumer.rejects, [])
+        self.assertEqual(self.__dispatcher.getInFlightCount(), 0)
+
+    def testRejectFailed(self):
+        self.__dispatcher.setRejectFailed(True)
+        self.__dispatcher.start(self.__connection)
+        self.__dispatch(1, b"ok")
+        self.__dispatch(2, b"fail")
+        self.__connection.runCallbacks(2)
+        self.assertEqual(self.__consumer.acks, [(1, False)])
+        self.assertEqual(self.__consumer.rejects, [(2, False)])
+
+    def testCompletionOnConnectionThread(self):
+        self.__dispatcher.setRejectFailed(True)
+        self.__dispatcher.start(self.__connection)
+        for deliveryTag, body in ((1, b"ok"), (2, b"fail"), (3, b"ok")):
+            self.__dispatch(deliveryTag, body)
+        deadline = time.time() + 5.0
+        while self.__connection.callbacks.qsize() < 3 and time.time() < deadline:
+            time.sleep(0.01)
+        # The workers have finished but nothing is settled until the connection thread runs the completions
+        self.assertEqual(self.__consumer.processed, [b"ok", b"fail", b"ok"])
+        self.assertEqual(self.__consumer.acks, [])
+        self.assertEqual(self.__consumer.rejects, [])
+        self.__connection.runCallbacks(3)
+        self.assertEqual(self.__consumer.acks, [(1, False), (3, False)])
+        self.assertEqual(self.__consumer.rejects, [(2, False)])
+        self.assertEqual(set(self.__consumer.ackThreads), {threading.current_thread().name})
+
+    def testShutdownWait(self):
+        self.__dispatcher.start(self.__connection)
+        self.__dispatch(1, b"hang")
+        self.__dispatch(2, b"ok")
+        threading.Timer(0.2, self.__consumer.release.set).start()
+        # Work already handed to the pool runs to completion before shutdown returns
+        self.__dispatcher.shutdown(wait=True)
+        self.assertEqual(self.__consumer.processed, [b"hang", b"ok"])
+        self.__connection.runCallbacks(2)
+        self.assertEqual(self.__consumer.acks, [(1, False), (2, False)])
+        self.assertEqual(self.__dispatcher.getInFlightCount(), 0)
+
+    def testAbandonInFlight(self):
+        self.__dispatcher.start(self.__connection)
+        self.__dispatch(1, b"hang")
+        self.__dispatch(2, b"ok")
+        self.__dispatcher.shutdown(wait=False)
+        self.assertEqual(self.__dispatcher.abandonInFlight(), 2)
+        self.assertEqual(self.__consumer.rejects, [(1, True), (2, True)])
+        self.assertEqual(self.__dispatcher.getInFlightCount(), 0)
+        # The completions that arrive after the deliveries were requeued are ignored
+        self.__consumer.release.set()
+        self.__connection.runCallbacks(2)
+        self.assertEqual(self.__consumer.acks, [])
+        self.assertEqual(self.__consumer.rejects, [(1, True), (2, True)])
+
+    def testPriorityOrder(self):
+        self.__dispatcher.setPriorityBuffer(bufferSize=10, agingSeconds=60.0)
+        self.assertEqual(self.__dispatcher.getPrefetchCount(), 11)
+        self.__dispatcher.start(self.__connection)
+        # The first delivery occupies the only worker, the others wait in the buffer
+        self.__dispatch(1, b"first", priority=0)
+        for deliveryTag, priority in ((2, 0), (3, 5), (4, 9), (5, 5)):
+            self.__dispatch(deliveryTag, b"p%d-%d" % (priority, deliveryTag), priority=priority)
+        self.assertEqual(self.__dispatcher.getWaitingCount(), 4)
+        self.__connection.runCallbacks(5)
+        self.assertEqual(self.__consumer.processed, [b"first", b"p9-4", b"p5-3", b"p5-5", b"p0-2"])
+        self.assertEqual([tag for tag, _multiple in self.__consumer.acks], [1, 4, 3, 5, 2])
+
+    def testPriorityAging(self):
+        self.__dispatcher.setPriorityBuffer(bufferSize=10, agingSeconds=0.01)
+        self.__dispatcher.start(self.__connection)
+        self.__dispatch(1, b"first")
+        self.__dispatch(2, b"old-low", priority=0)
+        time.sleep(0.1)
+        self.__dispatch(3, b"new-high", priority=5)
+        self.__connection.runCallbacks(3)
+        self.assertEqual(self.__consumer.processed, [b"first", b"old-low", b"new-high"])
+
+    def testTimeout(self):
+        self.__dispatcher.setTimeout(None, timeoutHeader="x-worker-timeout")
+        self.__dispatcher.start(self.__connection)
+        # The hung worker holds the only thread until the watchdog replaces it
+        self.__dispatch(1, b"hang", headers={"x-worker-timeout": 0.2})
+        self.__dispatch(2, b"ok")
+        self.__connection.runCallbacks(2)
+        self.assertEqual(self.__consumer.timeouts, [1])
+        self.assertEqual(self.__consumer.rejects, [(1, True)])
+        self.assertEqual(self.__consumer.acks, [(2, False)])
+        # The late completion of the expired worker is ignored
+        self.__consumer.release.set()
+        self.__connection.runCallbacks(1)
+        self.assertEqual(self.__consumer.acks, [(2, False)])
+        self.assertEqual(self.__dispatcher.getInFlightCount(), 0)
+
+    def testRequeuePending(self):
+        self.__dispatcher.setPriorityBuffer(bufferSize=10)
+        self.__dispatcher.start(self.__connection)
+        for deliveryTag in range(1, 4):
+            self.__dispatch(deliveryTag, b"msg")
+        self.assertEqual(self.__dispatcher.requeuePending(), 2)
+        self.__connection.runCallbacks(1)
+        self.assertEqual(self.__consumer.acks, [(1, False)])
+        self.assertEqual(sorted(self.__consumer.rejects), [(2, True), (3, True)])
+
+    def testStageContext(self):
+        channel = RecordingChannel()
+        self.__dispatcher.setStageContext(True)
+        self.__dispatcher.start(self.__connection, channel)
+        self.__dispatch(1, b"ok")
+        # The downstream publish precedes the completion on the connection thread
+        self.__connection.runCallbacks(2)
+        self.assertEqual(channel.published, [("next_stage_queue", b"ok")])
+        self.assertEqual(self.__consumer.acks, [(1, False)])
+        self.__dispatch(2, b"unroutable")
+        self.__connection.runCallbacks(2)
+        self.assertEqual(self.__consumer.acks, [(1, False)])
+        self.assertEqual(self.__consumer.rejects, [(2, True)])
+
+
+class WorkerThreadPoolTests(unittest.TestCase):
+    def setUp(self):
+        self.__lock = threading.Lock()
+        self.__running = 0
+        self.__maxRunning = 0
+        self.__setups = []
+        self.__teardowns = []
+        self.__release = threading.Event()
+        self.__pool = None
+
+    def tearDown(self):
+        self.__release.set()
+        if self.__pool is not None:
+            self.__pool.shutdown(wait=True)
+
+    def __work(self, duration=0.05):
+        with self.__lock:
+            self.__running += 1
+            self.__maxRunning = max(self.__maxRunning, self.__running)
+        if duration is None:
+            self.__release.wait(5.0)
+        else:
+            time.sleep(duration)
+        with self.__lock:
+            self.__running -= 1
+        return threading.current_thread().name
+
+    def __setup(self):
+        self.__setups.append(threading.current_thread().name)
+
+    def __teardown(self):
+        self.__teardowns.append(threading.current_thread().name)
+
+    def testConcurrencyLimit(self):
+        self.__pool = WorkerThreadPool(3)
+        futures = [self.__pool.submit(self.__work) for _ in range(9)]
+        names = {future.result(timeout=5.0) for future in futures}
+        self.assertEqual(self.__maxRunning, 3)
+        self.assertEqual(len(names), 3)
+
+    def testResize(self):
+        self.__pool = WorkerThreadPool(1)
+        for future in [self.__pool.submit(self.__work) for _ in range(4)]:
+            future.result(timeout=5.0)
+        self.assertEqual(self.__maxRunning, 1)
+        self.__pool.resize(4)
+        self.assertEqual(self.__pool.getNumThreads(), 4)
+        for future in [self.__pool.submit(self.__work) for _ in range(8)]:
+            future.result(timeout=5.0)
+        self.assertEqual(self.__maxRunning, 4)
+
+    def testHooks(self):
+        self.__pool = WorkerThreadPool(2, setupHook=self.__setup, teardownHook=self.__teardown)
+        names = {future.result(timeout=5.0) for future in [self.__pool.submit(self.__work, 0.01) for _ in range(10)]}
+        self.__pool.shutdown(wait=True)
+        # Each long-lived thread runs its hooks once, however many messages it works on
+        self.assertEqual(len(self.__setups), 2)
+        self.assertEqual(sorted(self.__teardowns), sorted(self.__setups))
+        self.assertLessEqual(names, set(self.__setups))
+
+    def testShutdownInFlight(self):
+        self.__pool = WorkerThreadPool(1, setupHook=self.__setup, teardownHook=self.__teardown)
+        futures = [self.__pool.submit(self.__work, None)] + [self.__pool.submit(self.__work, 0.01) for _ in range(3)]
+        deadline = time.time() + 5.0
+        while not futures[0].running() and time.time() < deadline:
+            time.sleep(0.01)
+        self.__pool.shutdown(wait=False)
+        self.assertFalse(futures[0].done())
+        # Work queued before the shutdown still runs, then the thread exits
+        self.__release.set()
+        for future in futures:
+            future.result(timeout=5.0)
+        deadline = time.time() + 5.0
+        while not self.__teardowns and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.__teardowns, self.__setups)
+        self.assertEqual(self.__pool.getNumThreads(), 0)
+
+
+def suiteDispatcher():
+    suite = unittest.TestSuite()
+    suite.addTest(MessageDispatcherTests("testAcknowledge"))
+    suite.addTest(MessageDispatcherTests("testRejectFailed"))
+    suite.addTest(MessageDispatcherTests("testCompletionOnConnectionThread"))
+    suite.addTest(MessageDispatcherTests("testShutdownWait"))
+    suite.addTest(MessageDispatcherTests("testAbandonInFlight"))
+    suite.addTest(MessageDispatcherTests("testPriorityOrder"))
+    suite.addTest(MessageDispatcherTests("testPriorityAging"))
+    suite.addTest(MessageDispatcherTests("testTimeout"))
+    suite.addTest(MessageDispatcherTests("testRequeuePending"))
+    suite.addTest(MessageDispatcherTests("testStageContext"))
+    suite.addTest(WorkerThreadPoolTests("testConcurrencyLimit"))
+    suite.addTest(WorkerThreadPoolTests("testResize"))
+    suite.addTest(WorkerThreadPoolTests("testHooks"))
+    suite.addTest(WorkerThreadPoolTests("testShutdownInFlight"))
+    return suite
+
+
+if __name__ == "__main__":
+    runner = unittest.TextTestRunner(failfast=True)
+    runner.run(suiteDispatcher())
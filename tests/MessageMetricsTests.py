@@ -0,0 +1,144 @@
+#
+# File: MessageMetricsTests.py
+# Date:  19-Oct-2026
+#
+# Updates:
+##
+"""
+Tests of the metrics registry, its Prometheus exposition and the metrics recorded by publishers and consumers.
+"""
+
+__docformat__ = "restructuredtext en"
+__license__ = "Creative Commons Attribution 3.0 Unported"
+__version__ = "V0.07"
+
+import logging
+import os
+import sys
+import threading
+import time
+import unittest
+import urllib.request
+
+if __package__ is None or __package__ == "":
+    from os import path
+
+    sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
+    from commonsetup import TESTOUTPUT  # type: ignore[import-not-found] # pylint: disable=import-error,unused-import
+else:
+    from .commonsetup import TESTOUTPUT  # noqa: F401
+
+from wwpdb.utils.message_queue import MessageMetrics
+from wwpdb.utils.message_queue.InMemoryBroker import InMemoryBroker
+from wwpdb.utils.message_queue.MessageConsumerBase import MessageConsumerBase
+from wwpdb.utils.message_queue.MessageMetrics import MetricsRegistry
+from wwpdb.utils.message_queue.MessagePublisher import MessagePublisher
+
+logging.basicConfig(level=logging.INFO, format="\n[%(levelname)s]-%(module)s.%(funcName)s: %(message)s")
+logger = logging.getLogger()
+
+
+class FailOddConsumer(MessageConsumerBase):
+    def workerMethod(self, msgBody, deliveryTag=None):  # noqa: ARG002
+        if int(msgBody) % 2:
+            raise ValueError(msgBody)
+        return True
+
+
+class MessageMetricsTests(unittest.TestCase):
+    def setUp(self):
+        self.__registry = MetricsRegistry(enabled=True)
+
+    def tearDown(self):
+        self.__registry.stop()
+        MessageMetrics.REGISTRY.setEnabled(False)
+
+    def testRender(self):
+        counter = self.__registry.counter("test_messages_total", "Test messages", ("queue",))
+        gauge = self.__registry.gauge("test_in_flight", "Test in flight")
+        histogram = self.__registry.histogram("test_seconds", "Test latency", buckets=(0.1, 1.0))
+        counter.inc(2, "a")
+        counter.inc(1, 'b"c')
+        gauge.inc(3)
+        gauge.dec()
+        for value in (0.05, 0.5, 0.5, 5.0):
+            histogram.observe(value)
+        self.assertEqual(counter.getValue("a"), 2)
+        self.assertEqual(histogram.getValue(), (4, 6.05))
+        text = self.__registry.render()
+        self.assertIn("# TYPE test_messages_total counter\n", text)
+        self.assertIn('test_messages_total{queue="a"} 2\n', text)
+        self.assertIn('test_messages_total{queue="b\\"c"} 1\n', text)
+        self.assertIn("test_in_flight 2\n", text)
+        self.assertIn('test_seconds_bucket{le="0.1"} 1\n', text)
+        self.assertIn('test_seconds_bucket{le="1.0"} 3\n', text)
+        self.assertIn('test_seconds_bucket{le="+Inf"} 4\n', text)
+        self.assertIn("test_seconds_count 4\n", text)
+        with self.assertRaises(ValueError):
+            self.__registry.counter("test_messages_total", "Duplicate")
+
+    def testDisabled(self):
+        counter = self.__registry.counter("test_messages_total", "Test messages")
+        histogram = self.__registry.histogram("test_seconds", "Test latency")
+        self.__registry.setEnabled(False)
+        counter.inc()
+        histogram.observe(1.0)
+        self.assertEqual(counter.getValue(), 0)
+        self.assertEqual(histogram.getValue(), (0, 0.0))
+        self.assertNotIn("test_seconds_count", self.__registry.render())
+
+    def testExposition(self):
+        self.__registry.counter("test_messages_total", "Test messages").inc(5)
+        port = self.__registry.startHttpServer(0)
+        with urllib.request.urlopen("http://127.0.0.1:%d/metrics" % port, timeout=5.0) as response:
+            self.assertEqual(response.status, 200)
+            self.assertIn("test_messages_total 5", response.read().decode("utf-8"))
+        filePath = os.path.join(TESTOUTPUT, "test-metrics.prom")
+        self.assertTrue(self.__registry.writeTextFile(filePath))
+        with open(filePath) as ifh:
+            self.assertIn("test_messages_total 5", ifh.read())
+        self.assertFalse(os.path.exists(filePath + ".tmp"))
+
+    def testPublishConsume(self):
+        MessageMetrics.REGISTRY.setEnabled(True)
+        broker = InMemoryBroker()
+        publisher = MessagePublisher(local=True, transport=broker)
+        for ii in range(6):
+            self.assertTrue(publisher.publish(str(ii), exchangeName="test_metrics_exchange", queueName="test_metrics_queue", routingKey="test_routing_key"))
+        self.assertEqual(MessageMetrics.PUBLISHED_MESSAGES.getValue("test_metrics_exchange"), 6)
+        self.assertEqual(MessageMetrics.PUBLISHED_BYTES.getValue("test_metrics_exchange"), 6)
+        self.assertEqual(MessageMetrics.PUBLISH_SECONDS.getValue("test_metrics_exchange")[0], 6)
+        consumer = FailOddConsumer(amqpUrl="", transport=broker)
+        consumer.setQueue("test_metrics_queue", "test_routing_key")
+        consumer.setExchange("test_metrics_exchange")
+        consumer.setExecutionMode("thread", numWorkers=2)
+        consumer.setRejectFailed()
+        thread = threading.Thread(target=consumer.run)
+        thread.start()
+        try:
+            deadline = time.time() + 5.0
+            while MessageMetrics.ACKS.getValue("test_metrics_queue") + MessageMetrics.NACKS.getValue("test_metrics_queue", "false") < 6 and time.time() < deadline:
+                time.sleep(0.01)
+        finally:
+            consumer.requestDrain(timeout=5.0)
+            thread.join(10.0)
+        self.assertEqual(MessageMetrics.CONSUMED_MESSAGES.getValue("test_metrics_queue"), 6)
+        self.assertEqual(MessageMetrics.ACKS.getValue("test_metrics_queue"), 3)
+        self.assertEqual(MessageMetrics.NACKS.getValue("test_metrics_queue", "false"), 3)
+        self.assertEqual(MessageMetrics.WORKER_SECONDS.getValue("test_metrics_queue")[0], 6)
+        self.assertEqual(MessageMetrics.WORKER_IN_FLIGHT.getValue("test_metrics_queue"), 0)
+        self.assertIn('mq_acks_total{queue="test_metrics_queue"} 3', MessageMetrics.REGISTRY.render())
+
+
+def suiteMessageMetrics():
+    suite = unittest.TestSuite()
+    suite.addTest(MessageMetricsTests("testRender"))
+    suite.addTest(MessageMetricsTests("testDisabled"))
+    suite.addTest(MessageMetricsTests("testExposition"))
+    suite.addTest(MessageMetricsTests("testPublishConsume"))
+    return suite
+
+
+if __name__ == "__main__":
+    runner = unittest.TextTestRunner(failfast=True)
+    runner.run(suiteMessageMetrics())
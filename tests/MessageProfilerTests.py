@@ -0,0 +1,162 @@
+#
+# File: MessageProfilerTests.py
+# Date:  19-Oct-2026
+#
+# Updates:
+#  19-Oct-2026       concurrent sampled calls and unwritable profile output
+#  19-Oct-2026       profile file prefix set by a later setQueue()
+##
+"""
+Tests of sampled cProfile and slow call stack profiles of workerMethod calls.
+"""
+
+__docformat__ = "restructuredtext en"
+__license__ = "Creative Commons Attribution 3.0 Unported"
+__version__ = "V0.07"
+
+import glob
+import logging
+import os
+import pstats
+import shutil
+import sys
+import threading
+import time
+import unittest
+from unittest import mock
+
+if __package__ is None or __package__ == "":
+    from os import path
+
+    sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
+    from commonsetup import TESTOUTPUT  # type: ignore[import-not-found] # pylint: disable=import-error,unused-import
+else:
+    from .commonsetup import TESTOUTPUT  # noqa: F401
+
+from wwpdb.utils.message_queue.InMemoryBroker import InMemoryBroker
+from wwpdb.utils.message_queue.MessageConsumerBase import MessageConsumerBase
+from wwpdb.utils.message_queue.MessageProfiler import MessageProfiler
+from wwpdb.utils.message_queue.MessagePublisher import MessagePublisher
+
+logging.basicConfig(level=logging.INFO, format="\n[%(levelname)s]-%(module)s.%(funcName)s: %(message)s")
+logger = logging.getLogger()
+
+
+def slowWork(seconds):
+    time.sleep(seconds)
+    return seconds
+
+
+class CountingConsumer(MessageConsumerBase):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.numDone = 0
+
+    def workerMethod(self, msgBody, deliveryTag=None):  # noqa: ARG002
+        self.numDone += 1
+        return sum(range(int(msgBody)))
+
+
+class MessageProfilerTests(unittest.TestCase):
+    def setUp(self):
+        self.__profileDir = os.path.join(TESTOUTPUT, "profiles")
+        shutil.rmtree(self.__profileDir, ignore_errors=True)
+
+    def testEveryN(self):
+        profiler = MessageProfiler(self.__profileDir, everyN=2, maxFiles=2)
+        for _ in range(4):
+            self.assertEqual(profiler.run(slowWork, 0.0), 0.0)
+        filePaths = glob.glob(os.path.join(self.__profileDir, "worker_*.prof"))
+        self.assertEqual(len(filePaths), 2)
+        self.assertIn("slowWork", str(pstats.Stats(filePaths[0]).stats))
+        for _ in range(4):
+            profiler.run(slowWork, 0.0)
+        self.assertEqual(len(glob.glob(os.path.join(self.__profileDir, "worker_*.prof"))), 2)
+        self.assertEqual(profiler.getNumCalls(), 8)
+
+    def testSlowCalls(self):
+        profiler = MessageProfiler(self.__profileDir, slowSeconds=0.05, sampleInterval=0.01)
+        profiler.run(slowWork, 0.0)
+        self.assertEqual(glob.glob(os.path.join(self.__profileDir, "*.collapsed")), [])
+        profiler.run(slowWork, 0.3)
+        filePaths = glob.glob(os.path.join(self.__profileDir, "worker_*.collapsed"))
+        self.assertEqual(len(filePaths), 1)
+        with open(filePaths[0]) as ifh:
+            lines = ifh.read().splitlines()
+        self.assertTrue(lines)
+        self.assertTrue(all("slowWork" in line.rsplit(" ", 1)[0] for line in lines))
+
+    def testConcurrentSampling(self):
+        profiler = MessageProfiler(self.__profileDir, slowSeconds=0.0, sampleInterval=0.0005, maxFiles=5)
+        errors = []
+
+        def runCalls():
+            try:
+                for _ in range(50):
+                    self.assertEqual(profiler.run(slowWork, 0.002), 0.002)
+            except Exception as e:  # noqa: BLE001
+                errors.append(e)
+
+        threads = [threading.Thread(target=runCalls) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(30.0)
+        self.assertEqual(errors, [])
+        self.assertEqual(profiler.getNumCalls(), 200)
+        self.assertLessEqual(len(glob.glob(os.path.join(self.__profileDir, "worker_*.collapsed"))), 5)
+
+    def testUnwritableOutput(self):
+        os.makedirs(TESTOUTPUT, exist_ok=True)
+        with open(self.__profileDir, "w") as ofh:
+            ofh.write("not a directory")
+        try:
+            profiler = MessageProfiler(self.__profileDir, everyN=1, slowSeconds=0.01, sampleInterval=0.005)
+            # Profile output that cannot be written is logged, the calls still succeed
+            self.assertEqual(profiler.run(slowWork, 0.0), 0.0)
+            self.assertEqual(profiler.run(slowWork, 0.1), 0.1)
+        finally:
+            os.remove(self.__profileDir)
+        profiler = MessageProfiler(self.__profileDir, slowSeconds=0.01, sampleInterval=0.005)
+        failure = RuntimeError("dictionary changed size during iteration")
+        with mock.patch.object(MessageProfiler, "_MessageProfiler__writeCollapsed", side_effect=failure) as writeCollapsed:
+            self.assertEqual(profiler.run(slowWork, 0.1), 0.1)
+        self.assertEqual(writeCollapsed.call_count, 1)
+
+    def testConsumer(self):
+        broker = InMemoryBroker()
+        publisher = MessagePublisher(local=True, transport=broker)
+        for _ in range(6):
+            publisher.publish("100000", exchangeName="test_exchange", queueName="test_profile_queue", routingKey="test_routing_key")
+        consumer = CountingConsumer(amqpUrl="", transport=broker)
+        # Profiling set up before the queue still names the files after the queue
+        consumer.setProfiling(self.__profileDir, everyN=3)
+        consumer.setQueue("test_profile_queue", "test_routing_key")
+        consumer.setExchange("test_exchange")
+        consumer.setExecutionMode("thread", numWorkers=1)
+        thread = threading.Thread(target=consumer.run)
+        thread.start()
+        try:
+            deadline = time.time() + 5.0
+            while consumer.numDone < 6 and time.time() < deadline:
+                time.sleep(0.01)
+        finally:
+            consumer.requestDrain(timeout=5.0)
+            thread.join(10.0)
+        self.assertEqual(consumer.numDone, 6)
+        self.assertEqual(len(glob.glob(os.path.join(self.__profileDir, "test_profile_queue_*.prof"))), 2)
+
+
+def suiteMessageProfiler():
+    suite = unittest.TestSuite()
+    suite.addTest(MessageProfilerTests("testEveryN"))
+    suite.addTest(MessageProfilerTests("testSlowCalls"))
+    suite.addTest(MessageProfilerTests("testConcurrentSampling"))
+    suite.addTest(MessageProfilerTests("testUnwritableOutput"))
+    suite.addTest(MessageProfilerTests("testConsumer"))
+    return suite
+
+
+if __name__ == "__main__":
+    runner = unittest.TextTestRunner(failfast=True)
+    runner.run(suiteMessageProfiler())
@@ -0,0 +1,154 @@
+#
+# File: MessageRetryPolicyTests.py
+# Date:  19-Oct-2026
+#
+# Updates:
+#  19-Oct-2026       retry and dead-lettering of a failing message through a consumer and the in-process broker
+##
+"""
+Tests of the retry queue topology and routing of failed messages in MessageRetryPolicy.
+"""
+
+__docformat__ = "restructuredtext en"
+__license__ = "Creative Commons Attribution 3.0 Unported"
+__version__ = "V0.07"
+
+import logging
+import sys
+import threading
+import time
+import unittest
+
+import pika
+
+if __package__ is None or __package__ == "":
+    from os import path
+
+    sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
+    from commonsetup import TESTOUTPUT  # type: ignore[import-not-found] # pylint: disable=import-error,unused-import
+else:
+    from .commonsetup import TESTOUTPUT  # noqa: F401
+
+from wwpdb.utils.message_queue.InMemoryBroker import InMemoryBroker
+from wwpdb.utils.message_queue.MessageConsumerBase import MessageConsumerBase
+from wwpdb.utils.message_queue.MessageRetryPolicy import MessageRetryPolicy
+
+logging.basicConfig(level=logging.INFO, format="\n[%(levelname)s]-%(module)s.%(funcName)s: %(message)s")
+logger = logging.getLogger()
+
+
+class RecordingChannel:
+    """Channel stand-in recording queue declarations and publications."""
+
+    def __init__(self):
+        self.declared = {}
+        self.published = []
+
+    def queue_declare(self, queue, durable=False, arguments=None):
+        self.declared[queue] = (durable, arguments)
+
+    def basic_publish(self, exchange, routing_key, body, properties=None):
+        self.published.append((exchange, routing_key, body, properties))
+
+
+class MessageRetryPolicyTests(unittest.TestCase):
+    def setUp(self):
+        self.__channel = RecordingChannel()
+        self.__policy = MessageRetryPolicy(retryDelays=(10, 60), maxAttempts=4)
+        self.__policy.declare(self.__channel, "work_queue")
+
+    def testDeclare(self):
+        self.assertIn("work_queue.dead", self.__channel.declared)
+        _durable, arguments = self.__channel.declared["work_queue.retry.10000"]
+        self.assertEqual(arguments["x-message-ttl"], 10000)
+        self.assertEqual(arguments["x-dead-letter-exchange"], "")
+        self.assertEqual(arguments["x-dead-letter-routing-key"], "work_queue")
+        self.assertIn("work_queue.retry.60000", self.__channel.declared)
+
+    def testRetryTiers(self):
+        properties = pika.BasicProperties(delivery_mode=2, priority=5, headers={"app": "test"})
+        targets = []
+        for _ in range(4):
+            targets.append(self.__policy.retry(self.__channel, properties, b"body", reason="ValueError()"))
+            properties = self.__channel.published[-1][3]
+        self.assertEqual(targets, ["work_queue.retry.10000", "work_queue.retry.60000", "work_queue.retry.60000", "work_queue.dead"])
+        self.assertEqual(properties.headers[MessageRetryPolicy.COUNT_HEADER], 4)
+        self.assertEqual(properties.headers["app"], "test")
+        self.assertEqual(properties.priority, 5)
+        self.assertEqual(MessageRetryPolicy.getAttemptCount(properties), 4)
+
+
+class FailingConsumer(MessageConsumerBase):
+    """Consumer failing every message and recording the retry count of each attempt."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.attempts = []
+        self.acks = []
+        self.rejects = []
+
+    def workerMethod(self, msgBody, deliveryTag=None):
+        raise ValueError("cannot process %r" % msgBody)
+
+    def workerCompleted(self, properties, result, exc):  # noqa: ARG002
+        self.attempts.append(MessageRetryPolicy.getAttemptCount(properties))
+
+    def acknowledgeMessage(self, deliveryTag, multiple=False):
+        self.acks.append(deliveryTag)
+        super().acknowledgeMessage(deliveryTag, multiple=multiple)
+
+    def rejectMessage(self, deliveryTag, requeue=False):
+        self.rejects.append((deliveryTag, requeue))
+        super().rejectMessage(deliveryTag, requeue=requeue)
+
+
+class MessageRetryConsumerTests(unittest.TestCase):
+    def __waitFor(self, condition, timeout=5.0):
+        deadline = time.time() + timeout
+        while not condition() and time.time() < deadline:
+            time.sleep(0.01)
+        return condition()
+
+    def testRetryDeadLetter(self):
+        broker = InMemoryBroker()
+        consumer = FailingConsumer(amqpUrl="", transport=broker)
+        consumer.setQueue("test_retry_queue", None)
+        consumer.setRetryPolicy(retryDelays=(0.5,), maxAttempts=2)
+        thread = threading.Thread(target=consumer.run)
+        thread.start()
+        try:
+            self.assertTrue(self.__waitFor(consumer.isConsuming))
+            channel = broker.connect().channel()
+            channel.basic_publish(exchange="", routing_key="test_retry_queue", body=b"poison", properties=pika.BasicProperties(headers={"app": "test"}))
+            # The first failure parks the message in the retry queue and acknowledges the original delivery
+            self.assertTrue(self.__waitFor(lambda: broker.getQueueDepth("test_retry_queue.retry.500") == 1))
+            self.assertEqual(consumer.acks, [1])
+            # The broker returns it to the work queue after the delay, and the second failure dead-letters it
+            self.assertTrue(self.__waitFor(lambda: broker.getQueueDepth("test_retry_queue.dead") == 1))
+        finally:
+            consumer.requestDrain(timeout=5.0)
+            thread.join(10.0)
+        self.assertEqual(consumer.attempts, [0, 1])
+        self.assertEqual(consumer.acks, [1, 2])
+        self.assertEqual(consumer.rejects, [])
+        self.assertEqual(broker.getQueueDepth("test_retry_queue"), 0)
+        self.assertEqual(broker.getQueueDepth("test_retry_queue.retry.500"), 0)
+        method, properties, body = channel.basic_get("test_retry_queue.dead", auto_ack=True)
+        self.assertIsNotNone(method)
+        self.assertEqual(body, b"poison")
+        self.assertEqual(properties.headers[MessageRetryPolicy.COUNT_HEADER], 2)
+        self.assertIn("ValueError", properties.headers[MessageRetryPolicy.ERROR_HEADER])
+        self.assertEqual(properties.headers["app"], "test")
+
+
+def suiteRetryPolicy():
+    suite = unittest.TestSuite()
+    suite.addTest(MessageRetryPolicyTests("testDeclare"))
+    suite.addTest(MessageRetryPolicyTests("testRetryTiers"))
+    suite.addTest(MessageRetryConsumerTests("testRetryDeadLetter"))
+    return suite
+
+
+if __name__ == "__main__":
+    runner = unittest.TextTestRunner(failfast=True)
+    runner.run(suiteRetryPolicy())
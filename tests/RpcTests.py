@@ -0,0 +1,123 @@
+#
+# File: RpcTests.py
+# Date:  19-Oct-2026
+#
+# Updates:
+#  19-Oct-2026       single error reply under a retry policy, batch mode refused
+##
+"""
+Tests of request/reply calls between RpcClient and RpcServer over the in-process broker.
+"""
+
+__docformat__ = "restructuredtext en"
+__license__ = "Creative Commons Attribution 3.0 Unported"
+__version__ = "V0.07"
+
+import logging
+import sys
+import threading
+import time
+import unittest
+
+if __package__ is None or __package__ == "":
+    from os import path
+
+    sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
+    from commonsetup import TESTOUTPUT  # type: ignore[import-not-found] # pylint: disable=import-error,unused-import
+else:
+    from .commonsetup import TESTOUTPUT  # noqa: F401
+
+from wwpdb.utils.message_queue.InMemoryBroker import InMemoryBroker
+from wwpdb.utils.message_queue.RpcClient import RpcClient, RpcError
+from wwpdb.utils.message_queue.RpcServer import RpcServer
+
+logging.basicConfig(level=logging.INFO, format="\n[%(levelname)s]-%(module)s.%(funcName)s: %(message)s")
+logger = logging.getLogger()
+
+
+class UpperCaseServer(RpcServer):
+    def workerMethod(self, msgBody, deliveryTag=None):  # noqa: ARG002
+        if msgBody == b"fail":
+            raise ValueError("bad request")
+        if msgBody == b"slow":
+            time.sleep(0.5)
+        return msgBody.upper()
+
+
+class CountingServer(UpperCaseServer):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.replies = []
+
+    def workerCompleted(self, properties, result, exc):
+        self.replies.append(exc)
+        return super().workerCompleted(properties, result, exc)
+
+
+class RpcTests(unittest.TestCase):
+    def setUp(self):
+        self.__broker = InMemoryBroker()
+        self.__server = UpperCaseServer(amqpUrl="", transport=self.__broker)
+        self.__server.setQueue("test_rpc_queue", None)
+        self.__server.setExecutionMode("thread", numWorkers=4)
+        self.__thread = threading.Thread(target=self.__server.run)
+        self.__thread.start()
+        deadline = time.time() + 5.0
+        while not self.__server.isConsuming() and time.time() < deadline:
+            time.sleep(0.01)
+        self.__client = RpcClient(transport=self.__broker, local=True)
+
+    def tearDown(self):
+        self.__client.close()
+        self.__server.requestDrain(timeout=5.0)
+        self.__thread.join(10.0)
+
+    def testCall(self):
+        self.assertEqual(self.__client.call("hello", "test_rpc_queue", timeout=5.0), b"HELLO")
+        futures = [self.__client.callAsync("request %d" % ii, "test_rpc_queue", timeout=5.0) for ii in range(20)]
+        self.assertEqual([future.result() for future in futures], [b"REQUEST %d" % ii for ii in range(20)])
+
+    def testErrorAndTimeout(self):
+        with self.assertRaises(RpcError):
+            self.__client.call("fail", "test_rpc_queue", timeout=5.0)
+        with self.assertRaises(TimeoutError):
+            self.__client.call("slow", "test_rpc_queue", timeout=0.1)
+        # The late reply to the expired call is dropped and does not disturb later calls
+        time.sleep(0.5)
+        self.assertEqual(self.__client.call("after", "test_rpc_queue", timeout=5.0), b"AFTER")
+
+    def testErrorNotRetried(self):
+        server = CountingServer(amqpUrl="", transport=self.__broker)
+        self.assertFalse(server.setBatch(10))
+        server.setQueue("test_rpc_retry_queue", None)
+        server.setRetryPolicy(retryDelays=(0.2,), maxAttempts=2)
+        thread = threading.Thread(target=server.run)
+        thread.start()
+        try:
+            deadline = time.time() + 5.0
+            while not server.isConsuming() and time.time() < deadline:
+                time.sleep(0.01)
+            with self.assertRaises(RpcError):
+                self.__client.call("fail", "test_rpc_retry_queue", timeout=5.0)
+            # The error reply settles the request - it is neither retried nor answered a second time
+            time.sleep(0.5)
+            self.assertEqual(len(server.replies), 1)
+            self.assertEqual(self.__broker.getQueueDepth("test_rpc_retry_queue.retry.200"), 0)
+            self.assertEqual(self.__broker.getQueueDepth("test_rpc_retry_queue.dead"), 0)
+            self.assertEqual(self.__broker.getQueueDepth("test_rpc_retry_queue"), 0)
+        finally:
+            server.requestDrain(timeout=5.0)
+            thread.join(10.0)
+
+
+def suiteRpc():
+    suite = unittest.TestSuite()
+    suite.addTest(RpcTests("testCall"))
+    suite.addTest(RpcTests("testErrorAndTimeout"))
+    suite.addTest(RpcTests("testErrorNotRetried"))
+    return suite
+
+
+if __name__ == "__main__":
+    runner = unittest.TextTestRunner(failfast=True)
+    runner.run(suiteRpc())
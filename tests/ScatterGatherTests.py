@@ -0,0 +1,104 @@
+#
+# File: ScatterGatherTests.py
+# Date:  19-Oct-2026
+#
+# Updates:
+##
+"""
+Tests of scattering subtasks to RpcServer consumers and aggregating the replies over the in-process broker.
+"""
+
+__docformat__ = "restructuredtext en"
+__license__ = "Creative Commons Attribution 3.0 Unported"
+__version__ = "V0.07"
+
+import logging
+import sys
+import threading
+import time
+import unittest
+
+if __package__ is None or __package__ == "":
+    from os import path
+
+    sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
+    from commonsetup import TESTOUTPUT  # type: ignore[import-not-found] # pylint: disable=import-error,unused-import
+else:
+    from .commonsetup import TESTOUTPUT  # noqa: F401
+
+from wwpdb.utils.message_queue.InMemoryBroker import InMemoryBroker
+from wwpdb.utils.message_queue.RpcClient import RpcClient, RpcError
+from wwpdb.utils.message_queue.RpcServer import RpcServer
+from wwpdb.utils.message_queue.ScatterGather import ScatterGather
+
+logging.basicConfig(level=logging.INFO, format="\n[%(levelname)s]-%(module)s.%(funcName)s: %(message)s")
+logger = logging.getLogger()
+
+
+class SquareServer(RpcServer):
+    def workerMethod(self, msgBody, deliveryTag=None):  # noqa: ARG002
+        if msgBody == b"hang":
+            time.sleep(1.0)
+        return str(int(msgBody) ** 2)
+
+
+class ScatterGatherTests(unittest.TestCase):
+    def setUp(self):
+        self.__broker = InMemoryBroker()
+        self.__servers = []
+        self.__threads = []
+        for _ in range(2):
+            server = SquareServer(amqpUrl="", transport=self.__broker)
+            server.setQueue("test_chain_queue", None)
+            server.setExecutionMode("thread", numWorkers=2)
+            self.__servers.append(server)
+            self.__threads.append(threading.Thread(target=server.run))
+            self.__threads[-1].start()
+        deadline = time.time() + 5.0
+        while not all(server.isConsuming() for server in self.__servers) and time.time() < deadline:
+            time.sleep(0.01)
+        self.__client = RpcClient(transport=self.__broker, local=True)
+
+    def tearDown(self):
+        self.__client.close()
+        for server in self.__servers:
+            server.requestDrain(timeout=5.0)
+        for thread in self.__threads:
+            thread.join(10.0)
+
+    def testGather(self):
+        partials = []
+        completed = []
+        job = ScatterGather(self.__client).gather(
+            [str(ii) for ii in range(10)] + ["x"],
+            "test_chain_queue",
+            timeout=5.0,
+            onResult=lambda job, index, result, exc: partials.append(index),
+            onComplete=completed.append,
+            jobId="test-job",
+        )
+        self.assertTrue(job.isDone())
+        self.assertEqual(job.getJobId(), "test-job")
+        self.assertEqual(sorted(partials), list(range(11)))
+        self.assertEqual(completed, [job])
+        self.assertEqual(job.getResults(), [str(ii * ii).encode() for ii in range(10)] + [None])
+        self.assertEqual(list(job.getErrors()), [10])
+        self.assertIsInstance(job.getErrors()[10], RpcError)
+
+    def testTimeout(self):
+        job = ScatterGather(self.__client).scatter(["2", "hang"], "test_chain_queue", timeout=0.3)
+        self.assertTrue(job.wait(5.0))
+        self.assertEqual(job.getResults()[0], b"4")
+        self.assertIsInstance(job.getErrors()[1], TimeoutError)
+
+
+def suiteScatterGather():
+    suite = unittest.TestSuite()
+    suite.addTest(ScatterGatherTests("testGather"))
+    suite.addTest(ScatterGatherTests("testTimeout"))
+    return suite
+
+
+if __name__ == "__main__":
+    runner = unittest.TextTestRunner(failfast=True)
+    runner.run(suiteScatterGather())
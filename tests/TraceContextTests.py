@@ -0,0 +1,139 @@
+#
+# File: TraceContextTests.py
+# Date:  19-Oct-2026
+#
+# Updates:
+##
+"""
+Tests of the publish timestamp and trace headers and their propagation through consumers and pipeline stages.
+"""
+
+__docformat__ = "restructuredtext en"
+__license__ = "Creative Commons Attribution 3.0 Unported"
+__version__ = "V0.07"
+
+import logging
+import sys
+import threading
+import time
+import unittest
+
+import pika
+
+if __package__ is None or __package__ == "":
+    from os import path
+
+    sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
+    from commonsetup import TESTOUTPUT  # type: ignore[import-not-found] # pylint: disable=import-error,unused-import
+else:
+    from .commonsetup import TESTOUTPUT  # noqa: F401
+
+from wwpdb.utils.message_queue.InMemoryBroker import InMemoryBroker
+from wwpdb.utils.message_queue.MessageConsumerBase import MessageConsumerBase
+from wwpdb.utils.message_queue.MessagePublisher import MessagePublisher
+from wwpdb.utils.message_queue.TraceContext import (
+    PUBLISHED_HEADER,
+    TRACE_HEADER,
+    TraceContext,
+    stampHeaders,
+)
+
+logging.basicConfig(level=logging.INFO, format="\n[%(levelname)s]-%(module)s.%(funcName)s: %(message)s")
+logger = logging.getLogger()
+
+
+class ForwardingConsumer(MessageConsumerBase):
+    """Stage 1 - forwards each message to stage 2 with a MessagePublisher, continuing its trace."""
+
+    def __init__(self, *args, **kwargs):
+        self.traces = []
+        self.broker = kwargs["transport"]
+        super().__init__(*args, **kwargs)
+
+    def workerMethod(self, msgBody, deliveryTag=None, trace=None):  # noqa: ARG002
+        self.traces.append(trace)
+        return MessagePublisher(local=True, transport=self.broker).publish(msgBody, "test_trace_exchange", "test_trace2_queue", "test_trace2_key", trace=trace)
+
+
+class StageConsumer(MessageConsumerBase):
+    """Stage 2 - hands each message to stage 3 through its stage context."""
+
+    def workerMethod(self, msgBody, deliveryTag=None, context=None):  # noqa: ARG002
+        context.publish(msgBody, "test_trace3_queue")
+        return True
+
+
+def runUntil(consumer, condition, timeout=5.0):
+    thread = threading.Thread(target=consumer.run)
+    thread.start()
+    try:
+        deadline = time.time() + timeout
+        while not condition() and time.time() < deadline:
+            time.sleep(0.01)
+    finally:
+        consumer.requestDrain(timeout=5.0)
+        thread.join(10.0)
+    return condition()
+
+
+class TraceContextTests(unittest.TestCase):
+    def testHeaders(self):
+        headers, timestamp = stampHeaders({"site": "rcsb"})
+        self.assertEqual(headers["site"], "rcsb")
+        self.assertLessEqual(abs(timestamp - time.time()), 2)
+        trace = TraceContext.fromProperties(pika.BasicProperties(headers=headers, timestamp=timestamp))
+        self.assertEqual(trace.toHeader(), headers[TRACE_HEADER])
+        self.assertEqual(trace.publishedMs, headers[PUBLISHED_HEADER])
+        self.assertLess(trace.getQueueWait(), 2.0)
+        childHeaders, _ = stampHeaders(parent=trace)
+        child = TraceContext.fromProperties(pika.BasicProperties(headers=childHeaders))
+        self.assertEqual(child.traceId, trace.traceId)
+        self.assertNotEqual(child.spanId, trace.spanId)
+        # A message without headers starts a new trace, with the queue wait from the AMQP timestamp if set
+        self.assertIsNone(TraceContext.fromProperties(pika.BasicProperties()).getQueueWait())
+        self.assertEqual(TraceContext.fromProperties(pika.BasicProperties(timestamp=1000, headers={TRACE_HEADER: "bad"})).publishedMs, 1000000)
+
+    def testPropagation(self):
+        broker = InMemoryBroker()
+        channel = broker.connect().channel()
+        channel.queue_declare(queue="test_trace3_queue", durable=True)
+        publisher = MessagePublisher(local=True, transport=broker)
+        for ii in range(3):
+            self.assertTrue(publisher.publish("message %d" % ii, "test_trace_exchange", "test_trace1_queue", "test_trace1_key"))
+        sourceTraces = [TraceContext.fromProperties(channel.basic_get("test_trace1_queue")[1]) for _ in range(3)]
+        channel.close()
+        channel = broker.connect().channel()
+
+        forwarder = ForwardingConsumer(amqpUrl="", transport=broker)
+        forwarder.setQueue("test_trace1_queue", "test_trace1_key")
+        forwarder.setExchange("test_trace_exchange")
+        forwarder.setTracing()
+        self.assertTrue(runUntil(forwarder, lambda: broker.getQueueDepth("test_trace2_queue") == 3))
+        self.assertEqual(sorted(trace.spanId for trace in forwarder.traces), sorted(trace.spanId for trace in sourceTraces))
+
+        stage = StageConsumer(amqpUrl="", transport=broker)
+        stage.setQueue("test_trace2_queue", "test_trace2_key")
+        stage.setExchange("test_trace_exchange")
+        stage.setPipelineStage()
+        self.assertTrue(runUntil(stage, lambda: broker.getQueueDepth("test_trace3_queue") == 3))
+
+        traceIds = {trace.traceId for trace in sourceTraces}
+        self.assertEqual(len(traceIds), 3)
+        for _ in range(3):
+            _method, properties, _body = channel.basic_get("test_trace3_queue", auto_ack=True)
+            trace = TraceContext.fromProperties(properties)
+            self.assertIn(trace.traceId, traceIds)
+            self.assertNotIn(trace.spanId, {source.spanId for source in sourceTraces})
+            self.assertIsNotNone(properties.timestamp)
+
+
+def suiteTraceContext():
+    suite = unittest.TestSuite()
+    suite.addTest(TraceContextTests("testHeaders"))
+    suite.addTest(TraceContextTests("testPropagation"))
+    return suite
+
+
+if __name__ == "__main__":
+    runner = unittest.TextTestRunner(failfast=True)
+    runner.run(suiteTraceContext())
@@ -0,0 +1,356 @@
+#
+# File: AsyncMessageConsumerBase.py
+# Date:  19-Oct-2026
+#
+# Updates:
+#  19-Oct-2026       log the queue wait time and optionally pass the trace context to workerMethod
+#  19-Oct-2026       connect through the transport (MessageTransport.py) and record consumer metrics
+#  19-Oct-2026       asyncio connection from the transport (connectAsync), stop() callable from any thread
+##
+"""
+Asyncio message consumer  -
+
+Sibling of MessageConsumerBase for I/O bound services.  The workerMethod is a coroutine and
+many deliveries are processed concurrently on a single event loop, rather than one thread per message.
+
+The broker connection is opened through the transport (see MessageTransport.py) with connectAsync(), as
+a pika AsyncioConnection on the consumer event loop.  Connection and channel setup, deliveries,
+acknowledgements and rejections are all callbacks on that loop, which run() drives in the calling thread.
+
+This software was developed as part of the World Wide Protein Data Bank
+Common Deposition and Annotation System Project
+
+"""
+
+__docformat__ = "restructuredtext en"
+__license__ = "Creative Commons Attribution 3.0 Unported"
+__version__ = "V0.07"
+
+import asyncio
+import logging
+import threading
+import time
+
+from wwpdb.utils.message_queue import MessageMetrics
+from wwpdb.utils.message_queue.MessageTransport import PikaTransport
+from wwpdb.utils.message_queue.TraceContext import TraceContext
+
+try:
+    import exceptions  # type: ignore[import-not-found]
+except ImportError:
+    import builtins as exceptions
+
+
+logger = logging.getLogger()
+
+
+class AsyncMessageConsumerBase:
+    """Asyncio message consumer base class -
+
+    Subclasses implement the coroutine workerMethod().  Up to maxConcurrency deliveries are
+    held unacknowledged (broker prefetch) and each runs as a separate task on the event loop.
+    Deliveries are acknowledged when the coroutine returns and rejected if it raises.
+
+        class MyConsumer(AsyncMessageConsumerBase):
+            async def workerMethod(self, msgBody, deliveryTag=None):
+                await someService(msgBody)
+
+        mc = MyConsumer(amqpUrl, maxConcurrency=200)
+        mc.setQueue(queueName="test_queue", routingKey="text_message")
+        mc.setExchange(exchange="test_exchange", exchangeType="topic")
+        mc.run()
+
+    With metrics enabled (MessageMetrics.REGISTRY) the consumer records the same per queue metrics as
+    MessageConsumerBase - messages and bytes consumed, queue wait time, workerMethod time, tasks in flight,
+    acknowledgements and rejections.
+
+    """
+
+    def __init__(self, amqpUrl, priority=False, local=False, maxConcurrency=100, transport=None):
+        """Create a new instance of the consumer class, passing in the AMQP URL used to connect to RabbitMQ.
+
+        :param str amqp_url: The AMQP url to connect with
+        :param bool priority: consume from a priority queue
+        :param bool local: connect to a broker on localhost
+        :param int maxConcurrency: maximum number of workerMethod coroutines in flight
+        :param transport: transport providing connections (default PikaTransport, see MessageTransport.py)
+
+        """
+        self._connection = None
+        self._channel = None
+        self._loop = None
+        self._closing = False
+        self._consuming = False
+        self._consumerTag = None
+        self._url = amqpUrl
+        self.__exchange = None
+        self.__exchangeType = None
+        self.__queueName = None
+        self.__routingKey = None
+
+        self.__priority = priority
+        self.__local = local
+        self.__maxConcurrency = max(1, int(maxConcurrency))
+        self.__transport = transport if transport is not None else PikaTransport()
+        self.__tasks = set()
+        self.__tracing = False
+        self.__loopThreadId = None
+
+    def setQueue(self, queueName, routingKey):
+        self.__queueName = queueName
+        self.__routingKey = routingKey
+
+    def setExchange(self, exchange, exchangeType="topic"):
+        self.__exchange = exchange
+        self.__exchangeType = exchangeType
+        return True
+
+    def setTracing(self, enabled=True):
+        """Await workerMethod as workerMethod(msgBody, deliveryTag=..., trace=TraceContext) (see MessageConsumerBase.setTracing())."""
+        self.__tracing = enabled
+        return True
+
+    async def workerMethod(self, msgBody, deliveryTag=None):
+        raise exceptions.NotImplementedError
+
+    def connect(self):
+        """Open an asyncio connection through the transport on the consumer event loop.
+
+        :rtype: pika.adapters.asyncio_connection.AsyncioConnection (or the transport's equivalent)
+
+        """
+        logger.info("Connecting to %s", self._url)
+        return self.__transport.connectAsync(
+            self._loop,
+            on_open_callback=self.onConnectionOpen,
+            on_open_error_callback=self.onConnectionOpenError,
+            on_close_callback=self.onConnectionClosed,
+            url=self._url,
+            local=self.__local,
+        )
+
+    def run(self):
+        """Run the consumer on a new event loop until stop() completes.
+
+        A KeyboardInterrupt stops consuming, lets in-flight tasks complete and then returns.
+
+        """
+        self._closing = False
+        self._consuming = False
+        self._consumerTag = None
+        self._loop = asyncio.new_event_loop()
+        self.__loopThreadId = threading.get_ident()
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._connection = self.connect()
+            try:
+                self._loop.run_forever()
+            except KeyboardInterrupt:
+                self.stop()
+                if not self._connection.is_closed:
+                    self._loop.run_forever()
+            # The connection closed under tasks still running - their deliveries are redelivered by the broker
+            leftover = list(self.__tasks)
+            for task in leftover:
+                task.cancel()
+            if leftover:
+                self._loop.run_until_complete(asyncio.gather(*leftover, return_exceptions=True))
+        finally:
+            self._loop.close()
+            self._loop = None
+            asyncio.set_event_loop(None)
+        logger.info("Cleanly stopped")
+
+    def onConnectionOpen(self, unusedConnection):  # noqa: ARG002
+        """Callback method on successful connection to RabbitMQ server."""
+        logger.info("Connection opened")
+        self._connection.channel(on_open_callback=self.onChannelOpen)
+
+    def onConnectionOpenError(self, unusedConnection, err):  # noqa: ARG002
+        """Callback on failure to establish the connection."""
+        logger.error("Connection open failed: %r", err)
+        self._loop.stop()
+
+    def onConnectionClosed(self, unusedConnection, reason):  # noqa: ARG002
+        """Invoked when the connection is closed.  Unexpected closures also end run()."""
+        self._channel = None
+        self._consuming = False
+        if not self._closing:
+            logger.warning("Connection closed unexpectedly: %r", reason)
+        self._loop.stop()
+
+    def onChannelOpen(self, channel):
+        """Channel is open - declare the exchange (if any) and queue.
+
+        :param pika.channel.Channel channel: The channel object
+
+        """
+        logger.info("Channel opened")
+        self._channel = channel
+        self._channel.add_on_close_callback(self.onChannelClosed)
+        if self.__exchange:
+            self.setupExchange(self.__exchange, self.__exchangeType)
+        else:
+            self.setupQueue(self.__queueName)
+
+    def onChannelClosed(self, channel, reason):
+        """Invoked when the channel is closed - close the connection as well."""
+        if self._closing:
+            logger.info("Channel %i was closed: %r", channel, reason)
+        else:
+            logger.warning("Channel %i was closed: %r", channel, reason)
+        self._channel = None
+        self._consuming = False
+        if not self._connection.is_closing and not self._connection.is_closed:
+            self._connection.close()
+
+    def setupExchange(self, exchangeName, exchangeType):
+        logger.info("Declaring exchange %s", exchangeName)
+        self._channel.exchange_declare(callback=self.onExchangeDeclareOk, exchange=exchangeName, exchange_type=exchangeType, passive=False, durable=True)
+
+    def onExchangeDeclareOk(self, unused_frame):  # noqa: ARG002
+        logger.info("Exchange %s declared success", self.__exchange)
+        self.setupQueue(self.__queueName)
+
+    def setupQueue(self, queueName):
+        logger.info("Declaring queue %s", queueName)
+        arguments = {"x-max-priority": 10} if self.__priority else None
+        self._channel.queue_declare(callback=self.onQueueDeclareOk, queue=queueName, durable=True, arguments=arguments)
+
+    def onQueueDeclareOk(self, method_frame):  # noqa: ARG002 pylint: disable=unused-argument
+        if self.__exchange:
+            logger.info("Binding %s to %s with %s", self.__exchange, self.__queueName, self.__routingKey)
+            self._channel.queue_bind(callback=self.onBindOk, queue=self.__queueName, exchange=self.__exchange, routing_key=self.__routingKey)
+        else:
+            self.onBindOk(None)
+
+    def onBindOk(self, unused_frame):  # noqa: ARG002
+        logger.info("Queue %s ready, prefetch %d", self.__queueName, self.__maxConcurrency)
+        self._channel.basic_qos(prefetch_count=self.__maxConcurrency, callback=self.onBasicQosOk)
+
+    def onBasicQosOk(self, unused_frame):  # noqa: ARG002
+        self.startConsuming()
+
+    def startConsuming(self):
+        if self._closing:
+            # stop() was called while the channel was being set up
+            self.closeChannel()
+            return
+        logger.info("Issuing consumer related RPC commands")
+        self._channel.add_on_cancel_callback(self.onConsumerCancelled)
+        self._consumerTag = self._channel.basic_consume(queue=self.__queueName, on_message_callback=self.onMessage)
+        self._consuming = True
+
+    def onMessage(self, unused_channel, basic_deliver, properties, body):  # noqa: ARG002
+        """Invoked on the event loop when a message is delivered - schedule workerMethod as a task and return at once."""
+        logger.info("Received message # %s from %s: %s", basic_deliver.delivery_tag, properties.app_id, body)
+        if MessageMetrics.REGISTRY.enabled:
+            MessageMetrics.CONSUMED_MESSAGES.inc(1, self.__queueName)
+            MessageMetrics.CONSUMED_BYTES.inc(len(body), self.__queueName)
+        trace = TraceContext.fromProperties(properties)
+        queueWait = trace.getQueueWait()
+        if queueWait is not None:
+            MessageMetrics.QUEUE_WAIT_SECONDS.observe(queueWait, self.__queueName)
+            logger.info("Message %s (trace %s) waited %.3f seconds in queue", basic_deliver.delivery_tag, trace.traceId, queueWait)
+        kwargs = {"trace": trace} if self.__tracing else {}
+        task = self._loop.create_task(self.__runWorker(basic_deliver.delivery_tag, body, kwargs))
+        self.__tasks.add(task)
+        task.add_done_callback(self.__onTaskDone)
+        if MessageMetrics.REGISTRY.enabled:
+            MessageMetrics.WORKER_IN_FLIGHT.set(len(self.__tasks), self.__queueName)
+
+    def __onTaskDone(self, task):
+        self.__tasks.discard(task)
+        if MessageMetrics.REGISTRY.enabled:
+            MessageMetrics.WORKER_IN_FLIGHT.set(len(self.__tasks), self.__queueName)
+
+    async def __runWorker(self, deliveryTag, body, kwargs):
+        startTime = time.time()
+        try:
+            await self.workerMethod(body, deliveryTag=deliveryTag, **kwargs)
+        except asyncio.CancelledError:
+            self.rejectMessage(deliveryTag, requeue=True)
+            raise
+        except Exception as e:  # noqa: BLE001
+            logger.exception("Worker failing with exception")
+            logger.exception(e)
+            MessageMetrics.WORKER_SECONDS.observe(time.time() - startTime, self.__queueName)
+            self.rejectMessage(deliveryTag, requeue=False)
+        else:
+            logger.info("Done task")
+            MessageMetrics.WORKER_SECONDS.observe(time.time() - startTime, self.__queueName)
+            self.acknowledgeMessage(deliveryTag)
+
+    def acknowledgeMessage(self, deliveryTag):
+        logger.info("Acknowledging message %s", deliveryTag)
+        if self._channel is not None and self._channel.is_open:
+            self._channel.basic_ack(deliveryTag)
+            MessageMetrics.ACKS.inc(1, self.__queueName)
+
+    def rejectMessage(self, deliveryTag, requeue=False):
+        logger.info("Rejecting message %s (requeue=%r)", deliveryTag, requeue)
+        if self._channel is not None and self._channel.is_open:
+            self._channel.basic_nack(deliveryTag, requeue=requeue)
+            MessageMetrics.NACKS.inc(1, self.__queueName, str(requeue).lower())
+
+    def getInFlightCount(self):
+        """Return the number of workerMethod coroutines currently running."""
+        return len(self.__tasks)
+
+    def onConsumerCancelled(self, method_frame):
+        logger.info("Consumer was cancelled remotely, shutting down: %r", method_frame)
+        self._closing = True
+        self.onCancelOk(method_frame)
+
+    def stopConsuming(self):
+        if self._channel:
+            logger.info("Sending a Basic.Cancel command to RabbitMQ")
+            self._channel.basic_cancel(self._consumerTag, callback=self.onCancelOk)
+
+    def onCancelOk(self, unused_frame):  # noqa: ARG002
+        """The broker will deliver no more messages - let in-flight tasks finish and then close the channel."""
+        logger.info("RabbitMQ acknowledged the cancellation of the consumer")
+        self._consuming = False
+        if self.__tasks:
+            logger.info("Waiting for %d in-flight tasks", len(self.__tasks))
+            self._loop.create_task(self.__closeAfterTasks())
+        else:
+            self.closeChannel()
+
+    async def __closeAfterTasks(self):
+        await asyncio.gather(*list(self.__tasks), return_exceptions=True)
+        self.closeChannel()
+
+    def closeChannel(self):
+        logger.info("Closing the channel")
+        if self._channel is not None and self._channel.is_open:
+            self._channel.close()
+        elif self._connection is not None and not self._connection.is_closing and not self._connection.is_closed:
+            self._connection.close()
+
+    def stop(self):
+        """Cleanly shutdown the consumer - stop consuming, let in-flight tasks complete and close the connection.
+
+        May be called from any thread (including from workerMethod); run() returns once the connection is closed.
+
+        """
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        if threading.get_ident() == self.__loopThreadId:
+            self.__stop()
+            return
+        try:
+            loop.call_soon_threadsafe(self.__stop)
+        except RuntimeError:
+            # The loop closed meanwhile - run() has returned
+            pass
+
+    def __stop(self):
+        if self._closing:
+            return
+        logger.info("Clean stop")
+        self._closing = True
+        if self._consuming:
+            self.stopConsuming()
+        # Otherwise the channel is still being set up and startConsuming() closes it
@@ -0,0 +1,150 @@
+#
+# File: ConsumerAutoscaler.py
+# Date:  19-Oct-2026
+#
+# Updates:
+##
+"""
+Queue depth driven scaling of consumer concurrency.
+
+The autoscaler samples the number of ready messages in the work queue (passive Queue.Declare) and
+the fraction of busy workers at a fixed interval on the connection thread.  The worker pool (threads or
+processes) and the channel prefetch are grown when a backlog builds up and shrunk when the consumer idles.
+Separate up/down thresholds, consecutive-sample requirements and a cool down period provide hysteresis,
+so the pool size does not oscillate with short bursts.
+
+This software was developed as part of the World Wide Protein Data Bank
+Common Deposition and Annotation System Project
+
+"""
+
+__docformat__ = "restructuredtext en"
+__license__ = "Creative Commons Attribution 3.0 Unported"
+__version__ = "V0.07"
+
+import logging
+import math
+import time
+
+logger = logging.getLogger()
+
+
+class ConsumerAutoscaler:
+    """Grow and shrink a consumer's worker pool between minWorkers and maxWorkers -
+
+    :param int minWorkers: lower bound on the number of workers
+    :param int maxWorkers: upper bound on the number of workers
+    :param float interval: seconds between samples
+    :param float scaleUpBacklog: ready messages per worker that count as a backlog
+    :param float scaleDownUtilization: smoothed fraction of busy workers below which the pool is idle
+    :param int upSamples: consecutive backlog samples required before growing
+    :param int downSamples: consecutive idle samples required before shrinking
+    :param float cooldown: minimum seconds between two resize operations
+    :param float growthFactor: multiplier applied to the pool size when growing
+
+    """
+
+    def __init__(
+        self,
+        minWorkers=1,
+        maxWorkers=8,
+        interval=5.0,
+        scaleUpBacklog=2.0,
+        scaleDownUtilization=0.25,
+        upSamples=2,
+        downSamples=6,
+        cooldown=30.0,
+        growthFactor=1.5,
+    ):
+        self.__minWorkers = max(1, int(minWorkers))
+        self.__maxWorkers = max(self.__minWorkers, int(maxWorkers))
+        self.__interval = interval
+        self.__scaleUpBacklog = scaleUpBacklog
+        self.__scaleDownUtilization = scaleDownUtilization
+        self.__upSamples = upSamples
+        self.__downSamples = downSamples
+        self.__cooldown = cooldown
+        self.__growthFactor = growthFactor
+        self.__utilization = None
+        self.__upCount = 0
+        self.__downCount = 0
+        self.__lastResize = None
+        self.__connection = None
+        self.__channel = None
+        self.__queueName = None
+        self.__dispatcher = None
+        self.__timer = None
+
+    def getBounds(self):
+        return self.__minWorkers, self.__maxWorkers
+
+    def start(self, connection, channel, queueName, dispatcher):
+        """Begin sampling queueName on the consumer connection and resizing dispatcher."""
+        self.__connection = connection
+        self.__channel = channel
+        self.__queueName = queueName
+        self.__dispatcher = dispatcher
+        numWorkers = min(max(dispatcher.getNumWorkers(), self.__minWorkers), self.__maxWorkers)
+        if numWorkers != dispatcher.getNumWorkers():
+            self.__resize(numWorkers)
+        self.__timer = self.__connection.call_later(self.__interval, self.__onTimer)
+
+    def stop(self):
+        if self.__timer is not None and self.__connection is not None:
+            self.__connection.remove_timeout(self.__timer)
+        self.__timer = None
+
+    def evaluate(self, queueDepth, inFlight, numWorkers, now=None):
+        """Fold in one sample and return the desired number of workers.
+
+        :param int queueDepth: messages ready in the work queue
+        :param int inFlight: deliveries currently being processed
+        :param int numWorkers: current number of workers
+
+        """
+        now = time.time() if now is None else now
+        utilization = min(1.0, float(inFlight) / max(1, numWorkers))
+        self.__utilization = utilization if self.__utilization is None else 0.5 * utilization + 0.5 * self.__utilization
+
+        if queueDepth >= self.__scaleUpBacklog * numWorkers and numWorkers < self.__maxWorkers:
+            self.__upCount += 1
+            self.__downCount = 0
+        elif queueDepth == 0 and self.__utilization <= self.__scaleDownUtilization and numWorkers > self.__minWorkers:
+            self.__downCount += 1
+            self.__upCount = 0
+        else:
+            self.__upCount = 0
+            self.__downCount = 0
+
+        if self.__lastResize is not None and now - self.__lastResize < self.__cooldown:
+            return numWorkers
+        target = numWorkers
+        if self.__upCount >= self.__upSamples:
+            target = min(self.__maxWorkers, max(numWorkers + 1, math.ceil(numWorkers * self.__growthFactor)))
+        elif self.__downCount >= self.__downSamples:
+            target = max(self.__minWorkers, numWorkers - 1)
+        if target != numWorkers:
+            self.__upCount = 0
+            self.__downCount = 0
+            self.__lastResize = now
+        return target
+
+    def __onTimer(self):
+        self.__timer = None
+        try:
+            result = self.__channel.queue_declare(queue=self.__queueName, passive=True)
+            queueDepth = result.method.message_count
+            numWorkers = self.__dispatcher.getNumWorkers()
+            target = self.evaluate(queueDepth, self.__dispatcher.getInFlightCount(), numWorkers)
+            logger.debug("Autoscaler sample queue %s depth %d workers %d utilization %.2f", self.__queueName, queueDepth, numWorkers, self.__utilization)
+            if target != numWorkers:
+                self.__resize(target)
+        except Exception:
+            logger.exception("Autoscaler sample failing")
+        if self.__channel.is_open:
+            self.__timer = self.__connection.call_later(self.__interval, self.__onTimer)
+
+    def __resize(self, numWorkers):
+        logger.info("Autoscaler resizing %s consumer from %d to %d workers", self.__queueName, self.__dispatcher.getNumWorkers(), numWorkers)
+        self.__dispatcher.resize(numWorkers)
+        self.__channel.basic_qos(prefetch_count=self.__dispatcher.getPrefetchCount())
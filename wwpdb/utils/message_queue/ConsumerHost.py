@@ -0,0 +1,295 @@
+#
+# File: ConsumerHost.py
+# Date:  19-Oct-2026
+#
+# Updates:
+##
+"""
+Host for several MessageConsumerBase consumers sharing one process, one broker connection and one worker pool.
+
+Each registered consumer keeps its own queue, exchange, retry policy, batch and concurrency settings and
+is given a dedicated channel (and so its own prefetch window) on the shared connection.  Thread mode
+workers run on a common pool of threads.  The pool schedules work from the consumers by stride scheduling
+with per consumer weights and concurrency limits, so a busy queue receives at most its share of the
+worker threads and cannot starve the other consumers.
+
+This software was developed as part of the World Wide Protein Data Bank
+Common Deposition and Annotation System Project
+
+"""
+
+__docformat__ = "restructuredtext en"
+__license__ = "Creative Commons Attribution 3.0 Unported"
+__version__ = "V0.07"
+
+import collections
+import functools
+import logging
+import threading
+import time
+from concurrent.futures import Future
+
+from wwpdb.utils.message_queue.MessageTransport import PikaTransport
+
+logger = logging.getLogger()
+
+
+class WorkerLane:
+    """One consumer's share of a WeightedWorkerPool - provides the submit()/resize()/shutdown() executor interface.
+
+    :param pool: owning WeightedWorkerPool
+    :param float weight: relative share of the pool when several lanes have work waiting
+    :param setupHook: callable run in a pool thread before it first runs work from this lane
+    :param teardownHook: callable run in a pool thread at exit if setupHook was run in it
+
+    """
+
+    def __init__(self, pool, weight=1, setupHook=None, teardownHook=None, name=None):
+        self.pool = pool
+        self.weight = max(float(weight), 1.0e-3)
+        self.setupHook = setupHook
+        self.teardownHook = teardownHook
+        self.name = name
+        self.concurrency = 1
+        self.running = 0
+        self.passValue = 0.0
+        self.pending = collections.deque()
+
+    def submit(self, fn, *args, **kwargs):
+        return self.pool.submitLane(self, fn, args, kwargs)
+
+    def resize(self, numWorkers):
+        """Set the maximum number of pool threads running work from this lane at once."""
+        self.pool.setLaneConcurrency(self, numWorkers)
+
+    def replaceWorker(self, future):
+        """Free the slot held by future (e.g. hung past its deadline) - see WeightedWorkerPool.replaceWorker()."""
+        return self.pool.replaceWorker(self, future)
+
+    def shutdown(self, wait=True):  # noqa: ARG002 pylint: disable=unused-argument
+        """The pool belongs to the ConsumerHost - nothing to do."""
+
+
+class WeightedWorkerPool:
+    """Worker threads shared by several lanes with weighted fair (stride) scheduling -
+
+    Each time a thread becomes free it takes the next item from the lane with the smallest pass value among
+    those with work waiting and spare concurrency, and advances that lane's pass by 1/weight.  A lane that
+    becomes busy again after idling starts from the current virtual time, so idle periods earn no credit.
+
+    :param int numThreads: number of worker threads
+
+    """
+
+    def __init__(self, numThreads, name="HostWorker"):
+        self.__cond = threading.Condition()
+        self.__lanes = []
+        self.__virtualTime = 0.0
+        self.__stopping = False
+        self.__name = name
+        self.__serialNo = 0
+        self.__threads = []
+        self.__running = {}
+        self.__retired = set()
+        for _ in range(max(1, int(numThreads))):
+            self.__startThread()
+
+    def __startThread(self):
+        self.__serialNo += 1
+        thread = threading.Thread(target=self.__workerLoop, name="%s-%d" % (self.__name, self.__serialNo))
+        thread.daemon = True
+        thread.start()
+        self.__threads.append(thread)
+
+    def getNumThreads(self):
+        return len(self.__threads)
+
+    def addLane(self, weight=1, setupHook=None, teardownHook=None, name=None):
+        lane = WorkerLane(self, weight=weight, setupHook=setupHook, teardownHook=teardownHook, name=name)
+        with self.__cond:
+            self.__lanes.append(lane)
+        return lane
+
+    def submitLane(self, lane, fn, args, kwargs):
+        future = Future()
+        with self.__cond:
+            if not lane.pending and lane.running == 0:
+                lane.passValue = max(lane.passValue, self.__virtualTime)
+            lane.pending.append((future, fn, args, kwargs))
+            self.__cond.notify()
+        return future
+
+    def setLaneConcurrency(self, lane, numWorkers):
+        with self.__cond:
+            lane.concurrency = max(1, int(numWorkers))
+            self.__cond.notify_all()
+
+    def replaceWorker(self, lane, future):
+        """Start a new thread in place of the one running future and release its lane slot.
+
+        The replaced thread exits once its current call returns.  Returns False if future is not running.
+
+        """
+        with self.__cond:
+            for thread, runningFuture in self.__running.items():
+                if runningFuture is future and thread not in self.__retired:
+                    self.__retired.add(thread)
+                    lane.running -= 1
+                    self.__startThread()
+                    self.__cond.notify_all()
+                    return True
+        return False
+
+    def shutdown(self, wait=True):
+        """Stop the threads once all submitted work has run.  With wait, join all but replaced (hung) threads."""
+        with self.__cond:
+            self.__stopping = True
+            self.__cond.notify_all()
+            threads = [thread for thread in self.__threads if thread not in self.__retired]
+        if wait:
+            for thread in threads:
+                thread.join()
+
+    def __nextItem(self):
+        """Return (lane, item) for the next work item to run or (None, None) - called holding the lock."""
+        best = None
+        for lane in self.__lanes:
+            if lane.pending and lane.running < lane.concurrency and (best is None or lane.passValue < best.passValue):
+                best = lane
+        if best is None:
+            return None, None
+        self.__virtualTime = best.passValue
+        best.passValue += 1.0 / best.weight
+        best.running += 1
+        return best, best.pending.popleft()
+
+    def __workerLoop(self):
+        initialized = []
+        try:
+            while True:
+                with self.__cond:
+                    lane, item = self.__nextItem()
+                    while lane is None:
+                        if self.__stopping and not any(ln.pending for ln in self.__lanes):
+                            return
+                        self.__cond.wait()
+                        lane, item = self.__nextItem()
+                if lane not in initialized:
+                    initialized.append(lane)
+                    if lane.setupHook is not None:
+                        try:
+                            lane.setupHook()
+                        except Exception:
+                            logger.exception("Worker setup failing for %s", lane.name)
+                future, fn, args, kwargs = item
+                thread = threading.current_thread()
+                try:
+                    if future.set_running_or_notify_cancel():
+                        with self.__cond:
+                            self.__running[thread] = future
+                        try:
+                            result = fn(*args, **kwargs)
+                        except BaseException as e:  # noqa: BLE001
+                            future.set_exception(e)
+                        else:
+                            future.set_result(result)
+                finally:
+                    with self.__cond:
+                        self.__running.pop(thread, None)
+                        self.__cond.notify_all()
+                        retired = thread in self.__retired
+                        if retired:
+                            self.__retired.discard(thread)
+                            self.__threads.remove(thread)
+                        else:
+                            lane.running -= 1
+                if retired:
+                    return
+        finally:
+            for lane in initialized:
+                if lane.teardownHook is not None:
+                    try:
+                        lane.teardownHook()
+                    except Exception:
+                        logger.exception("Worker teardown failing for %s", lane.name)
+
+
+class ConsumerHost:
+    """Run several MessageConsumerBase consumers over one connection -
+
+    Consumers are configured as usual (setQueue(), setExchange(), setExecutionMode(), setBatch(), ...) and
+    registered with addConsumer(); their amqpUrl is not used.  In thread mode the numWorkers given to
+    setExecutionMode() is the consumer's concurrency limit within the shared pool.  Process mode consumers
+    keep their own process pool.
+
+    :param str amqpUrl: AMQP url for the shared connection
+    :param bool local: connect to a broker on localhost
+    :param int numWorkers: number of threads in the shared worker pool
+    :param transport: transport providing the connection (default PikaTransport, see MessageTransport.py)
+
+    """
+
+    def __init__(self, amqpUrl, local=False, numWorkers=4, transport=None):
+        self.__url = amqpUrl
+        self.__local = local
+        self.__transport = transport if transport is not None else PikaTransport()
+        self.__numWorkers = numWorkers
+        self.__consumers = []
+        self.__connection = None
+        self.__pool = None
+        self.__draining = False
+
+    def addConsumer(self, consumer, weight=1, prefetchCount=None):
+        """Register a consumer.
+
+        :param consumer: configured MessageConsumerBase instance
+        :param float weight: relative share of the worker pool when several queues have work waiting
+        :param int prefetchCount: prefetch count of the consumer's channel (default number of workers times batch size)
+
+        """
+        self.__consumers.append((consumer, weight, prefetchCount))
+        return True
+
+    def connect(self):
+        logger.info("Connecting to %s", self.__url)
+        return self.__transport.connect(url=self.__url, local=self.__local)
+
+    def run(self):
+        """Open a channel for each registered consumer and service them all until stopped."""
+        self.__connection = self.connect()
+        self.__pool = WeightedWorkerPool(self.__numWorkers)
+        opened = []
+        waitForWorkers = True
+        try:
+            for consumer, weight, prefetchCount in self.__consumers:
+                name = type(consumer).__name__
+                lane = self.__pool.addLane(weight=weight, setupHook=consumer.workerSetup, teardownHook=consumer.workerTeardown, name=name)
+                if consumer.openConsumer(self.__connection, self.__connection.channel(), executor=lane, prefetchCount=prefetchCount):
+                    logger.info("Hosting consumer %s (weight %r)", name, weight)
+                    opened.append(consumer)
+                else:
+                    logger.error("Consumer %s failed to start", name)
+            while any(consumer.isConsuming() for consumer in opened):
+                self.__connection.process_data_events(time_limit=1)
+            if self.__draining:
+                completed = [consumer.finishDrain() for consumer in opened]
+                waitForWorkers = all(completed)
+            if self.__connection.is_open:
+                self.__connection.close()
+        finally:
+            for consumer in opened:
+                consumer.closeConsumer(wait=False)
+            self.__pool.shutdown(wait=waitForWorkers)
+
+    def drain(self, timeout=30.0):
+        """Drain every hosted consumer (see MessageConsumerBase.drain()) - call on the connection thread."""
+        self.__draining = True
+        deadline = time.time() + timeout
+        for consumer, _weight, _prefetchCount in self.__consumers:
+            if consumer.isConsuming():
+                consumer.drain(max(0.0, deadline - time.time()))
+
+    def requestDrain(self, timeout=30.0):
+        """Thread safe request to drain() the host (not for signal handlers, see MessageConsumerBase.signalDrain())."""
+        if self.__connection is not None and self.__connection.is_open:
+            self.__connection.add_callback_threadsafe(functools.partial(self.drain, timeout))
@@ -0,0 +1,222 @@
+#
+# File: ConsumerSupervisor.py
+# Date:  19-Oct-2026
+#
+# Updates:
+##
+"""
+Prefork supervisor for multi-process consumers.
+
+The supervisor runs in a parent process that has already imported the consumer code and forks a fixed
+number of children, each of which builds its own consumer (and broker connection) and runs it.  Children
+start quickly and share the parent's imported modules copy-on-write.  A child that exits while the
+supervisor is running is restarted, with an increasing delay if it keeps failing at start up.  On SIGTERM
+the supervisor forwards the signal to the children so each can drain, waits for them and exits.
+
+The state of every child slot is written to a JSON status file, which readStatus() summarizes.
+
+This software was developed as part of the World Wide Protein Data Bank
+Common Deposition and Annotation System Project
+
+"""
+
+__docformat__ = "restructuredtext en"
+__license__ = "Creative Commons Attribution 3.0 Unported"
+__version__ = "V0.07"
+
+import json
+import logging
+import os
+import signal
+import threading
+import time
+
+logger = logging.getLogger()
+
+
+class ConsumerSupervisor:
+    """Fork and supervise numChildren consumer processes -
+
+    :param workerFactory: callable run in each child returning an object with run() and drain(timeout) methods
+                          (e.g. a MessageConsumerWorker).  drain() is called from the SIGTERM handler and must only
+                          record the request (e.g. MessageConsumerBase.signalDrain())
+    :param int numChildren: number of child processes
+    :param str statusFile: path of the JSON status file (optional)
+    :param float drainTimeout: seconds children are given to drain on stop before they are killed
+    :param float restartDelay: initial delay before restarting a child that exited
+    :param float maxRestartDelay: upper bound of the restart delay for children that keep failing
+    :param float stableSeconds: run time after which a child is considered healthy and the delay is reset
+
+    """
+
+    def __init__(self, workerFactory, numChildren=2, statusFile=None, drainTimeout=30.0, restartDelay=1.0, maxRestartDelay=60.0, stableSeconds=30.0):
+        self.__workerFactory = workerFactory
+        self.__numChildren = max(1, int(numChildren))
+        self.__statusFile = statusFile
+        self.__drainTimeout = drainTimeout
+        self.__restartDelay = restartDelay
+        self.__maxRestartDelay = maxRestartDelay
+        self.__stableSeconds = stableSeconds
+        self.__stopping = False
+        self.__stopDeadline = None
+        self.__slots = []
+
+    def run(self):
+        """Fork the children and supervise them until stop() is called or SIGTERM/SIGINT is received."""
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, self.__onSignal)
+            signal.signal(signal.SIGINT, self.__onSignal)
+        self.__slots = [
+            {"slot": ii + 1, "pid": None, "state": "starting", "started": None, "restarts": 0, "lastExit": None, "delay": 0.0, "restartAt": 0.0} for ii in range(self.__numChildren)
+        ]
+        logger.info("Supervisor %d starting %d consumer children", os.getpid(), self.__numChildren)
+        try:
+            while True:
+                changed = self.__reapChildren()
+                if self.__stopping:
+                    if not any(slot["pid"] for slot in self.__slots):
+                        break
+                    if self.__stopDeadline is None:
+                        self.__signalChildren(signal.SIGTERM)
+                        self.__stopDeadline = time.time() + self.__drainTimeout + 2.0
+                    elif time.time() > self.__stopDeadline:
+                        logger.warning("Children did not drain in time - killing")
+                        self.__signalChildren(signal.SIGKILL)
+                        self.__stopDeadline = time.time() + 5.0
+                else:
+                    for slot in self.__slots:
+                        if slot["pid"] is None and time.time() >= slot["restartAt"]:
+                            self.__spawn(slot)
+                            changed = True
+                if changed:
+                    self.__writeStatus()
+                time.sleep(0.2)
+        finally:
+            for slot in self.__slots:
+                slot["state"] = "stopped"
+            self.__writeStatus()
+        logger.info("Supervisor %d stopped", os.getpid())
+
+    def stop(self):
+        """Request that the children drain and the supervisor exit (safe from signal handlers and other threads)."""
+        self.__stopping = True
+
+    def __onSignal(self, signum, frame):  # noqa: ARG002 pylint: disable=unused-argument
+        logger.info("Supervisor received signal %d - stopping children", signum)
+        self.stop()
+
+    def __spawn(self, slot):
+        pid = os.fork()
+        if pid == 0:
+            self.__runChild(slot["slot"])
+        slot["pid"] = pid
+        slot["state"] = "running"
+        slot["started"] = time.time()
+        logger.info("Started consumer child %d (pid %d)", slot["slot"], pid)
+
+    def __runChild(self, slotNo):
+        """Child process - build the worker, drain it on SIGTERM and exit when it returns."""
+        exitCode = 0
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        try:
+            worker = self.__workerFactory()
+
+            def onTerminate(signum, frame):  # noqa: ARG001 pylint: disable=unused-argument
+                logger.info("Consumer child %d draining on signal %d", slotNo, signum)
+                worker.drain(self.__drainTimeout)
+
+            signal.signal(signal.SIGTERM, onTerminate)
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            worker.run()
+        except Exception:
+            logger.exception("Consumer child %d failing", slotNo)
+            exitCode = 1
+        finally:
+            logging.shutdown()
+            os._exit(exitCode)
+
+    def __reapChildren(self):
+        changed = False
+        for slot in self.__slots:
+            if slot["pid"] is None:
+                continue
+            try:
+                pid, status = os.waitpid(slot["pid"], os.WNOHANG)
+            except ChildProcessError:
+                pid, status = slot["pid"], 0
+            if pid == 0:
+                continue
+            changed = True
+            exitCode = os.waitstatus_to_exitcode(status)
+            logger.log(logging.INFO if self.__stopping else logging.WARNING, "Consumer child %d (pid %d) exited with status %d", slot["slot"], pid, exitCode)
+            slot["pid"] = None
+            slot["lastExit"] = exitCode
+            if self.__stopping:
+                slot["state"] = "stopped"
+                continue
+            if time.time() - slot["started"] >= self.__stableSeconds:
+                slot["delay"] = self.__restartDelay
+            else:
+                slot["delay"] = min(self.__maxRestartDelay, max(self.__restartDelay, slot["delay"] * 2.0))
+            slot["restartAt"] = time.time() + slot["delay"]
+            slot["restarts"] += 1
+            slot["state"] = "restarting"
+        return changed
+
+    def __signalChildren(self, signum):
+        for slot in self.__slots:
+            if slot["pid"]:
+                try:
+                    os.kill(slot["pid"], signum)
+                except ProcessLookupError:
+                    pass
+
+    def __writeStatus(self):
+        if not self.__statusFile:
+            return
+        status = {
+            "supervisor": os.getpid(),
+            "updated": time.time(),
+            "children": [{ky: slot[ky] for ky in ("slot", "pid", "state", "started", "restarts", "lastExit")} for slot in self.__slots],
+        }
+        try:
+            tmpFile = self.__statusFile + ".tmp"
+            with open(tmpFile, "w") as ofh:
+                json.dump(status, ofh, indent=2)
+            os.replace(tmpFile, self.__statusFile)
+        except OSError:
+            logger.exception("Writing status file %s failing", self.__statusFile)
+
+    @staticmethod
+    def readStatus(statusFile):
+        """Return a text report of the supervisor and child states recorded in statusFile."""
+        try:
+            with open(statusFile) as ifh:
+                status = json.load(ifh)
+        except (OSError, ValueError):
+            return "+ConsumerSupervisor.status(): No supervisor status available in %s\n" % statusFile
+
+        def isAlive(pid):
+            if not pid:
+                return False
+            try:
+                os.kill(pid, 0)
+            except ProcessLookupError:
+                return False
+            except PermissionError:
+                return True
+            return True
+
+        msgList = [
+            "+ConsumerSupervisor.status(): supervisor process id %s (%s) updated %s\n"
+            % (status["supervisor"], "alive" if isAlive(status["supervisor"]) else "not running", time.ctime(status["updated"]))
+        ]
+        for child in status["children"]:
+            state = child["state"]
+            if state == "running" and not isAlive(child["pid"]):
+                state = "lost"
+            msgList.append(
+                "+ConsumerSupervisor.status(): child %d pid %s state %s started %s restarts %d last exit %s\n"
+                % (child["slot"], child["pid"], state, time.ctime(child["started"]) if child["started"] else "-", child["restarts"], child["lastExit"])
+            )
+        return "".join(msgList)
@@ -9,18 +9,25 @@
 #
 #  8-Sep-2016  jdw overhaul
 #  9-Sep-2016  jdw now as example class =
+# 19-Oct-2026  add --children option running a prefork supervisor of consumer processes
+# 19-Oct-2026  add --profile-every and --profile-slow options writing worker profiles to ws-logs
+# 19-Oct-2026  drain on SIGTERM (and restart) by recording the request in the handler for the consumer to pick up
 #
 ##
 
+import functools
 import logging
 import os
 import platform
+import signal
 import sys
 import time
 from optparse import OptionParser  # pylint: disable=deprecated-module
 
 from wwpdb.utils.config.ConfigInfo import ConfigInfo, getSiteId
 from wwpdb.utils.detach.DetachedProcessBase import DetachedProcessBase
+
+from wwpdb.utils.message_queue.ConsumerSupervisor import ConsumerSupervisor
 from wwpdb.utils.message_queue.MessageConsumerBase import MessageConsumerBase
 from wwpdb.utils.message_queue.MessageQueueConnection import MessageQueueConnection
 
@@ -40,8 +47,11 @@ class MessageConsumer(MessageConsumerBase):
 
 
 class MessageConsumerWorker:
-    def __init__(self, local=False):
+    def __init__(self, local=False, profileDir=None, profileEvery=0, profileSlow=None):
         self.__local = local
+        self.__profileDir = profileDir
+        self.__profileEvery = profileEvery
+        self.__profileSlow = profileSlow
         self.__setup()
 
     def __setup(self):
@@ -53,6 +63,8 @@ class MessageConsumerWorker:
         self.__mc = MessageConsumer(amqpUrl=url, local=self.__local)
         self.__mc.setQueue(queueName="test_queue", routingKey="text_message")
         self.__mc.setExchange(exchange="test_exchange", exchangeType="topic")
+        if self.__profileDir and (self.__profileEvery or self.__profileSlow):
+            self.__mc.setProfiling(self.__profileDir, everyN=self.__profileEvery, slowSeconds=self.__profileSlow)
 
     def run(self):
         """Run async consumer"""
@@ -74,6 +86,10 @@ class MessageConsumerWorker:
         logger.info("Suspending consumer worker... ")
         self.__mc.stop()
 
+    def drain(self, timeout=30.0):
+        """Signal handler safe - the consumer starts draining on its connection thread."""
+        self.__mc.signalDrain(timeout)
+
 
 class MyDetachedProcess(DetachedProcessBase):
     """This class implements the run() method of the DetachedProcessBase() utility class.
@@ -81,17 +97,79 @@ class MyDetachedProcess(DetachedProcessBase):
     Illustrates the use of python logging and various I/O channels in detached process.
     """
 
-    def __init__(self, pidFile="/tmp/DetachedProcessBase.pid", stdin=os.devnull, stdout=os.devnull, stderr=os.devnull, wrkDir="/", gid=None, uid=None, local=False):  # noqa: S107,S108
+    def __init__(
+        self,
+        pidFile="/tmp/DetachedProcessBase.pid",  # noqa: S107,S108
+        stdin=os.devnull,
+        stdout=os.devnull,
+        stderr=os.devnull,
+        wrkDir="/",
+        gid=None,
+        uid=None,
+        local=False,
+        drainTimeout=30.0,
+        numChildren=0,
+        statusFile=None,
+        profileEvery=0,
+        profileSlow=None,
+    ):
         super(MyDetachedProcess, self).__init__(pidFile=pidFile, stdin=stdin, stdout=stdout, stderr=stderr, wrkDir=wrkDir, gid=gid, uid=uid)
         self.__local = local
-        self.__mcw = MessageConsumerWorker(local=self.__local)
+        self.__pidFile = pidFile
+        self.__drainTimeout = drainTimeout
+        self.__numChildren = numChildren
+        self.__statusFile = statusFile
+        self.__workerFactory = functools.partial(MessageConsumerWorker, local=local, profileDir=wrkDir, profileEvery=profileEvery, profileSlow=profileSlow)
+        self.__mcw = self.__workerFactory() if not numChildren else None
 
     def run(self):
         logger.info("STARTING detached run method")
+        if self.__numChildren:
+            # Consumers are created in the forked children - the supervisor handles SIGTERM
+            supervisor = ConsumerSupervisor(
+                self.__workerFactory,
+                numChildren=self.__numChildren,
+                statusFile=self.__statusFile,
+                drainTimeout=self.__drainTimeout,
+            )
+            supervisor.run()
+            return
+        signal.signal(signal.SIGTERM, self.__onTerminate)
         self.__mcw.run()
 
+    def __onTerminate(self, signum, frame):  # noqa: ARG002 pylint: disable=unused-argument
+        # Only record the request - the handler may interrupt the main thread while it is inside the connection
+        self.__mcw.drain(self.__drainTimeout)
+
+    def stop(self):
+        """Ask the running consumer to drain (SIGTERM) and wait for it to exit before falling back to a hard stop."""
+        try:
+            with open(self.__pidFile) as ifh:
+                pid = int(ifh.read().strip())
+        except (OSError, ValueError):
+            pid = None
+        if pid:
+            try:
+                os.kill(pid, signal.SIGTERM)
+                deadline = time.time() + self.__drainTimeout + 5.0
+                while time.time() < deadline:
+                    os.kill(pid, 0)
+                    time.sleep(0.1)
+            except ProcessLookupError:
+                logger.info("Consumer process %d drained and exited", pid)
+                return
+        super(MyDetachedProcess, self).stop()
+
+    def status(self):
+        msg = super(MyDetachedProcess, self).status()
+        if self.__numChildren and self.__statusFile:
+            msg += ConsumerSupervisor.readStatus(self.__statusFile)
+        return msg
+
     def suspend(self):
         logger.info("SUSPENDING detached process")
+        if self.__mcw is None:
+            return
         try:  # noqa: SIM105
             self.__mcw.suspend()
         except Exception as _e:  # noqa: F841,BLE001
@@ -118,6 +196,10 @@ if __name__ == "__main__":
     # parser.add_option("-v", "--verbose", default=False, action="store_true", dest="verbose", help="Enable verbose output")
     parser.add_option("--debug", default=1, type="int", dest="debugLevel", help="Debug level (default=1) [0-3]")
     parser.add_option("--instance", default=1, type="int", dest="instanceNo", help="Instance number [1-n]")
+    parser.add_option("--drain-timeout", default=30.0, type="float", dest="drainTimeout", help="Seconds to wait for in-flight messages on stop/restart (default=30)")
+    parser.add_option("--children", default=0, type="int", dest="numChildren", help="Run a supervisor forking this number of consumer processes (default=0, single consumer)")
+    parser.add_option("--profile-every", default=0, type="int", dest="profileEvery", help="Write a cProfile of every Nth message to ws-logs (default=0, off)")
+    parser.add_option("--profile-slow", default=None, type="float", dest="profileSlow", help="Write sampled stacks of messages running longer than this many seconds to ws-logs")
     (options, _args) = parser.parse_args()
     if options.local:
         parentdir = os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
@@ -137,6 +219,7 @@ if __name__ == "__main__":
     pidFilePath = os.path.join(wsLogDirPath, myHostName + "_" + str(options.instanceNo) + ".pid")
     stdoutFilePath = os.path.join(wsLogDirPath, myHostName + "_" + str(options.instanceNo) + "_stdout.log")
     stderrFilePath = os.path.join(wsLogDirPath, myHostName + "_" + str(options.instanceNo) + "_stderr.log")
+    statusFilePath = os.path.join(wsLogDirPath, myHostName + "_" + str(options.instanceNo) + "_supervisor.json")
     wfLogFilePath = os.path.join(wsLogDirPath, myHostName + "_" + str(options.instanceNo) + "_" + now + ".log")
     if not os.path.exists(wfLogFilePath):
         if not os.path.exists(os.path.dirname(wfLogFilePath)):
@@ -158,7 +241,18 @@ if __name__ == "__main__":
         logger.setLevel(logging.INFO)
     else:
         logger.setLevel(logging.ERROR)
-    myDP = MyDetachedProcess(pidFile=pidFilePath, stdout=stdoutFilePath, stderr=stderrFilePath, wrkDir=wsLogDirPath, local=options.local)
+    myDP = MyDetachedProcess(
+        pidFile=pidFilePath,
+        stdout=stdoutFilePath,
+        stderr=stderrFilePath,
+        wrkDir=wsLogDirPath,
+        local=options.local,
+        drainTimeout=options.drainTimeout,
+        numChildren=options.numChildren,
+        statusFile=statusFilePath,
+        profileEvery=options.profileEvery,
+        profileSlow=options.profileSlow,
+    )
 
     if options.startOp:
         sys.stdout.write("+DetachedMessageConsumer() starting consumer service at %s\n" % lt)
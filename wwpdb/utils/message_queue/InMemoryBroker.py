@@ -0,0 +1,1039 @@
+#
+# File: InMemoryBroker.py
+# Date:  19-Oct-2026
+#
+# Updates:
+#  19-Oct-2026       headers exchange
+#  19-Oct-2026       queue length limit (x-max-length)
+#  19-Oct-2026       direct reply-to (amq.rabbitmq.reply-to)
+#  19-Oct-2026       publisher confirms, mandatory returns and cumulative x-death counts
+#  19-Oct-2026       asyncio driven connections (connectAsync)
+##
+"""
+In-process message broker implementing the subset of the pika BlockingConnection/BlockingChannel
+interface used by this package.
+
+An InMemoryBroker instance is a transport (see MessageTransport.py) - pass it as transport= to
+MessagePublisher, MessageConsumerBase, MessageSubscriberBase or ConsumerHost and all connections made
+through it share the broker's exchanges and queues.  Supported:
+
+  - the default, direct, topic, fanout and headers exchanges
+  - durable, exclusive (deleted with the owning connection) and auto-delete queues, server named queues
+  - priority queues (x-max-priority), per queue and per message TTL, length limits, dead-lettering
+    (x-message-ttl, expiration, x-max-length, x-overflow, x-dead-letter-exchange, x-dead-letter-routing-key)
+  - consumers with prefetch (basic_qos), acknowledgement, negative acknowledgement/requeue, basic_get
+  - direct reply-to - consuming from amq.rabbitmq.reply-to with auto_ack and publishing with reply_to set to it
+  - publisher confirms (confirm_delivery) and mandatory publishing - on a confirming channel basic_publish raises
+    pika.exceptions.UnroutableError for an unroutable mandatory message and pika.exceptions.NackError when a queue
+    it routes to refuses it (x-overflow reject-publish); otherwise unroutable mandatory messages are returned
+    to the callbacks added with add_on_return_callback()
+  - x-death headers counting each time a message is dead-lettered from the same queue for the same reason
+  - call_later()/remove_timeout(), add_callback_threadsafe(), process_data_events() and start_consuming()
+  - connections driven by an asyncio event loop (connectAsync()) - the subset of the callback style
+    pika.adapters.asyncio_connection.AsyncioConnection interface used by AsyncMessageConsumerBase
+
+Callbacks run in the thread calling process_data_events() or start_consuming() of the connection, as with
+pika, or on the event loop of an asyncio driven connection.  Errors a broker reports by closing the channel (unknown exchange or queue, inequivalent queue
+arguments, unknown delivery tag) raise pika.exceptions.ChannelClosedByBroker and close the channel.
+Messages are not persisted.
+
+This software was developed as part of the World Wide Protein Data Bank
+Common Deposition and Annotation System Project
+
+"""
+
+__docformat__ = "restructuredtext en"
+__license__ = "Creative Commons Attribution 3.0 Unported"
+__version__ = "V0.08"
+
+import collections
+import copy
+import functools
+import heapq
+import itertools
+import logging
+import threading
+import time
+import uuid
+
+import pika
+from pika import frame, spec
+from pika.adapters.blocking_connection import ReturnedMessage
+
+logger = logging.getLogger()
+
+REPLY_TO = "amq.rabbitmq.reply-to"
+
+
+@functools.lru_cache(maxsize=4096)
+def topicMatches(pattern, routingKey):
+    """Return True if routingKey matches the topic binding pattern ("*" matches one word, "#" zero or more)."""
+    return _matchWords(tuple(pattern.split(".")), tuple(routingKey.split(".")))
+
+
+def _matchWords(patternWords, keyWords):
+    if not patternWords:
+        return not keyWords
+    head = patternWords[0]
+    if head == "#":
+        return any(_matchWords(patternWords[1:], keyWords[ii:]) for ii in range(len(keyWords) + 1))
+    if not keyWords:
+        return False
+    if head in ("*", keyWords[0]):
+        return _matchWords(patternWords[1:], keyWords[1:])
+    return False
+
+
+def headersMatch(arguments, headers):
+    """Return True if message headers match the arguments of a headers exchange binding (x-match all or any)."""
+    arguments = arguments or {}
+    headers = headers or {}
+    matchAny = str(arguments.get("x-match", "all")).startswith("any")
+    tests = [ky in headers and (val is None or headers[ky] == val) for ky, val in arguments.items() if not ky.startswith("x-")]
+    return any(tests) if matchAny else all(tests)
+
+
+class BrokerMessage:
+    __slots__ = ("body", "exchange", "expiresAt", "properties", "redelivered", "routingKey")
+
+    def __init__(self, body, properties, exchange, routingKey):
+        self.body = body
+        self.properties = properties
+        self.exchange = exchange
+        self.routingKey = routingKey
+        self.redelivered = False
+        self.expiresAt = None
+
+
+class BrokerExchange:
+    def __init__(self, name, exchangeType="direct", durable=False, autoDelete=False, arguments=None):
+        self.name = name
+        self.exchangeType = exchangeType
+        self.durable = durable
+        self.autoDelete = autoDelete
+        self.arguments = arguments or {}
+        self.bindings = []
+
+    def route(self, routingKey, properties):
+        """Return the names of the queues bound for routingKey (or for the message headers of a headers exchange)."""
+        if self.exchangeType == "headers":
+            return [queueName for queueName, _key, args in self.bindings if headersMatch(args, properties.headers)]
+        if self.exchangeType == "fanout":
+            return [queueName for queueName, _key, _args in self.bindings]
+        if self.exchangeType == "topic":
+            return [queueName for queueName, key, _args in self.bindings if topicMatches(key, routingKey)]
+        return [queueName for queueName, key, _args in self.bindings if key == routingKey]
+
+
+class BrokerQueue:
+    def __init__(self, name, durable=False, owner=None, autoDelete=False, arguments=None):
+        self.name = name
+        self.durable = durable
+        self.owner = owner
+        self.autoDelete = autoDelete
+        self.arguments = dict(arguments or {})
+        self.maxPriority = int(self.arguments.get("x-max-priority") or 0)
+        self.ttlMs = self.arguments.get("x-message-ttl")
+        self.maxLength = self.arguments.get("x-max-length")
+        self.dropHead = self.arguments.get("x-overflow", "drop-head") == "drop-head"
+        self.levels = [collections.deque() for _ in range(self.maxPriority + 1)]
+        self.consumers = []
+        self.nextConsumer = 0
+
+    def __len__(self):
+        return sum(len(level) for level in self.levels)
+
+    def push(self, message, front=False):
+        level = 0
+        if self.maxPriority and message.properties.priority:
+            level = min(max(int(message.properties.priority), 0), self.maxPriority)
+        if front:
+            self.levels[level].appendleft(message)
+        else:
+            self.levels[level].append(message)
+
+    def pop(self):
+        for level in reversed(self.levels):
+            if level:
+                return level.popleft()
+        return None
+
+    def popExpired(self, now):
+        """Remove and return the messages at the head of each priority level whose time to live has passed."""
+        expired = []
+        for level in self.levels:
+            while level and level[0].expiresAt is not None and level[0].expiresAt <= now:
+                expired.append(level.popleft())
+        return expired
+
+    def nextExpiry(self):
+        times = [level[0].expiresAt for level in self.levels if level and level[0].expiresAt is not None]
+        return min(times) if times else None
+
+    def purge(self):
+        count = len(self)
+        for level in self.levels:
+            level.clear()
+        return count
+
+
+class InMemoryTimer:
+    __slots__ = ("callback", "cancelled", "dueAt")
+
+    def __init__(self, dueAt, callback):
+        self.dueAt = dueAt
+        self.callback = callback
+        self.cancelled = False
+
+
+class InMemoryChannel:
+    """Channel of an InMemoryConnection - mirrors pika.adapters.blocking_connection.BlockingChannel."""
+
+    def __init__(self, connection, broker, channelNumber):
+        self.connection = connection
+        self.channel_number = channelNumber
+        self.__broker = broker
+        self._open = True
+        self._prefetchCount = 0
+        self._deliveryTags = itertools.count(1)
+        self._consumers = {}
+        self._unacked = {}
+        self._pending = collections.deque()
+        self._confirming = False
+        self._replyQueue = None
+        self._returns = collections.deque()
+        self._returnCallbacks = []
+        self.__closeCallbacks = []
+        self.__cancelCallbacks = []
+
+    def __int__(self):
+        return self.channel_number
+
+    @property
+    def is_open(self):
+        return self._open
+
+    @property
+    def is_closed(self):
+        return not self._open
+
+    @property
+    def consumer_tags(self):
+        return list(self._consumers)
+
+    def add_on_close_callback(self, callback):
+        self.__closeCallbacks.append(callback)
+
+    def add_on_cancel_callback(self, callback):
+        self.__cancelCallbacks.append(callback)
+
+    def add_on_return_callback(self, callback):
+        """Add callback(channel, method, properties, body) called for unroutable mandatory messages (without confirms)."""
+        self._returnCallbacks.append(callback)
+
+    def close(self, reply_code=0, reply_text="Normal shutdown"):
+        self.__broker.closeChannel(self, reply_code, reply_text)
+
+    def confirm_delivery(self):
+        self._confirming = True
+
+    def exchange_declare(self, exchange, exchange_type="direct", passive=False, durable=False, auto_delete=False, internal=False, arguments=None):  # noqa: ARG002
+        return self.__broker.declareExchange(self, exchange, str(exchange_type), passive, durable, auto_delete, arguments)
+
+    def exchange_delete(self, exchange=None, if_unused=False):
+        return self.__broker.deleteExchange(self, exchange, if_unused)
+
+    def queue_declare(self, queue, passive=False, durable=False, exclusive=False, auto_delete=False, arguments=None):
+        return self.__broker.declareQueue(self, queue, passive, durable, exclusive, auto_delete, arguments)
+
+    def queue_bind(self, queue, exchange, routing_key=None, arguments=None):
+        return self.__broker.bindQueue(self, queue, exchange, queue if routing_key is None else routing_key, arguments, bind=True)
+
+    def queue_unbind(self, queue, exchange=None, routing_key=None, arguments=None):
+        return self.__broker.bindQueue(self, queue, exchange, queue if routing_key is None else routing_key, arguments, bind=False)
+
+    def queue_delete(self, queue, if_unused=False, if_empty=False):
+        return self.__broker.deleteQueue(self, queue, if_unused, if_empty)
+
+    def queue_purge(self, queue):
+        return self.__broker.purgeQueue(self, queue)
+
+    def basic_qos(self, prefetch_size=0, prefetch_count=0, global_qos=False):  # noqa: ARG002
+        self.__broker.setPrefetch(self, prefetch_count)
+
+    def basic_publish(self, exchange, routing_key, body, properties=None, mandatory=False):
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        self.__broker.publish(self, exchange, routing_key, body, properties or pika.BasicProperties(), mandatory=mandatory)
+
+    def basic_consume(self, queue, on_message_callback, auto_ack=False, exclusive=False, consumer_tag=None, arguments=None):  # noqa: ARG002
+        return self.__broker.consume(self, queue, on_message_callback, auto_ack, consumer_tag)
+
+    def basic_cancel(self, consumer_tag):
+        self.__broker.cancel(self, consumer_tag)
+        return []
+
+    def basic_get(self, queue, auto_ack=False):
+        return self.__broker.get(self, queue, auto_ack)
+
+    def basic_ack(self, delivery_tag=0, multiple=False):
+        self.__broker.settle(self, delivery_tag, multiple, ack=True, requeue=False)
+
+    def basic_nack(self, delivery_tag=0, multiple=False, requeue=True):
+        self.__broker.settle(self, delivery_tag, multiple, ack=False, requeue=requeue)
+
+    def basic_reject(self, delivery_tag=0, requeue=True):
+        self.__broker.settle(self, delivery_tag, False, ack=False, requeue=requeue)
+
+    def start_consuming(self):
+        while self._consumers:
+            self.connection.process_data_events(time_limit=None)
+
+    def stop_consuming(self, consumer_tag=None):
+        for consumerTag in [consumer_tag] if consumer_tag else list(self._consumers):
+            self.basic_cancel(consumerTag)
+
+
+class InMemoryConnection:
+    """Connection to an InMemoryBroker - mirrors pika.BlockingConnection."""
+
+    def __init__(self, broker):
+        self.__broker = broker
+        self._open = True
+        self._channels = {}
+        self._callbacks = collections.deque()
+        self._timers = []
+        self.__timerSeq = itertools.count()
+        self.__channelNumbers = itertools.count(1)
+        self.__dispatching = False
+        self._wakeup = None
+
+    @property
+    def is_open(self):
+        return self._open
+
+    @property
+    def is_closed(self):
+        return not self._open
+
+    def channel(self, channel_number=None):
+        return self.__broker.openChannel(self, channel_number or next(self.__channelNumbers))
+
+    def close(self, reply_code=200, reply_text="Normal shutdown"):  # noqa: ARG002
+        self.__broker.closeConnection(self)
+
+    def add_callback_threadsafe(self, callback):
+        self.__broker.addCallback(self, callback)
+
+    def call_later(self, delay, callback):
+        timer = InMemoryTimer(time.time() + max(0.0, delay), callback)
+        self.__broker.addTimer(self, (timer.dueAt, next(self.__timerSeq), timer))
+        return timer
+
+    @staticmethod
+    def remove_timeout(timeout_id):
+        timeout_id.cancelled = True
+
+    def sleep(self, duration):
+        deadline = time.time() + duration
+        while time.time() < deadline:
+            self.process_data_events(time_limit=deadline - time.time())
+
+    def process_data_events(self, time_limit=0):
+        """Wait up to time_limit seconds (None without limit) for events and dispatch those ready.
+
+        As with pika, callbacks are not dispatched when called from within a callback.
+
+        """
+        if self.__dispatching:
+            return
+        if not self.__broker.waitForEvents(self, time_limit):
+            return
+        self.__dispatching = True
+        try:
+            self.__dispatch()
+        finally:
+            self.__dispatching = False
+
+    def __dispatch(self):
+        callbacks, timers = self.__broker.takeCallbacks(self, time.time())
+        for callback in callbacks:
+            callback()
+        for timer in timers:
+            if not timer.cancelled:
+                timer.cancelled = True
+                timer.callback()
+        for channel in list(self._channels.values()):
+            while True:
+                returned = self.__broker.takeReturn(channel)
+                if returned is None:
+                    break
+                if not channel._returnCallbacks:  # noqa: SLF001 pylint: disable=protected-access
+                    logger.warning("Unroutable message returned for exchange %r routing key %r", returned.method.exchange, returned.method.routing_key)
+                for callback in list(channel._returnCallbacks):  # noqa: SLF001 pylint: disable=protected-access
+                    callback(channel, returned.method, returned.properties, returned.body)
+            while True:
+                delivery = self.__broker.takeDelivery(channel)
+                if delivery is None:
+                    break
+                callback, method, properties, body = delivery
+                callback(channel, method, properties, body)
+
+
+class InMemoryAsyncioChannel:
+    """Channel of an InMemoryAsyncioConnection - mirrors pika.channel.Channel.
+
+    Methods take effect on the broker at once and their completion callbacks are scheduled on the event loop.
+    An error the broker reports closes the channel and is passed to its close callbacks, as with pika.
+
+    """
+
+    def __init__(self, connection, channel, loop):
+        self.connection = connection
+        self.channel_number = channel.channel_number
+        self.__channel = channel
+        self.__loop = loop
+        self.__closeCallbacks = []
+        self.__closeReason = None
+
+    def __int__(self):
+        return self.channel_number
+
+    @property
+    def is_open(self):
+        return self.__channel.is_open
+
+    @property
+    def is_closed(self):
+        return self.__closeReason is not None
+
+    @property
+    def is_closing(self):
+        return not self.__channel.is_open and self.__closeReason is None
+
+    @property
+    def consumer_tags(self):
+        return self.__channel.consumer_tags
+
+    def add_on_close_callback(self, callback):
+        """Add callback(channel, reason) called when the channel closes."""
+        self.__closeCallbacks.append(callback)
+
+    def add_on_cancel_callback(self, callback):
+        self.__channel.add_on_cancel_callback(callback)
+
+    def add_on_return_callback(self, callback):
+        self.__channel.add_on_return_callback(callback)
+
+    def close(self, reply_code=0, reply_text="Normal shutdown"):
+        if not self.__channel.is_open:
+            raise pika.exceptions.ChannelWrongStateError("Channel is closed.")
+        self.__channel.close(reply_code, reply_text)
+        self._closed(pika.exceptions.ChannelClosedByClient(reply_code, reply_text))
+
+    def exchange_declare(self, exchange, exchange_type="direct", passive=False, durable=False, auto_delete=False, internal=False, arguments=None, callback=None):
+        self.__call(callback, self.__channel.exchange_declare, exchange, exchange_type, passive, durable, auto_delete, internal, arguments)
+
+    def queue_declare(self, queue, passive=False, durable=False, exclusive=False, auto_delete=False, arguments=None, callback=None):
+        self.__call(callback, self.__channel.queue_declare, queue, passive, durable, exclusive, auto_delete, arguments)
+
+    def queue_bind(self, queue, exchange, routing_key=None, arguments=None, callback=None):
+        self.__call(callback, self.__channel.queue_bind, queue, exchange, routing_key, arguments)
+
+    def basic_qos(self, prefetch_size=0, prefetch_count=0, global_qos=False, callback=None):
+        self.__call(callback, self.__qos, prefetch_size, prefetch_count, global_qos)
+
+    def __qos(self, prefetchSize, prefetchCount, globalQos):
+        self.__channel.basic_qos(prefetchSize, prefetchCount, globalQos)
+        return frame.Method(self.channel_number, spec.Basic.QosOk())
+
+    def basic_consume(self, queue, on_message_callback, auto_ack=False, exclusive=False, consumer_tag=None, arguments=None, callback=None):
+        """Start a consumer - on_message_callback(channel, method, properties, body) is called on the event loop."""
+        consumerTag = self.__call(None, self.__channel.basic_consume, queue, on_message_callback, auto_ack, exclusive, consumer_tag, arguments)
+        if consumerTag is not None and callback is not None:
+            self.__loop.call_soon(callback, frame.Method(self.channel_number, spec.Basic.ConsumeOk(consumer_tag=consumerTag)))
+        return consumerTag
+
+    def basic_cancel(self, consumer_tag="", callback=None):
+        self.__call(None, self.__channel.basic_cancel, consumer_tag)
+        if callback is not None:
+            self.__loop.call_soon(callback, frame.Method(self.channel_number, spec.Basic.CancelOk(consumer_tag=consumer_tag)))
+
+    def basic_publish(self, exchange, routing_key, body, properties=None, mandatory=False):
+        self.__call(None, self.__channel.basic_publish, exchange, routing_key, body, properties, mandatory)
+
+    def basic_ack(self, delivery_tag=0, multiple=False):
+        self.__call(None, self.__channel.basic_ack, delivery_tag, multiple)
+
+    def basic_nack(self, delivery_tag=0, multiple=False, requeue=True):
+        self.__call(None, self.__channel.basic_nack, delivery_tag, multiple, requeue)
+
+    def basic_reject(self, delivery_tag=0, requeue=True):
+        self.__call(None, self.__channel.basic_reject, delivery_tag, requeue)
+
+    def __call(self, callback, method, *args):
+        """Run method on the broker and schedule callback(result) - returns the result, or None if the broker closed the channel."""
+        try:
+            result = method(*args)
+        except pika.exceptions.ChannelClosedByBroker as e:
+            self.__loop.call_soon(self._closed, e)
+            return None
+        if callback is not None:
+            self.__loop.call_soon(callback, result)
+        return result
+
+    def _closed(self, reason):
+        if self.__closeReason is not None:
+            return
+        self.__closeReason = reason
+        for callback in self.__closeCallbacks:
+            self.__loop.call_soon(callback, self, reason)
+
+    def _dispatch(self, broker):
+        """Pass the returns and deliveries pending on the channel to their callbacks."""
+        channel = self.__channel
+        while channel.is_open:
+            returned = broker.takeReturn(channel)
+            if returned is None:
+                break
+            if not channel._returnCallbacks:  # noqa: SLF001 pylint: disable=protected-access
+                logger.warning("Unroutable message returned for exchange %r routing key %r", returned.method.exchange, returned.method.routing_key)
+            for callback in list(channel._returnCallbacks):  # noqa: SLF001 pylint: disable=protected-access
+                callback(self, returned.method, returned.properties, returned.body)
+        while channel.is_open:
+            delivery = broker.takeDelivery(channel)
+            if delivery is None:
+                break
+            callback, method, properties, body = delivery
+            callback(self, method, properties, body)
+
+
+class InMemoryAsyncioConnection:
+    """Connection to an InMemoryBroker driven by an asyncio event loop - mirrors pika.adapters.asyncio_connection.AsyncioConnection.
+
+    on_open_callback(connection) and on_close_callback(connection, reason) are called on loop.  Deliveries are
+    handed to the loop by the broker as it queues them (loop.call_soon_threadsafe), so nothing polls the broker.
+
+    """
+
+    def __init__(self, broker, loop, on_open_callback, on_close_callback=None):
+        self.__broker = broker
+        self.__loop = loop
+        self.__connection = InMemoryConnection(broker)
+        self.__connection._wakeup = self.__wakeup  # noqa: SLF001 pylint: disable=protected-access
+        self.__closeCallback = on_close_callback
+        self.__channels = {}
+        self.__dispatchScheduled = False
+        self.__closed = False
+        loop.call_soon(on_open_callback, self)
+
+    @property
+    def ioloop(self):
+        return self.__loop
+
+    @property
+    def is_open(self):
+        return self.__connection.is_open
+
+    @property
+    def is_closing(self):
+        return not self.__connection.is_open and not self.__closed
+
+    @property
+    def is_closed(self):
+        return self.__closed
+
+    def channel(self, channel_number=None, on_open_callback=None):
+        channel = InMemoryAsyncioChannel(self, self.__connection.channel(channel_number), self.__loop)
+        self.__channels[channel.channel_number] = channel
+        if on_open_callback is not None:
+            self.__loop.call_soon(on_open_callback, channel)
+        return channel
+
+    def close(self, reply_code=200, reply_text="Normal shutdown"):
+        if not self.__connection.is_open:
+            raise pika.exceptions.ConnectionWrongStateError("Connection is closed")
+        self.__connection.close(reply_code, reply_text)
+        reason = pika.exceptions.ConnectionClosedByClient(reply_code, reply_text)
+        for channel in self.__channels.values():
+            channel._closed(reason)  # noqa: SLF001 pylint: disable=protected-access
+        self.__loop.call_soon(self.__onClosed, reason)
+
+    def __onClosed(self, reason):
+        self.__closed = True
+        if self.__closeCallback is not None:
+            self.__closeCallback(self, reason)
+
+    def __wakeup(self):
+        # Called by the broker, from any thread, when deliveries or returns are queued for this connection
+        if self.__dispatchScheduled:
+            return
+        self.__dispatchScheduled = True
+        try:
+            self.__loop.call_soon_threadsafe(self.__dispatch)
+        except RuntimeError:
+            # Event loop closed
+            pass
+
+    def __dispatch(self):
+        self.__dispatchScheduled = False
+        for channel in list(self.__channels.values()):
+            channel._dispatch(self.__broker)  # noqa: SLF001 pylint: disable=protected-access
+
+
+class InMemoryBroker:
+    """In-process broker and transport -
+
+    connect() returns an InMemoryConnection and connectAsync() an InMemoryAsyncioConnection; the url, local and
+    parameters arguments are ignored.
+
+    """
+
+    def __init__(self):
+        self.__lock = threading.RLock()
+        self.__cond = threading.Condition(self.__lock)
+        self.__exchanges = {}
+        self.__queues = {}
+        self.__consumerTags = itertools.count(1)
+        for name, exchangeType in (("", "direct"), ("amq.direct", "direct"), ("amq.topic", "topic"), ("amq.fanout", "fanout")):
+            self.__exchanges[name] = BrokerExchange(name, exchangeType, durable=True)
+
+    def connect(self, url=None, local=False, parameters=None):  # noqa: ARG002
+        return InMemoryConnection(self)
+
+    def connectAsync(self, loop, on_open_callback, on_open_error_callback=None, on_close_callback=None, url=None, local=False, parameters=None):  # noqa: ARG002
+        return InMemoryAsyncioConnection(self, loop, on_open_callback, on_close_callback=on_close_callback)
+
+    def getQueueDepth(self, queueName):
+        """Number of messages ready in queueName (None if it does not exist)."""
+        with self.__lock:
+            queue = self.__queues.get(queueName)
+            return len(queue) if queue is not None else None
+
+    def getQueueNames(self):
+        with self.__lock:
+            return sorted(self.__queues)
+
+    # Connections --
+
+    def openChannel(self, connection, channelNumber):
+        with self.__lock:
+            if not connection.is_open:
+                raise pika.exceptions.ConnectionWrongStateError("Connection is closed")
+            channel = InMemoryChannel(connection, self, channelNumber)
+            connection._channels[channelNumber] = channel  # noqa: SLF001 pylint: disable=protected-access
+            return channel
+
+    def closeConnection(self, connection):
+        with self.__lock:
+            if not connection.is_open:
+                return
+            for channel in list(connection._channels.values()):  # noqa: SLF001 pylint: disable=protected-access
+                self.closeChannel(channel)
+            connection._open = False  # noqa: SLF001 pylint: disable=protected-access
+            for queue in list(self.__queues.values()):
+                if queue.owner is connection:
+                    self.__removeQueue(queue)
+            self.__cond.notify_all()
+
+    def addCallback(self, connection, callback):
+        with self.__lock:
+            if not connection.is_open:
+                raise pika.exceptions.ConnectionWrongStateError("Connection is closed")
+            connection._callbacks.append(callback)  # noqa: SLF001 pylint: disable=protected-access
+            self.__cond.notify_all()
+
+    def addTimer(self, connection, entry):
+        with self.__lock:
+            heapq.heappush(connection._timers, entry)  # noqa: SLF001 pylint: disable=protected-access
+            self.__cond.notify_all()
+
+    def waitForEvents(self, connection, timeLimit):
+        """Block until connection has events ready or timeLimit passes.  Returns True if events are ready."""
+        deadline = None if timeLimit is None else time.time() + max(0.0, timeLimit)
+        with self.__lock:
+            while True:
+                now = time.time()
+                self.__expireMessages(now)
+                if self.__hasEvents(connection, now):
+                    return True
+                if not connection.is_open or (deadline is not None and now >= deadline):
+                    return False
+                wakeAt = [tm for tm in (deadline, self.__nextTimer(connection), self.__nextExpiry()) if tm is not None]
+                self.__cond.wait(max(0.0, min(wakeAt) - now) if wakeAt else None)
+
+    def takeCallbacks(self, connection, now):
+        """Remove and return the thread safe callbacks and due timers of connection."""
+        with self.__lock:
+            callbacks = list(connection._callbacks)  # noqa: SLF001 pylint: disable=protected-access
+            connection._callbacks.clear()  # noqa: SLF001 pylint: disable=protected-access
+            timers = []
+            heap = connection._timers  # noqa: SLF001 pylint: disable=protected-access
+            while heap and (heap[0][2].cancelled or heap[0][0] <= now):
+                _dueAt, _seqNo, timer = heapq.heappop(heap)
+                if not timer.cancelled:
+                    timers.append(timer)
+            return callbacks, timers
+
+    def takeDelivery(self, channel):
+        """Remove and return (callback, method, properties, body) for the next delivery pending on channel, or None."""
+        with self.__lock:
+            while channel._pending:  # noqa: SLF001 pylint: disable=protected-access
+                consumerTag, deliveryTag, message = channel._pending.popleft()  # noqa: SLF001 pylint: disable=protected-access
+                consumer = channel._consumers.get(consumerTag)  # noqa: SLF001 pylint: disable=protected-access
+                if consumer is None:
+                    continue
+                method = spec.Basic.Deliver(
+                    consumer_tag=consumerTag, delivery_tag=deliveryTag, redelivered=message.redelivered, exchange=message.exchange, routing_key=message.routingKey
+                )
+                return consumer[1], method, message.properties, message.body
+            return None
+
+    def takeReturn(self, channel):
+        """Remove and return the next ReturnedMessage pending on channel, or None."""
+        with self.__lock:
+            return channel._returns.popleft() if channel._returns else None  # noqa: SLF001 pylint: disable=protected-access
+
+    def __hasEvents(self, connection, now):
+        if connection._callbacks:  # noqa: SLF001 pylint: disable=protected-access
+            return True
+        heap = connection._timers  # noqa: SLF001 pylint: disable=protected-access
+        while heap and heap[0][2].cancelled:
+            heapq.heappop(heap)
+        if heap and heap[0][0] <= now:
+            return True
+        return any(channel._pending or channel._returns for channel in connection._channels.values())  # noqa: SLF001 pylint: disable=protected-access
+
+    @staticmethod
+    def __nextTimer(connection):
+        heap = connection._timers  # noqa: SLF001 pylint: disable=protected-access
+        return heap[0][0] if heap else None
+
+    # Channels --
+
+    def closeChannel(self, channel, replyCode=0, replyText="Normal shutdown"):
+        with self.__lock:
+            if not channel.is_open:
+                return
+            for consumerTag in list(channel._consumers):  # noqa: SLF001 pylint: disable=protected-access
+                self.cancel(channel, consumerTag)
+            channel._open = False  # noqa: SLF001 pylint: disable=protected-access
+            queues = set()
+            for deliveryTag in sorted(channel._unacked, reverse=True):  # noqa: SLF001 pylint: disable=protected-access
+                queue, message = channel._unacked.pop(deliveryTag)  # noqa: SLF001 pylint: disable=protected-access
+                message.redelivered = True
+                queue.push(message, front=True)
+                queues.add(queue)
+            channel.connection._channels.pop(channel.channel_number, None)  # noqa: SLF001 pylint: disable=protected-access
+            if replyCode:
+                logger.warning("Channel %d closed by broker: (%d) %s", channel.channel_number, replyCode, replyText)
+            for queue in queues:
+                self.__deliver(queue)
+            self.__cond.notify_all()
+
+    def __fail(self, channel, replyCode, replyText):
+        """Close the channel with an error, as the broker would, and raise."""
+        self.closeChannel(channel, replyCode, replyText)
+        raise pika.exceptions.ChannelClosedByBroker(replyCode, replyText)
+
+    def __checkOpen(self, channel):
+        if not channel.is_open:
+            raise pika.exceptions.ChannelWrongStateError("Channel is closed.")
+
+    def __getQueue(self, channel, queueName):
+        queue = self.__queues.get(queueName)
+        if queue is None:
+            self.__fail(channel, 404, "NOT_FOUND - no queue '%s'" % queueName)
+        if queue.owner is not None and queue.owner is not channel.connection:
+            self.__fail(channel, 405, "RESOURCE_LOCKED - cannot obtain exclusive access to locked queue '%s'" % queueName)
+        return queue
+
+    def __getExchange(self, channel, exchangeName):
+        exchange = self.__exchanges.get(exchangeName)
+        if exchange is None:
+            self.__fail(channel, 404, "NOT_FOUND - no exchange '%s'" % exchangeName)
+        return exchange
+
+    def declareExchange(self, channel, name, exchangeType, passive, durable, autoDelete, arguments):
+        with self.__lock:
+            self.__checkOpen(channel)
+            exchange = self.__exchanges.get(name)
+            if passive:
+                self.__getExchange(channel, name)
+            elif exchange is None:
+                self.__exchanges[name] = BrokerExchange(name, exchangeType, durable=durable, autoDelete=autoDelete, arguments=arguments)
+            elif exchange.exchangeType != exchangeType or exchange.durable != durable:
+                self.__fail(channel, 406, "PRECONDITION_FAILED - inequivalent arg 'type' or 'durable' for exchange '%s'" % name)
+            return frame.Method(channel.channel_number, spec.Exchange.DeclareOk())
+
+    def deleteExchange(self, channel, name, ifUnused):
+        with self.__lock:
+            self.__checkOpen(channel)
+            exchange = self.__getExchange(channel, name)
+            if ifUnused and exchange.bindings:
+                self.__fail(channel, 406, "PRECONDITION_FAILED - exchange '%s' in use" % name)
+            del self.__exchanges[name]
+            return frame.Method(channel.channel_number, spec.Exchange.DeleteOk())
+
+    def declareQueue(self, channel, name, passive, durable, exclusive, autoDelete, arguments):
+        with self.__lock:
+            self.__checkOpen(channel)
+            if passive:
+                queue = self.__getQueue(channel, name)
+            else:
+                name = name or "amq.gen-%s" % uuid.uuid4().hex
+                queue = self.__queues.get(name)
+                if queue is None:
+                    queue = BrokerQueue(name, durable=durable, owner=channel.connection if exclusive else None, autoDelete=autoDelete, arguments=arguments)
+                    self.__queues[name] = queue
+                    self.__exchanges[""].bindings.append((name, name, None))
+                else:
+                    self.__getQueue(channel, name)
+                    if queue.durable != durable or queue.arguments != dict(arguments or {}):
+                        self.__fail(channel, 406, "PRECONDITION_FAILED - inequivalent arg for queue '%s'" % name)
+            return frame.Method(channel.channel_number, spec.Queue.DeclareOk(queue=queue.name, message_count=len(queue), consumer_count=len(queue.consumers)))
+
+    def deleteQueue(self, channel, name, ifUnused, ifEmpty):
+        with self.__lock:
+            self.__checkOpen(channel)
+            queue = self.__getQueue(channel, name)
+            if (ifUnused and queue.consumers) or (ifEmpty and len(queue)):
+                self.__fail(channel, 406, "PRECONDITION_FAILED - queue '%s' in use or not empty" % name)
+            count = len(queue)
+            self.__removeQueue(queue)
+            return frame.Method(channel.channel_number, spec.Queue.DeleteOk(message_count=count))
+
+    def purgeQueue(self, channel, name):
+        with self.__lock:
+            self.__checkOpen(channel)
+            queue = self.__getQueue(channel, name)
+            return frame.Method(channel.channel_number, spec.Queue.PurgeOk(message_count=queue.purge()))
+
+    def bindQueue(self, channel, queueName, exchangeName, routingKey, arguments, bind=True):
+        with self.__lock:
+            self.__checkOpen(channel)
+            self.__getQueue(channel, queueName)
+            exchange = self.__getExchange(channel, exchangeName)
+            binding = (queueName, routingKey, dict(arguments) if arguments else None)
+            if bind:
+                if binding not in exchange.bindings:
+                    exchange.bindings.append(binding)
+                return frame.Method(channel.channel_number, spec.Queue.BindOk())
+            if binding in exchange.bindings:
+                exchange.bindings.remove(binding)
+            return frame.Method(channel.channel_number, spec.Queue.UnbindOk())
+
+    def __removeQueue(self, queue):
+        for consumerChannel, consumerTag in list(queue.consumers):
+            consumerChannel._consumers.pop(consumerTag, None)  # noqa: SLF001 pylint: disable=protected-access
+        queue.consumers = []
+        self.__queues.pop(queue.name, None)
+        for exchange in self.__exchanges.values():
+            exchange.bindings = [binding for binding in exchange.bindings if binding[0] != queue.name]
+
+    # Messages --
+
+    def publish(self, channel, exchangeName, routingKey, body, properties, mandatory=False):
+        """Route a message published on channel.
+
+        On a confirming channel an unroutable mandatory message raises pika.exceptions.UnroutableError and a message
+        refused by a queue it routes to (x-overflow reject-publish) raises pika.exceptions.NackError, as BlockingChannel.basic_publish does.
+        Without confirms an unroutable mandatory message is returned to the channel's return callbacks.
+
+        """
+        with self.__lock:
+            self.__checkOpen(channel)
+            exchange = self.__getExchange(channel, exchangeName)
+            if properties.reply_to == REPLY_TO:
+                if channel._replyQueue is None:  # noqa: SLF001 pylint: disable=protected-access
+                    self.__fail(channel, 406, "PRECONDITION_FAILED - fast reply consumer does not exist")
+                properties = copy.copy(properties)
+                properties.reply_to = channel._replyQueue  # noqa: SLF001 pylint: disable=protected-access
+            accepted, refused = self.__route(exchange, routingKey, body, properties)
+            if not accepted and not refused and mandatory:
+                returned = ReturnedMessage(spec.Basic.Return(reply_code=312, reply_text="NO_ROUTE", exchange=exchange.name, routing_key=routingKey), properties, body)
+                if channel._confirming:  # noqa: SLF001 pylint: disable=protected-access
+                    raise pika.exceptions.UnroutableError([returned])
+                channel._returns.append(returned)  # noqa: SLF001 pylint: disable=protected-access
+                self.__wake([channel.connection])
+            elif refused and channel._confirming:  # noqa: SLF001 pylint: disable=protected-access
+                raise pika.exceptions.NackError([])
+
+    def __route(self, exchange, routingKey, body, properties):
+        """Route a message to the queues bound for it - returns the number of queues that took it and that refused it."""
+        queueNames = set(exchange.route(routingKey, properties))
+        if not queueNames:
+            logger.debug("Dropping unroutable message for exchange %r routing key %r", exchange.name, routingKey)
+            return 0, 0
+        now = time.time()
+        accepted = refused = 0
+        for queueName in queueNames:
+            queue = self.__queues.get(queueName)
+            if queue is None:
+                continue
+            if queue.maxLength is not None and not queue.dropHead and len(queue) >= int(queue.maxLength):
+                refused += 1
+                continue
+            accepted += 1
+            message = BrokerMessage(body, properties, exchange.name, routingKey)
+            ttls = [float(ttl) for ttl in (queue.ttlMs, properties.expiration) if ttl is not None]
+            if ttls:
+                message.expiresAt = now + min(ttls) / 1000.0
+            queue.push(message)
+            while queue.maxLength is not None and len(queue) > int(queue.maxLength):
+                self.__deadLetter(queue, queue.pop(), "maxlen")
+            self.__deliver(queue)
+        self.__cond.notify_all()
+        return accepted, refused
+
+    def __deadLetter(self, queue, message, reason):
+        exchangeName = queue.arguments.get("x-dead-letter-exchange")
+        exchange = self.__exchanges.get(exchangeName) if exchangeName is not None else None
+        if exchange is None:
+            return
+        properties = copy.copy(message.properties)
+        headers = dict(properties.headers or {})
+        deaths = [dict(death) for death in headers.get("x-death") or []]
+        death = next((death for death in deaths if death.get("queue") == queue.name and death.get("reason") == reason), None)
+        if death is None:
+            death = {"queue": queue.name, "reason": reason, "count": 0, "exchange": message.exchange, "routing-keys": [message.routingKey]}
+        else:
+            deaths.remove(death)
+        death["count"] = int(death.get("count", 0)) + 1
+        headers["x-death"] = [death, *deaths]
+        properties.headers = headers
+        properties.expiration = None
+        routingKey = queue.arguments.get("x-dead-letter-routing-key") or message.routingKey
+        self.__route(exchange, routingKey, message.body, properties)
+
+    def __expireMessages(self, now):
+        for queue in list(self.__queues.values()):
+            for message in queue.popExpired(now):
+                self.__deadLetter(queue, message, "expired")
+
+    def __nextExpiry(self):
+        times = [tm for tm in (queue.nextExpiry() for queue in self.__queues.values()) if tm is not None]
+        return min(times) if times else None
+
+    def setPrefetch(self, channel, prefetchCount):
+        with self.__lock:
+            self.__checkOpen(channel)
+            channel._prefetchCount = max(0, int(prefetchCount))  # noqa: SLF001 pylint: disable=protected-access
+            self.__deliverChannel(channel)
+
+    def consume(self, channel, queueName, callback, autoAck, consumerTag):
+        with self.__lock:
+            self.__checkOpen(channel)
+            if queueName == REPLY_TO:
+                if not autoAck:
+                    self.__fail(channel, 406, "PRECONDITION_FAILED - reply consumer cannot acknowledge")
+                queueName = "%s.%s" % (REPLY_TO, uuid.uuid4().hex)
+                self.declareQueue(channel, queueName, False, False, True, True, None)
+                channel._replyQueue = queueName  # noqa: SLF001 pylint: disable=protected-access
+            queue = self.__getQueue(channel, queueName)
+            consumerTag = consumerTag or "ctag%d.%s" % (next(self.__consumerTags), uuid.uuid4().hex[:12])
+            channel._consumers[consumerTag] = (queue, callback, autoAck)  # noqa: SLF001 pylint: disable=protected-access
+            queue.consumers.append((channel, consumerTag))
+            self.__deliver(queue)
+            return consumerTag
+
+    def cancel(self, channel, consumerTag):
+        """Cancel a consumer - deliveries not yet dispatched to it are requeued."""
+        with self.__lock:
+            consumer = channel._consumers.pop(consumerTag, None)  # noqa: SLF001 pylint: disable=protected-access
+            if consumer is None:
+                return
+            queue = consumer[0]
+            if (channel, consumerTag) in queue.consumers:
+                queue.consumers.remove((channel, consumerTag))
+            pending = [entry for entry in channel._pending if entry[0] == consumerTag]  # noqa: SLF001 pylint: disable=protected-access
+            for entry in pending:
+                channel._pending.remove(entry)  # noqa: SLF001 pylint: disable=protected-access
+            for _consumerTag, deliveryTag, message in reversed(pending):
+                channel._unacked.pop(deliveryTag, None)  # noqa: SLF001 pylint: disable=protected-access
+                message.redelivered = True
+                queue.push(message, front=True)
+            if queue.autoDelete and not queue.consumers:
+                self.__removeQueue(queue)
+            else:
+                self.__deliver(queue)
+            self.__cond.notify_all()
+
+    def get(self, channel, queueName, autoAck):
+        with self.__lock:
+            self.__checkOpen(channel)
+            queue = self.__getQueue(channel, queueName)
+            self.__expireMessages(time.time())
+            message = queue.pop()
+            if message is None:
+                return None, None, None
+            deliveryTag = next(channel._deliveryTags)  # noqa: SLF001 pylint: disable=protected-access
+            if not autoAck:
+                channel._unacked[deliveryTag] = (queue, message)  # noqa: SLF001 pylint: disable=protected-access
+            method = spec.Basic.GetOk(
+                delivery_tag=deliveryTag, redelivered=message.redelivered, exchange=message.exchange, routing_key=message.routingKey, message_count=len(queue)
+            )
+            return method, message.properties, message.body
+
+    def settle(self, channel, deliveryTag, multiple, ack=True, requeue=False):
+        """Acknowledge, or reject with or without requeue, one or (multiple) all deliveries up to deliveryTag."""
+        with self.__lock:
+            self.__checkOpen(channel)
+            unacked = channel._unacked  # noqa: SLF001 pylint: disable=protected-access
+            if multiple:
+                deliveryTags = sorted(tag for tag in unacked if deliveryTag == 0 or tag <= deliveryTag)
+            elif deliveryTag in unacked:
+                deliveryTags = [deliveryTag]
+            else:
+                self.__fail(channel, 406, "PRECONDITION_FAILED - unknown delivery tag %d" % deliveryTag)
+            for tag in reversed(deliveryTags):
+                queue, message = unacked.pop(tag)
+                if ack:
+                    continue
+                if requeue and queue.name in self.__queues:
+                    message.redelivered = True
+                    queue.push(message, front=True)
+                else:
+                    self.__deadLetter(queue, message, "rejected")
+            self.__deliverChannel(channel)
+            self.__cond.notify_all()
+
+    def __deliverChannel(self, channel):
+        for queue, _callback, _autoAck in list(channel._consumers.values()):  # noqa: SLF001 pylint: disable=protected-access
+            self.__deliver(queue)
+
+    def __deliver(self, queue):
+        """Move messages from queue to the pending deliveries of consumers with prefetch capacity, round robin."""
+        woken = []
+        while len(queue) and queue.consumers:
+            target = None
+            for ii in range(len(queue.consumers)):
+                idx = (queue.nextConsumer + ii) % len(queue.consumers)
+                channel, consumerTag = queue.consumers[idx]
+                autoAck = channel._consumers[consumerTag][2]  # noqa: SLF001 pylint: disable=protected-access
+                if autoAck or not channel._prefetchCount or len(channel._unacked) < channel._prefetchCount:  # noqa: SLF001 pylint: disable=protected-access
+                    target = (channel, consumerTag, autoAck)
+                    queue.nextConsumer = idx + 1
+                    break
+            if target is None:
+                break
+            message = queue.pop()
+            if message.expiresAt is not None and message.expiresAt <= time.time():
+                self.__deadLetter(queue, message, "expired")
+                continue
+            channel, consumerTag, autoAck = target
+            deliveryTag = next(channel._deliveryTags)  # noqa: SLF001 pylint: disable=protected-access
+            if not autoAck:
+                channel._unacked[deliveryTag] = (queue, message)  # noqa: SLF001 pylint: disable=protected-access
+            channel._pending.append((consumerTag, deliveryTag, message))  # noqa: SLF001 pylint: disable=protected-access
+            if channel.connection not in woken:
+                woken.append(channel.connection)
+        if woken:
+            self.__wake(woken)
+
+    def __wake(self, connections):
+        """Wake the threads waiting for events and the event loops of asyncio driven connections."""
+        self.__cond.notify_all()
+        for connection in connections:
+            if connection._wakeup is not None:  # noqa: SLF001 pylint: disable=protected-access
+                connection._wakeup()  # noqa: SLF001 pylint: disable=protected-access
@@ -0,0 +1,352 @@
+#
+# File: LoadGenerator.py
+# Date:  19-Oct-2026
+#
+# Updates:
+##
+"""
+Load generator for capacity planning - publishes synthetic traffic with MessagePublisher.
+
+Messages are sent by parallel producers (threads or processes), each at its share of a target rate
+with fixed spacing or open loop Poisson arrivals (exponential gaps, independent of how long publishing
+takes), or as fast as possible without a rate.  Message sizes, priorities and routing keys are drawn
+from mixes given as "value:weight,value:weight" (weights default to 1); sizes may also be a uniform
+range "min-max".
+
+While running, the achieved rate, error count and publish latency percentiles of each interval are
+reported, followed by a summary of the whole run:
+
+    python -m wwpdb.utils.message_queue.LoadGenerator --local --rate 500 --arrival poisson --producers 4 --duration 60
+    python -m wwpdb.utils.message_queue.LoadGenerator --local --count 10000 --sizes 512:8,65536:2 --priorities 1:9,9:1 --routing-keys a.uploaded,a.done
+
+With --direct messages are published with publishDirect() to the subscribers of the exchange (topic
+routing keys) rather than to a work queue.
+
+This software was developed as part of the World Wide Protein Data Bank
+Common Deposition and Annotation System Project
+
+"""
+
+__docformat__ = "restructuredtext en"
+__license__ = "Creative Commons Attribution 3.0 Unported"
+__version__ = "V0.07"
+
+import bisect
+import logging
+import multiprocessing
+import queue
+import random
+import sys
+import threading
+import time
+from optparse import OptionParser  # pylint: disable=deprecated-module
+
+from wwpdb.utils.message_queue.MessagePublisher import MessagePublisher
+
+logger = logging.getLogger()
+
+
+class WeightedMix:
+    """Draw values from a "value:weight,value:weight" mix (weights default to 1) -
+
+    :param str spec: the mix
+    :param convert: conversion of each value from str
+
+    """
+
+    def __init__(self, spec, convert=str):
+        self.values = []
+        self.__cumWeights = []
+        total = 0.0
+        for item in spec.split(","):
+            value, _sep, weight = item.strip().partition(":")
+            weight = float(weight or 1)
+            if weight <= 0:
+                raise ValueError("mix weights must be positive: %s" % spec)
+            total += weight
+            self.values.append(convert(value))
+            self.__cumWeights.append(total)
+
+    def choose(self, rng):
+        return self.values[bisect.bisect_right(self.__cumWeights, rng.random() * self.__cumWeights[-1])]
+
+
+class SizeDistribution:
+    """Draw message sizes in bytes from a uniform range "min-max" or a weighted mix of sizes."""
+
+    def __init__(self, spec):
+        self.__range = None
+        self.__mix = None
+        if "-" in spec:
+            low, high = (int(value) for value in spec.split("-", 1))
+            if low < 0 or high < low:
+                raise ValueError("bad size range: %s" % spec)
+            self.__range = (low, high)
+        else:
+            self.__mix = WeightedMix(spec, convert=int)
+
+    def choose(self, rng):
+        if self.__range is not None:
+            return rng.randint(*self.__range)
+        return self.__mix.choose(rng)
+
+
+def summarizeLatencies(latencies):
+    """Return p50, p95, p99 and max (nearest rank) of latencies (seconds) in milliseconds."""
+    values = sorted(latencies)
+    summary = {}
+    for ky, pct in (("p50", 50), ("p95", 95), ("p99", 99), ("max", 100)):
+        summary[ky] = round(1000.0 * values[round((len(values) - 1) * pct / 100.0)], 3) if values else None
+    return summary
+
+
+def _produce(generator, producerId, count, duration, rate, statsQueue, stopEvent):
+    """Producer loop run in a thread or process - publishes and reports (producerId, sent, errors, latencies) chunks."""
+    rng = random.Random(None if generator.seed is None else generator.seed + producerId)
+    publisher = MessagePublisher(local=generator.local, transport=generator.transport)
+    bodies = {}
+    sent = errors = numPublished = 0
+    latencies = []
+    startTime = nextTime = lastReport = time.time()
+    while not stopEvent.is_set() and (count is None or numPublished < count) and (duration is None or time.time() - startTime < duration):
+        if rate:
+            # Open loop - the schedule does not wait for slow publishes, late messages are sent at once
+            nextTime += rng.expovariate(rate) if generator.arrival == "poisson" else 1.0 / rate
+            delay = nextTime - time.time()
+            if delay > 0 and stopEvent.wait(delay):
+                break
+        size = generator.sizes.choose(rng)
+        if size not in bodies:
+            bodies[size] = b"x" * size
+        routingKey = generator.routingKeys.choose(rng)
+        callStart = time.perf_counter()
+        if generator.direct:
+            ok = publisher.publishDirect(bodies[size], generator.exchangeName, routingKey=routingKey)
+        else:
+            priority = generator.priorities.choose(rng) if generator.priorities else None
+            ok = publisher.publish(bodies[size], generator.exchangeName, generator.queueName, routingKey, priority=priority)
+        numPublished += 1
+        if ok:
+            sent += 1
+            latencies.append(time.perf_counter() - callStart)
+        else:
+            errors += 1
+        if time.time() - lastReport >= 0.2:
+            statsQueue.put((producerId, sent, errors, latencies))
+            sent = errors = 0
+            latencies = []
+            lastReport = time.time()
+    statsQueue.put((producerId, sent, errors, latencies))
+    statsQueue.put((producerId, None, None, None))
+
+
+class LoadGenerator:
+    """Publish synthetic traffic -
+
+    :param str exchangeName: exchange published to
+    :param str queueName: work queue (ignored with direct)
+    :param str routingKeys: routing key mix
+    :param str sizes: message size range "min-max" or size mix in bytes
+    :param str priorities: priority mix (values 1-10, since a priority queue needs a priority on every message) or None
+    :param float rate: target messages per second of all producers together (0 publishes as fast as possible)
+    :param str arrival: fixed (evenly spaced) or poisson arrivals at the target rate
+    :param bool direct: publish with publishDirect() to the subscribers of exchangeName
+    :param bool local: publish to a broker on localhost
+    :param transport: transport providing connections (default PikaTransport) - thread producers only
+    :param int seed: random seed for reproducible traffic
+
+    """
+
+    def __init__(
+        self,
+        exchangeName,
+        queueName=None,
+        routingKeys="load_routing_key",
+        sizes="1024",
+        priorities=None,
+        rate=0.0,
+        arrival="fixed",
+        direct=False,
+        local=False,
+        transport=None,
+        seed=None,
+    ):
+        if arrival not in ("fixed", "poisson"):
+            raise ValueError("arrival must be fixed or poisson: %r" % arrival)
+        if not direct and not queueName:
+            raise ValueError("a work queue is required without direct")
+        self.exchangeName = exchangeName
+        self.queueName = queueName
+        self.routingKeys = WeightedMix(routingKeys)
+        self.sizes = SizeDistribution(sizes)
+        self.priorities = WeightedMix(priorities, convert=int) if priorities else None
+        if self.priorities and not all(1 <= priority <= 10 for priority in self.priorities.values):
+            raise ValueError("priorities must be between 1 and 10: %s" % priorities)
+        self.rate = rate
+        self.arrival = arrival
+        self.direct = direct
+        self.local = local
+        self.transport = transport
+        self.seed = seed
+
+    def run(self, producers=1, mode="thread", count=None, duration=None, interval=1.0, reportFn=None):
+        """Publish count messages, or for duration seconds, and return the summary of the run -
+
+        :param int producers: number of parallel producers
+        :param str mode: thread or process producers
+        :param int count: total messages to publish (divided among the producers)
+        :param float duration: seconds to publish for
+        :param float interval: seconds between reports
+        :param reportFn: called with the stats dict of each interval (default log)
+
+        Stats are {"elapsed", "sent", "errors", "rate", "latencyMs": {"p50", "p95", "p99", "max"}}; the summary
+        also has "targetRate".  Stopped early by KeyboardInterrupt.
+
+        """
+        if count is None and duration is None:
+            raise ValueError("count or duration is required")
+        if mode == "process" and self.transport is not None:
+            raise ValueError("process producers connect through the default transport")
+        rate = self.rate / producers if self.rate else 0.0
+        if mode == "process":
+            context = multiprocessing.get_context()
+            statsQueue, stopEvent = context.Queue(), context.Event()
+            workers = [context.Process(target=_produce, args=(self, ii, self.__share(count, producers, ii), duration, rate, statsQueue, stopEvent)) for ii in range(producers)]
+        elif mode == "thread":
+            statsQueue, stopEvent = queue.Queue(), threading.Event()
+            workers = [
+                threading.Thread(target=_produce, args=(self, ii, self.__share(count, producers, ii), duration, rate, statsQueue, stopEvent), name="LoadProducer-%d" % ii)
+                for ii in range(producers)
+            ]
+        else:
+            raise ValueError("mode must be thread or process: %r" % mode)
+
+        reportFn = reportFn or (lambda stats: logger.info("%s", formatStats(stats)))
+        totalSent = totalErrors = 0
+        # Percentiles of the whole run are taken from a bounded uniform sample of the latencies
+        sample, numSeen, maxSample = [], 0, 100000
+        rng = random.Random(self.seed)
+        startTime = lastReport = time.time()
+        intervalSent = intervalErrors = 0
+        intervalLatencies = []
+        running = producers
+        for worker in workers:
+            worker.start()
+        try:
+            while running:
+                try:
+                    _producerId, sent, errors, latencies = statsQueue.get(timeout=max(0.01, lastReport + interval - time.time()))
+                    if sent is None:
+                        running -= 1
+                    else:
+                        intervalSent += sent
+                        intervalErrors += errors
+                        intervalLatencies.extend(latencies)
+                        for latency in latencies:
+                            numSeen += 1
+                            if len(sample) < maxSample:
+                                sample.append(latency)
+                            elif rng.random() * numSeen < maxSample:
+                                sample[rng.randrange(maxSample)] = latency
+                except queue.Empty:
+                    pass
+                now = time.time()
+                if now - lastReport >= interval:
+                    reportFn(self.__stats(now - startTime, intervalSent, intervalErrors, intervalLatencies, now - lastReport))
+                    totalSent += intervalSent
+                    totalErrors += intervalErrors
+                    intervalSent = intervalErrors = 0
+                    intervalLatencies = []
+                    lastReport = now
+        except KeyboardInterrupt:
+            logger.info("Stopping producers")
+            stopEvent.set()
+        finally:
+            for worker in workers:
+                worker.join()
+        totalSent += intervalSent
+        totalErrors += intervalErrors
+        elapsed = time.time() - startTime
+        summary = self.__stats(elapsed, totalSent, totalErrors, sample, elapsed)
+        summary["targetRate"] = self.rate
+        return summary
+
+    @staticmethod
+    def __share(count, producers, producerId):
+        if count is None:
+            return None
+        return count // producers + (1 if producerId < count % producers else 0)
+
+    @staticmethod
+    def __stats(elapsed, sent, errors, latencies, period):
+        return {
+            "elapsed": round(elapsed, 3),
+            "sent": sent,
+            "errors": errors,
+            "rate": round(sent / period, 1) if period > 0 else None,
+            "latencyMs": summarizeLatencies(latencies),
+        }
+
+
+def formatStats(stats):
+    latency = stats["latencyMs"]
+    return "%8.1fs %10s msg/s %8d sent %6d errors   latency ms p50 %s p95 %s p99 %s max %s" % (
+        stats["elapsed"],
+        stats["rate"],
+        stats["sent"],
+        stats["errors"],
+        latency["p50"],
+        latency["p95"],
+        latency["p99"],
+        latency["max"],
+    )
+
+
+def main():
+    usage = "usage: %prog [options]"
+    parser = OptionParser(usage)
+    parser.add_option("--local", default=False, action="store_true", help="publish to RabbitMQ on localhost (default the site broker)")
+    parser.add_option("--exchange", default="load_exchange", help="exchange name (default=load_exchange)")
+    parser.add_option("--queue", default="load_queue", help="work queue name (default=load_queue)")
+    parser.add_option("--direct", default=False, action="store_true", help="publish to the subscribers of the exchange rather than a work queue")
+    parser.add_option("--routing-keys", dest="routingKeys", default="load_routing_key", help="routing key mix key:weight,... (default=load_routing_key)")
+    parser.add_option("--sizes", default="1024", help="message size range min-max or mix size:weight,... in bytes (default=1024)")
+    parser.add_option("--priorities", default=None, help="priority mix priority:weight,... with priorities 1-10 (default no priority)")
+    parser.add_option("--rate", default=0.0, type="float", help="target messages per second of all producers (default=0, as fast as possible)")
+    parser.add_option("--arrival", default="fixed", help="fixed or poisson arrivals at the target rate (default=fixed)")
+    parser.add_option("--producers", default=1, type="int", help="number of parallel producers (default=1)")
+    parser.add_option("--producer-mode", dest="producerMode", default="thread", help="thread or process producers (default=thread)")
+    parser.add_option("--count", default=None, type="int", help="total messages to publish")
+    parser.add_option("--duration", default=None, type="float", help="seconds to publish for (default=10 without --count)")
+    parser.add_option("--interval", default=1.0, type="float", help="seconds between reports (default=1)")
+    parser.add_option("--seed", default=None, type="int", help="random seed for reproducible traffic")
+    options, _args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s [%(levelname)s]-%(module)s.%(funcName)s: %(message)s")
+    try:
+        generator = LoadGenerator(
+            options.exchange,
+            queueName=options.queue,
+            routingKeys=options.routingKeys,
+            sizes=options.sizes,
+            priorities=options.priorities,
+            rate=options.rate,
+            arrival=options.arrival,
+            direct=options.direct,
+            local=options.local,
+            seed=options.seed,
+        )
+    except ValueError as exc:
+        parser.error(str(exc))
+    duration = 10.0 if options.count is None and options.duration is None else options.duration
+
+    def reportFn(stats):
+        sys.stdout.write(formatStats(stats) + "\n")
+        sys.stdout.flush()
+
+    summary = generator.run(producers=options.producers, mode=options.producerMode, count=options.count, duration=duration, interval=options.interval, reportFn=reportFn)
+    sys.stdout.write("total (target %s msg/s)\n%s\n" % (summary["targetRate"] or "unlimited", formatStats(summary)))
+
+
+if __name__ == "__main__":
+    main()
@@ -18,11 +18,18 @@ __email__ = "jwest@rcsb.rutgers.edu"
 __license__ = "Creative Commons Attribution 3.0 Unported"
 __version__ = "V0.07"
 
+import functools
 import logging
-import threading
+import time
 
 import pika
 
+from wwpdb.utils.message_queue.ConsumerAutoscaler import ConsumerAutoscaler
+from wwpdb.utils.message_queue.MessageDispatcher import MessageDispatcher
+from wwpdb.utils.message_queue.MessageProfiler import MessageProfiler
+from wwpdb.utils.message_queue.MessageRetryPolicy import MessageRetryPolicy
+from wwpdb.utils.message_queue.MessageTransport import PikaTransport
+
 # import time
 
 try:
@@ -42,10 +49,11 @@ class MessageConsumerBase:
 
     """
 
-    def __init__(self, amqpUrl, priority=False, local=False):
+    def __init__(self, amqpUrl, priority=False, local=False, transport=None):
         """Create a new instance of the consumer class, passing in the AMQP URL used to connect to RabbitMQ.
 
         :param str amqp_url: The AMQP url to connect with
+        :param transport: transport providing connections (default PikaTransport, see MessageTransport.py)
 
         """
         self._connection = None
@@ -60,6 +68,14 @@ class MessageConsumerBase:
 
         self.__priority = priority
         self.__local = local
+        self.__transport = transport if transport is not None else PikaTransport()
+
+        self.__dispatcher = MessageDispatcher(self)
+        self.__profiler = None
+        self.__retryPolicy = None
+        self.__autoscaler = None
+        self.__drainDeadline = None
+        self.__drainRequest = None
 
         #
         # self.__maxReconnectAttemps = 10
@@ -69,15 +85,256 @@ class MessageConsumerBase:
     def setQueue(self, queueName, routingKey):
         self.__queueName = queueName
         self.__routingKey = routingKey
+        if self.__profiler is not None:
+            self.__profiler.setPrefix(queueName or "worker")
 
     def setExchange(self, exchange, exchangeType="topic"):
         self.__exchange = exchange
         self.__exchangeType = exchangeType
         return True
 
+    def setExecutionMode(self, mode="thread", numWorkers=1, startMethod=None):
+        """Select how workerMethod is executed.
+
+        :param str mode: "thread" (default) runs messages in long-lived worker threads of this process,
+                         "process" dispatches messages to a pool of worker processes so that
+                         CPU bound workers are not serialized by the GIL.
+        :param int numWorkers: number of messages processed concurrently, which is also the number of
+                               unacknowledged deliveries requested from the broker (default 1)
+        :param str startMethod: multiprocessing start method for the pool ("forkserver" where available,
+                                otherwise "spawn")
+
+        In process mode the consumer instance is pickled once into each pool process, so subclasses
+        must be importable at module level and any additional unpicklable attributes must be excluded
+        by extending __getstate__().  The broker connection remains in the parent process.
+
+        """
+        try:
+            self.__dispatcher.setExecutionMode(mode, numWorkers=numWorkers, startMethod=startMethod)
+        except ValueError:
+            logger.exception("Unsupported execution mode %r", mode)
+            return False
+        return True
+
+    def setBatch(self, batchSize, batchWaitMs=100):
+        """Enable batch consumption -
+
+        Deliveries are collected until batchSize messages have arrived, or batchWaitMs milliseconds have
+        passed since the first message of the batch, and are then passed together to workerMethodBatch().
+        The successful messages of a batch are acknowledged with a single Basic.Ack (multiple=True).
+
+        :param int batchSize: maximum number of messages in a batch
+        :param int batchWaitMs: maximum time in milliseconds to wait for a batch to fill
+
+        """
+        self.__dispatcher.setBatch(batchSize, batchWaitMs=batchWaitMs)
+        return True
+
+    def setPriorityBuffer(self, bufferSize=20, agingSeconds=10.0):
+        """Order prefetched messages by priority within the consumer, with aging -
+
+        Broker side priorities (x-max-priority) only order the messages still in the queue; anything already
+        prefetched is processed in arrival order.  With a priority buffer the channel prefetches bufferSize messages
+        beyond the number of workers and each free worker takes the waiting message of highest effective priority,
+        where every agingSeconds of waiting adds one priority level.  Urgent messages run first while a low priority
+        message waits at most about (priority difference x agingSeconds) behind newer urgent ones.
+
+        Not applied in batch mode.
+
+        :param int bufferSize: number of prefetched messages held for reordering
+        :param float agingSeconds: waiting time equivalent to one priority level
+
+        """
+        self.__dispatcher.setPriorityBuffer(bufferSize=bufferSize, agingSeconds=agingSeconds)
+        return True
+
+    def setWorkerTimeout(self, timeout, timeoutHeader="x-worker-timeout"):
+        """Limit the time a workerMethod call may take -
+
+        A watchdog expires any message still being worked on timeout seconds after it was dispatched (or after
+        the number of seconds in its timeoutHeader message header, if present).  The message is requeued, or
+        failed (see setRejectFailed() and setRetryPolicy()) if it had already been redelivered, and the worker slot is
+        freed so that other messages continue to be processed.  A hung worker thread is replaced and left to exit
+        when its call returns.  In process mode the whole pool is killed and rebuilt, as a pool cannot stop a single
+        task; the other messages it was working on are interrupted and requeued, without counting as a failure
+        even if they had been redelivered.  The workerTimeout() hook is called for each expired message.
+
+        :param float timeout: default deadline in seconds, or None to apply deadlines only to messages with the header
+        :param str timeoutHeader: name of the message header overriding the deadline
+
+        """
+        self.__dispatcher.setTimeout(timeout, timeoutHeader=timeoutHeader)
+        return True
+
+    def setPipelineStage(self, confirm=False):
+        """Run this consumer as a pipeline stage that hands its output to the next stage -
+
+        workerMethod is called as workerMethod(msgBody, deliveryTag=..., context=StageContext) and publishes
+        downstream messages with context.publish(message, routingKey, exchangeName="", headers=None, priority=None)
+        over this consumer's connection, rather than opening a MessagePublisher connection per message.  The
+        publishes are made before the input message is acknowledged; if one fails the input is requeued (or
+        failed, if already redelivered).  Not used in batch mode.  See StageContext.
+
+        :param bool confirm: use publisher confirms, so that the input is only acknowledged once the broker has
+                             confirmed (and routed) every downstream message
+
+        """
+        self.__dispatcher.setStageContext(True, confirm=confirm)
+        return True
+
+    def setTracing(self, enabled=True):
+        """Pass the trace context of each message to workerMethod -
+
+        workerMethod is called as workerMethod(msgBody, deliveryTag=..., trace=TraceContext).  Messages published
+        from the worker with MessagePublisher.publish(..., trace=trace) continue the trace, so the queue wait and
+        worker time logged for each hop can be followed through a pipeline by trace id.  Not used in batch mode.
+        See TraceContext.py.
+
+        """
+        self.__dispatcher.setTracing(enabled)
+        return True
+
+    def setProfiling(self, outputDir, everyN=0, slowSeconds=None, sampleInterval=0.05, maxFiles=20):
+        """Profile a sample of workerMethod calls and write the profiles to outputDir -
+
+        Every Nth call is run under cProfile (one at a time per process) and written as a .prof file, and
+        the stacks of calls running longer than slowSeconds are sampled every sampleInterval seconds and
+        written as collapsed stacks to a .collapsed file.  The newest maxFiles files of each kind are kept.
+        Files are named after the queue (as set by setQueue(), before or after this call).  See MessageProfiler.
+
+        :param str outputDir: directory for the profile files (e.g. the ws-logs directory of a detached consumer)
+        :param int everyN: run every Nth call under cProfile (0 disables)
+        :param float slowSeconds: sample the stacks of calls running longer than this (None disables)
+        :param float sampleInterval: seconds between stack samples
+        :param int maxFiles: number of files of each kind kept
+
+        """
+        self.__profiler = MessageProfiler(outputDir, everyN=everyN, slowSeconds=slowSeconds, sampleInterval=sampleInterval, maxFiles=maxFiles, prefix=self.__queueName or "worker")
+        self.__dispatcher.setProfiler(self.__profiler)
+        return True
+
+    def setRetryPolicy(self, retryDelays=(10, 60, 600), maxAttempts=None, deadLetterQueue=None):
+        """Retry failed messages through tiered TTL queues and then park them in a dead-letter queue -
+
+        Without a retry policy a message whose workerMethod raises is logged and acknowledged (see also
+        setRejectFailed()).  With one, it is
+        republished to "<queue>.retry.<ms>" where it waits retryDelays[n] seconds before the broker returns it to the
+        work queue.  The attempt count travels in the x-retry-count header.  After maxAttempts the message moves
+        to the dead-letter queue (default "<queue>.dead").  See MessageRetryPolicy.
+
+        :param retryDelays: retry delays in seconds, one per retry tier
+        :param int maxAttempts: total attempts before dead-lettering (default len(retryDelays) + 1)
+        :param str deadLetterQueue: dead-letter queue name
+
+        """
+        self.__retryPolicy = MessageRetryPolicy(retryDelays=retryDelays, maxAttempts=maxAttempts, deadLetterQueue=deadLetterQueue)
+        self.__dispatcher.setRetryPolicy(self.__retryPolicy)
+        return True
+
+    def setRejectFailed(self, enabled=True):
+        """Reject (without requeue) rather than acknowledge messages whose workerMethod raises -
+
+        Failed messages are acknowledged by default, so they are dropped after the error is logged.  Rejecting them
+        instead hands them to the dead-letter exchange of the queue, if one is configured on the broker.  Has no
+        effect when a retry policy is set (setRetryPolicy()).
+
+        :param bool enabled: reject failed messages
+
+        """
+        self.__dispatcher.setRejectFailed(enabled)
+        return True
+
+    def setAutoscaling(self, minWorkers, maxWorkers, interval=5.0, scaleUpBacklog=2.0, scaleDownUtilization=0.25, cooldown=30.0):
+        """Scale the number of workers (and the prefetch count) with the depth of the work queue -
+
+        Every interval seconds the number of ready messages is sampled with a passive queue declaration.
+        The worker pool grows (up to maxWorkers) when more than scaleUpBacklog messages per worker are waiting,
+        and shrinks one worker at a time (down to minWorkers) when the queue is empty and the smoothed fraction
+        of busy workers is below scaleDownUtilization.  Resizes are at least cooldown seconds apart.
+        See ConsumerAutoscaler.
+
+        :param int minWorkers: minimum number of workers
+        :param int maxWorkers: maximum number of workers
+        :param float interval: seconds between queue depth samples
+        :param float scaleUpBacklog: ready messages per worker that trigger growth
+        :param float scaleDownUtilization: busy fraction of workers below which the pool shrinks
+        :param float cooldown: minimum seconds between resizes
+
+        """
+        self.__autoscaler = ConsumerAutoscaler(
+            minWorkers=minWorkers,
+            maxWorkers=maxWorkers,
+            interval=interval,
+            scaleUpBacklog=scaleUpBacklog,
+            scaleDownUtilization=scaleDownUtilization,
+            cooldown=cooldown,
+        )
+        return True
+
+    def __getstate__(self):
+        """Exclude the broker connection and pool handles when the consumer is sent to a worker process."""
+        state = self.__dict__.copy()
+        for ky in (
+            "_connection",
+            "_channel",
+            "_MessageConsumerBase__dispatcher",
+            "_MessageConsumerBase__autoscaler",
+            "_MessageConsumerBase__transport",
+            "_MessageConsumerBase__profiler",
+        ):
+            state[ky] = None
+        return state
+
     def workerMethod(self, msgBody, deliveryTag=None):
         raise exceptions.NotImplementedError
 
+    def workerSetup(self):
+        """Optional hook run once in each worker thread (or pool process) before it processes any message.
+
+        Use this to initialize expensive resources that are reused across messages (e.g. in a threading.local()).
+
+        """
+
+    def workerTeardown(self):
+        """Optional hook run once in each worker thread (or pool process) when the consumer shuts down."""
+
+    def workerTimeout(self, deliveryTag):
+        """Optional hook run on the connection thread when the worker for deliveryTag misses its deadline.
+
+        Use this to terminate external programs started for the message so that a replaced worker thread
+        can return.  Pool processes are killed by the watchdog.
+
+        """
+
+    def workerCompleted(self, properties, result, exc):
+        """Optional hook run on the connection thread when a workerMethod call finishes, before the delivery is acknowledged.
+
+        :param properties: message properties (pika.BasicProperties)
+        :param result: value returned by workerMethod (None if it raised)
+        :param exc: exception raised by workerMethod, or None
+
+        Not called in batch mode.  See RpcServer, which publishes the result as the reply to the message.
+
+        """
+
+    def workerMethodBatch(self, msgBodies, deliveryTags):
+        """Process a batch of messages (batch mode only) -
+
+        Return the delivery tags of the messages that failed, which are failed individually (see
+        setRejectFailed() and setRetryPolicy()), or None if all succeeded.  Raising an exception fails the whole batch.
+
+        The default implementation calls workerMethod() for each message in turn.
+
+        """
+        failedTags = []
+        for msgBody, deliveryTag in zip(msgBodies, deliveryTags):
+            try:
+                self.workerMethod(msgBody, deliveryTag=deliveryTag)
+            except Exception:
+                logger.exception("Worker failing with exception for message %s", deliveryTag)
+                failedTags.append(deliveryTag)
+        return failedTags
+
     def connect(self):
         """Create connection to RabbitMQ and return connection handle.
 
@@ -92,12 +349,7 @@ class MessageConsumerBase:
         #                              on_open_error_callback=None,
         #                              stop_ioloop_on_close=False)
 
-        if self.__local:
-            return pika.BlockingConnection(pika.ConnectionParameters("localhost"))
-
-        return pika.BlockingConnection(
-            pika.URLParameters(self._url),
-        )
+        return self.__transport.connect(url=self._url, local=self.__local)
         #                               on_open_callback=self.onConnectionOpen,
         #                               on_open_error_callback=None,
         #                               stop_ioloop_on_close=False)
@@ -108,25 +360,71 @@ class MessageConsumerBase:
 
         """
         self._connection = self.connect()
-        self._channel = self._connection.channel()
+        if not self.openConsumer(self._connection, self._connection.channel()):
+            self._connection.close()
+            return
+        #
+        # self.addOnChannelCloseCallback()
+        # self.setupExchange(self.__exchange, self.__exchangeType)
+        waitForWorkers = True
+        try:
+            self._connection.call_later(0.25, self.__pollDrainRequest)
+            self._channel.start_consuming()
+            if self.__drainDeadline is not None:
+                waitForWorkers = self.finishDrain()
+                if self._connection.is_open:
+                    self._connection.close()
+        finally:
+            self.closeConsumer(wait=waitForWorkers)
+        # self.onConnectionOpen()
+        # self._connection.ioloop.start()
+
+    def openConsumer(self, connection, channel, executor=None, prefetchCount=None):
+        """Declare the work queue on channel and start consuming from it without entering the event loop.
+
+        Used by run() and by ConsumerHost, which multiplexes several consumers over one connection.
+
+        :param connection: connection whose thread services the channel and receives worker completions
+        :param channel: channel dedicated to this consumer
+        :param executor: shared thread executor for workerMethod calls in thread mode (see MessageDispatcher.start())
+        :param int prefetchCount: prefetch count for the channel (default number of workers times batch size)
+
+        :returns: True on success or False if the queue could not be declared
+
+        """
+        self._connection = connection
+        self._channel = channel
         try:
             if self.__priority:
                 self._channel.queue_declare(queue=self.__queueName, durable=True, arguments={"x-max-priority": 10})
             else:
                 self._channel.queue_declare(queue=self.__queueName, durable=True)
         except Exception:  # noqa: BLE001
-            self._connection.close()
             logger.critical("error - mixing of priority queues and non-priority queues")
-            return
+            return False
 
-        self._channel.basic_qos(prefetch_count=1)
-        self._channel.basic_consume(queue=self.__queueName, on_message_callback=self.onMessage)
-        #
-        # self.addOnChannelCloseCallback()
-        # self.setupExchange(self.__exchange, self.__exchangeType)
-        self._channel.start_consuming()
-        # self.onConnectionOpen()
-        # self._connection.ioloop.start()
+        if self.__retryPolicy is not None:
+            self.__retryPolicy.declare(self._channel, self.__queueName)
+        self.__dispatcher.start(self._connection, self._channel, executor=executor, queueName=self.__queueName)
+        self._channel.basic_qos(prefetch_count=prefetchCount or self.__dispatcher.getPrefetchCount())
+        self._consumerTag = self._channel.basic_consume(queue=self.__queueName, on_message_callback=self.onMessage)
+        if self.__autoscaler is not None:
+            self.__autoscaler.start(self._connection, self._channel, self.__queueName, self.__dispatcher)
+        return True
+
+    def isConsuming(self):
+        """Return True while the broker consumer opened by openConsumer() is active."""
+        return self._channel is not None and self._channel.is_open and bool(self._channel.consumer_tags)
+
+    def closeConsumer(self, wait=True):
+        """Stop the autoscaler and shut down the workers started by openConsumer().
+
+        :param bool wait: wait for running workerMethod calls to return
+
+        """
+        if self.__autoscaler is not None:
+            self.__autoscaler.stop()
+        self.__dispatcher.shutdown(wait=wait)
 
     def onMessage(self, unused_channel, basic_deliver, properties, body):  # noqa: ARG002
         """Invoked when a message is delivered from RabbitMQ.
@@ -142,34 +440,32 @@ class MessageConsumerBase:
         :param pika.Spec.BasicProperties: properties
         :param str|unicode body: The message body
 
+        workerMethod is started on a worker and this method returns to the connection loop at once.
+        The delivery is acknowledged as soon as the worker signals completion.
+
         """
         logger.info("Received message # %s from %s: %s", basic_deliver.delivery_tag, properties.app_id, body)
-        try:
-            thread = threading.Thread(target=self.workerMethod, args=(body, basic_deliver.delivery_tag))
-            thread.start()
-            while thread.is_alive():
-                # Loop while the thread is processing
-                # time.sleep(1.0)
-                # self._channel.process_data_events()
-                self._channel._connection.sleep(1.0)  # noqa: SLF001 # pylint: disable=protected-access
-            # print("Back from thread")
-            # self.workerMethod(msgBody=body, deliveryTag=basic_deliver.delivery_tag)
-            # time.sleep(10)
-        except Exception as e:
-            logger.exception("Worker failing with exception")
-            logger.exception(e)
-        logging.info("Done task")
-        # unused_channel.basic_ack(delivery_tag = basic_deliver.delivery_tag)
-        self.acknowledgeMessage(basic_deliver.delivery_tag)
-
-    def acknowledgeMessage(self, deliveryTag):
+        self.__dispatcher.dispatch(basic_deliver, properties, body)
+
+    def acknowledgeMessage(self, deliveryTag, multiple=False):
         """Acknowledge the message delivery from RabbitMQ by sending a Basic.Ack method with the delivery tag.
 
         :param int delivery_tag: The delivery tag from the Basic.Deliver frame
+        :param bool multiple: acknowledge all outstanding deliveries up to and including delivery_tag
 
         """
-        logger.info("Acknowledging message %s", deliveryTag)
-        self._channel.basic_ack(deliveryTag)
+        logger.info("Acknowledging message %s (multiple=%r)", deliveryTag, multiple)
+        self._channel.basic_ack(deliveryTag, multiple=multiple)
+
+    def rejectMessage(self, deliveryTag, requeue=False):
+        """Reject the message delivery from RabbitMQ by sending a Basic.Nack method with the delivery tag.
+
+        :param int delivery_tag: The delivery tag from the Basic.Deliver frame
+        :param bool requeue: return the message to the queue rather than discard (or dead-letter) it
+
+        """
+        logger.info("Rejecting message %s (requeue=%r)", deliveryTag, requeue)
+        self._channel.basic_nack(deliveryTag, requeue=requeue)
 
     def onChannelOpen(self, channel):
         """This method is invoked by pika when the channel has been opened.
@@ -361,6 +657,66 @@ class MessageConsumerBase:
         logger.info("Cleanly stopped")
         # self._connection.ioloop.start()
 
+    def drain(self, timeout=30.0):
+        """Stop taking new deliveries, finish in-flight work and close the connection -
+
+        The consumer is cancelled at once (deliveries prefetched but not yet dispatched are returned to the
+        queue by pika).  run() then waits up to timeout seconds for in-flight workerMethod calls, acknowledging
+        each as it completes, requeues anything still running or waiting in a batch, closes the connection
+        and returns.  Each delivery is therefore either acknowledged or requeued, never redelivered after
+        completing.
+
+        Must be called on the connection thread (e.g. from a connection callback); use requestDrain()
+        from other threads and signalDrain() from signal handlers.
+
+        :param float timeout: seconds to wait for in-flight work
+
+        """
+        if self.__drainDeadline is not None:
+            return
+        logger.info("Draining consumer (timeout %.1f seconds)", timeout)
+        self._closing = True
+        self.__drainDeadline = time.time() + timeout
+        if self.__autoscaler is not None:
+            self.__autoscaler.stop()
+        if self._channel is not None and self._consumerTag is not None:
+            self._channel.basic_cancel(self._consumerTag)
+
+    def requestDrain(self, timeout=30.0):
+        """Thread safe request to drain() the running consumer (not for signal handlers - see signalDrain())."""
+        if self._connection is not None and self._connection.is_open:
+            self._connection.add_callback_threadsafe(functools.partial(self.drain, timeout))
+
+    def signalDrain(self, timeout=30.0):
+        """Signal handler safe request to drain() the consumer started by run() -
+
+        Only records the request, which run() picks up on the connection thread within a quarter of a second.
+        A signal handler runs on the main thread between two bytecodes, possibly while that thread is inside the
+        connection holding its locks, so it must not call into the connection (as requestDrain() does).
+
+        """
+        self.__drainRequest = timeout
+
+    def __pollDrainRequest(self):
+        """Connection thread - start a drain recorded by signalDrain(), otherwise check again shortly."""
+        if self.__drainRequest is not None:
+            self.drain(self.__drainRequest)
+        elif self.__drainDeadline is None and self._connection is not None and self._connection.is_open:
+            self._connection.call_later(0.25, self.__pollDrainRequest)
+
+    def finishDrain(self):
+        """Service completions until in-flight work is done or the drain deadline passes.
+
+        Returns True if all in-flight work completed.
+
+        """
+        numRequeued = self.__dispatcher.requeuePending()
+        while self.__dispatcher.getInFlightCount() and time.time() < self.__drainDeadline:
+            self._connection.process_data_events(time_limit=min(0.25, max(0.0, self.__drainDeadline - time.time())))
+        numAbandoned = self.__dispatcher.abandonInFlight()
+        logger.info("Drain complete - requeued %d pending and %d unfinished messages", numRequeued, numAbandoned)
+        return numAbandoned == 0
+
     def closeConnection(self):
         """This method closes the connection to RabbitMQ."""
         logger.info("Closing connection")
@@ -0,0 +1,799 @@
+#
+# File: MessageDispatcher.py
+# Date:  19-Oct-2026
+#
+# Updates:
+#  19-Oct-2026       pipeline stage context for publishing downstream on the consumer connection
+#  19-Oct-2026       record consume, worker and acknowledgement metrics (see MessageMetrics.py)
+#  19-Oct-2026       queue wait time and trace context of each delivery
+#  19-Oct-2026       optional sampling profiler around worker calls
+#  19-Oct-2026       acknowledge failed messages by default again, setRejectFailed() to reject them
+#  19-Oct-2026       kill a process pool by the worker pids it reports and requeue the work it loses to the watchdog
+#  19-Oct-2026       cancel work not yet started when a drain abandons it or a process pool is shut down
+##
+"""
+Execution of consumer workerMethod calls off the connection thread.
+
+Deliveries are handed to worker threads or a process pool and onMessage returns to the
+connection loop at once.  When a worker finishes, completion is marshalled back onto the
+connection thread with add_callback_threadsafe(), so the acknowledgement (and the next
+delivery) follow within milliseconds while heartbeats continue to be serviced.
+
+This software was developed as part of the World Wide Protein Data Bank
+Common Deposition and Annotation System Project
+
+"""
+
+__docformat__ = "restructuredtext en"
+__license__ = "Creative Commons Attribution 3.0 Unported"
+__version__ = "V0.07"
+
+import functools
+import heapq
+import itertools
+import logging
+import multiprocessing
+import multiprocessing.util
+import os
+import queue
+import signal
+import sys
+import threading
+import time
+import weakref
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import pika
+
+from wwpdb.utils.message_queue import MessageMetrics
+from wwpdb.utils.message_queue.StageContext import StageContext
+from wwpdb.utils.message_queue.TraceContext import TraceContext
+
+logger = logging.getLogger()
+
+# Consumer instance (and optional MessageProfiler) installed in each pool process by _initProcessWorker()
+_processConsumer = None
+_processProfiler = None
+
+
+def _initProcessWorker(consumer, profiler=None, pidQueue=None):
+    """Pool process initializer - keep a private copy of the consumer for the life of the process and report its pid."""
+    global _processConsumer, _processProfiler  # noqa: PLW0603 pylint: disable=global-statement
+    if pidQueue is not None:
+        pidQueue.put(os.getpid())
+    _processConsumer = consumer
+    _processProfiler = profiler
+    consumer.workerSetup()
+    multiprocessing.util.Finalize(None, consumer.workerTeardown, exitpriority=10)
+
+
+def _callProcessWorker(fn, *args, **kwargs):
+    if _processProfiler is None:
+        return fn(*args, **kwargs)
+    return _processProfiler.run(fn, *args, **kwargs)
+
+
+def _runProcessWorker(msgBody, deliveryTag, **kwargs):
+    """Run the consumer workerMethod inside a pool process and return its result to the parent."""
+    return _callProcessWorker(_processConsumer.workerMethod, msgBody, deliveryTag=deliveryTag, **kwargs)
+
+
+def _runProcessStageWorker(msgBody, deliveryTag, context, **kwargs):
+    """Run the consumer workerMethod with a stage context inside a pool process and return its result and buffered publishes."""
+    result = _callProcessWorker(_processConsumer.workerMethod, msgBody, deliveryTag=deliveryTag, context=context, **kwargs)
+    return result, context.takeBuffered()
+
+
+def _runProcessBatchWorker(msgBodies, deliveryTags):
+    """Run the consumer workerMethodBatch inside a pool process and return its result to the parent."""
+    return _callProcessWorker(_processConsumer.workerMethodBatch, msgBodies, deliveryTags)
+
+
+class WorkerThreadPool:
+    """Long-lived worker threads fed from a shared work queue -
+
+    Each thread runs setupHook() once before taking work and teardownHook() when it exits, so
+    per-thread resources (database connections, parsed dictionaries, ...) stay warm across messages.
+
+    :param int numThreads: number of worker threads
+    :param setupHook: callable run in each worker thread at start up
+    :param teardownHook: callable run in each worker thread at shut down
+
+    """
+
+    def __init__(self, numThreads, setupHook=None, teardownHook=None, name="MessageWorker"):
+        self.__setupHook = setupHook
+        self.__teardownHook = teardownHook
+        self.__name = name
+        self.__queue = queue.SimpleQueue()
+        self.__lock = threading.Lock()
+        self.__threads = []
+        self.__numThreads = 0
+        self.__serialNo = 0
+        self.__running = {}
+        self.__retired = set()
+        self.resize(numThreads)
+
+    def getNumThreads(self):
+        return self.__numThreads
+
+    def submit(self, fn, *args, **kwargs):
+        """Queue fn(*args, **kwargs) for the next free worker thread and return a Future for its result."""
+        future = Future()
+        self.__queue.put((future, fn, args, kwargs))
+        return future
+
+    def resize(self, numThreads):
+        """Grow or shrink the pool.  Surplus threads exit after completing their current work."""
+        numThreads = max(1, int(numThreads))
+        with self.__lock:
+            self.__threads = [thread for thread in self.__threads if thread.is_alive()]
+            for _ in range(numThreads - self.__numThreads):
+                self.__startThread()
+            for _ in range(self.__numThreads - numThreads):
+                self.__queue.put(None)
+            self.__numThreads = numThreads
+
+    def replaceWorker(self, future):
+        """Start a new thread in place of the one running future (e.g. hung past its deadline).
+
+        The replaced thread exits once its current call returns.  Returns False if future is not running.
+
+        """
+        with self.__lock:
+            for thread, runningFuture in self.__running.items():
+                if runningFuture is future and thread not in self.__retired:
+                    self.__retired.add(thread)
+                    self.__startThread()
+                    return True
+        return False
+
+    def __startThread(self):
+        self.__serialNo += 1
+        thread = threading.Thread(target=self.__workerLoop, name="%s-%d" % (self.__name, self.__serialNo))
+        thread.daemon = True
+        thread.start()
+        self.__threads.append(thread)
+
+    def shutdown(self, wait=True):
+        """Stop the threads once queued work has run.  With wait, join all but replaced (hung) threads."""
+        with self.__lock:
+            for _ in range(self.__numThreads):
+                self.__queue.put(None)
+            self.__numThreads = 0
+            threads = [thread for thread in self.__threads if thread not in self.__retired]
+        if wait:
+            for thread in threads:
+                thread.join()
+
+    def __workerLoop(self):
+        if self.__setupHook is not None:
+            try:
+                self.__setupHook()
+            except Exception:
+                logger.exception("Worker setup failing")
+        try:
+            while True:
+                item = self.__queue.get()
+                if item is None:
+                    break
+                future, fn, args, kwargs = item
+                if not future.set_running_or_notify_cancel():
+                    continue
+                thread = threading.current_thread()
+                with self.__lock:
+                    self.__running[thread] = future
+                try:
+                    result = fn(*args, **kwargs)
+                except BaseException as e:  # noqa: BLE001
+                    future.set_exception(e)
+                else:
+                    future.set_result(result)
+                with self.__lock:
+                    del self.__running[thread]
+                    if thread in self.__retired:
+                        self.__retired.discard(thread)
+                        self.__threads.remove(thread)
+                        break
+        finally:
+            if self.__teardownHook is not None:
+                try:
+                    self.__teardownHook()
+                except Exception:
+                    logger.exception("Worker teardown failing")
+
+
+class MessageDispatcher:
+    """Run workerMethod for each delivery and acknowledge it on completion -
+
+    :param consumer: consumer instance providing workerMethod(), workerSetup(), workerTeardown(),
+                     acknowledgeMessage() and rejectMessage() (and workerTimeout() if a timeout is set).  An optional
+                     workerCompleted(properties, result, exc) method is called on the connection thread with the
+                     outcome of each (non-batch) workerMethod call before the delivery is acknowledged or rejected.
+                     If it returns True for a failed call the failure is taken as handled (e.g. reported to the
+                     sender) and the delivery acknowledged rather than disposed of as a failed message.
+    :param str mode: "thread" runs workers in threads of this process, "process" in a pool of worker processes
+    :param int numWorkers: number of deliveries processed concurrently
+    :param str startMethod: multiprocessing start method for the process pool
+
+    In batch mode (setBatch()) deliveries are collected until batchSize have arrived or the oldest has
+    waited batchWaitMs, then passed together to workerMethodBatch(msgBodies, deliveryTags).  That method
+    returns the delivery tags that failed (or None when all succeeded); failures are disposed of individually
+    (see below) and the remainder acknowledged with a single multiple-ack where the delivery tag ordering allows.
+
+    With a priority buffer (setPriorityBuffer()) deliveries beyond those being worked on are held in a heap and
+    started highest effective priority first as workers become free.  The effective priority is the message
+    priority plus one level for every agingSeconds spent waiting, so low priority work is delayed but never
+    starved.  Ordering uses the static key arrivalTime / agingSeconds - priority, which ranks waiting messages
+    the same way at any instant without re-keying the heap.
+
+    With a worker timeout (setTimeout()) a watchdog timer on the connection thread expires deliveries whose worker
+    has not finished by the deadline.  The delivery is requeued (or failed if it was already redelivered) and the
+    worker slot freed: a hung thread is replaced by a new one and left to exit when its call returns, and a process
+    pool with a hung worker is killed and rebuilt.  The other deliveries the killed pool was working on are requeued
+    whether or not they had been redelivered, as the kill is not a failure of theirs.
+
+    As each delivery is handed to a worker its trace context (TraceContext.fromProperties()) is recovered and the
+    time it spent in the queue since publication logged with the trace id, followed by the worker time when the
+    worker finishes.  With tracing (setTracing()) workerMethod is also passed trace=TraceContext, to continue
+    the trace in messages it publishes; a stage context carries it as context.trace.  Not used in batch mode.
+
+    With metrics enabled (MessageMetrics.REGISTRY) messages and bytes consumed, queue wait time, workerMethod execution time,
+    deliveries in flight and acknowledgements are recorded, labelled with the queue name passed to start().
+
+    A failed message is logged and acknowledged, as the consumers have always done, unless a MessageRetryPolicy
+    is set, in which case it is republished to the policy's retry (or dead-letter) queue and the original delivery
+    acknowledged, or setRejectFailed() is used, in which case it is rejected without requeue (and dead-lettered
+    by the broker if the queue has an x-dead-letter-exchange).
+
+    With a stage context (setStageContext()) workerMethod is also passed context=StageContext, whose publishes
+    are made on the consumer channel from the connection thread before the delivery is acknowledged.  If one of
+    them fails (or is not confirmed, with confirms) the delivery is requeued instead, or failed if it had already
+    been redelivered.  Not used in batch mode.
+
+    """
+
+    def __init__(self, consumer, mode="thread", numWorkers=1, startMethod=None):
+        self.__consumer = consumer
+        self.__mode = None
+        self.__numWorkers = 1
+        self.__startMethod = None
+        self.setExecutionMode(mode, numWorkers=numWorkers, startMethod=startMethod)
+        self.__connection = None
+        self.__channel = None
+        self.__retryPolicy = None
+        self.__rejectFailed = False
+        self.__executor = None
+        self.__pidQueues = {}
+        self.__killedPools = weakref.WeakSet()
+        self.__threadPool = None
+        self.__ownsThreadPool = True
+        self.__inFlight = {}
+        self.__closing = False
+        self.__batchSize = 1
+        self.__batchWaitMs = 0
+        self.__batch = []
+        self.__batchTimer = None
+        self.__priorityBufferSize = 0
+        self.__agingSeconds = 10.0
+        self.__priorityHeap = []
+        self.__arrivalSeq = itertools.count()
+        self.__timeout = None
+        self.__timeoutHeader = None
+        self.__timers = {}
+        self.__stageContext = False
+        self.__stageConfirm = False
+        self.__contexts = {}
+        self.__queueName = ""
+        self.__startTimes = {}
+        self.__tracing = False
+        self.__traces = {}
+        self.__profiler = None
+
+    def setExecutionMode(self, mode="thread", numWorkers=1, startMethod=None):
+        if mode not in ("thread", "process"):
+            raise ValueError("Unsupported execution mode %r" % mode)
+        self.__mode = mode
+        self.__numWorkers = max(1, int(numWorkers))
+        self.__startMethod = startMethod
+
+    def setBatch(self, batchSize, batchWaitMs=100):
+        """Enable batch mode - collect up to batchSize deliveries, waiting at most batchWaitMs milliseconds."""
+        self.__batchSize = max(1, int(batchSize))
+        self.__batchWaitMs = max(0, int(batchWaitMs))
+
+    def setPriorityBuffer(self, bufferSize=20, agingSeconds=10.0):
+        """Reorder up to bufferSize waiting deliveries by aged priority (non-batch mode only).
+
+        :param int bufferSize: number of prefetched deliveries held for reordering in addition to those being worked on
+        :param float agingSeconds: waiting time that raises the effective priority of a message by one level
+
+        """
+        self.__priorityBufferSize = max(0, int(bufferSize))
+        self.__agingSeconds = max(float(agingSeconds), 1.0e-3)
+
+    def setTimeout(self, timeout, timeoutHeader=None):
+        """Expire workers that run longer than timeout seconds after their delivery is dispatched.
+
+        :param float timeout: default deadline in seconds (None for no default)
+        :param str timeoutHeader: message header giving a per message deadline in seconds, which overrides the default
+
+        """
+        self.__timeout = timeout
+        self.__timeoutHeader = timeoutHeader
+
+    def setStageContext(self, enabled=True, confirm=False):
+        """Pass a StageContext to workerMethod for publishing to the next pipeline stage.
+
+        :param bool enabled: pass the context
+        :param bool confirm: put the channel in publisher confirm mode and publish mandatory, so that a downstream
+                             message is only counted as published once the broker has routed and confirmed it
+
+        """
+        self.__stageContext = enabled
+        self.__stageConfirm = confirm
+
+    def setTracing(self, enabled=True):
+        """Pass trace=TraceContext of the message to workerMethod (not used in batch mode)."""
+        self.__tracing = enabled
+        return True
+
+    def setProfiler(self, profiler):
+        """Run each workerMethod (or workerMethodBatch) call through profiler.run() - see MessageProfiler.
+
+        In process mode each pool process works with its own copy of the profiler.
+
+        """
+        self.__profiler = profiler
+        return True
+
+    def setRetryPolicy(self, retryPolicy):
+        """Route failed messages through retryPolicy (MessageRetryPolicy) instead of acknowledging them."""
+        self.__retryPolicy = retryPolicy
+
+    def setRejectFailed(self, enabled=True):
+        """Reject failed messages without requeue instead of acknowledging them (when no retry policy is set)."""
+        self.__rejectFailed = enabled
+
+    def getNumWorkers(self):
+        return self.__numWorkers
+
+    def getPrefetchCount(self):
+        """Number of unacknowledged deliveries needed to keep every worker supplied."""
+        if self.__batchSize == 1 and self.__priorityBufferSize:
+            return self.__numWorkers + self.__priorityBufferSize
+        return self.__numWorkers * self.__batchSize
+
+    def getInFlightCount(self):
+        return len(self.__inFlight)
+
+    def getWaitingCount(self):
+        """Number of deliveries held in the priority buffer."""
+        return len(self.__priorityHeap)
+
+    def requeuePending(self):
+        """Requeue deliveries held for a batch or in the priority buffer that have not been handed to a worker.  Returns their number."""
+        self.__cancelBatchTimer()
+        pending = self.__batch + [tup[2] for tup in self.__priorityHeap]
+        self.__batch = []
+        self.__priorityHeap = []
+        for basic_deliver, _properties, _body in pending:
+            self.__reject(basic_deliver.delivery_tag, requeue=True)
+        return len(pending)
+
+    def abandonInFlight(self):
+        """Requeue every delivery whose worker has not completed; their eventual results are ignored.  Returns their number.
+
+        Work not yet started by a worker is cancelled first, so that it does not run here as well as on the
+        consumer the broker redelivers it to.
+
+        """
+        deliveryTags = sorted(self.__inFlight)
+        for future in set(self.__inFlight.values()):
+            future.cancel()
+        self.__inFlight = {}
+        for context in self.__contexts.values():
+            context.closed = True
+        self.__contexts = {}
+        self.__startTimes = {}
+        self.__traces = {}
+        for deliveryTag in deliveryTags:
+            self.__reject(deliveryTag, requeue=True)
+        MessageMetrics.WORKER_IN_FLIGHT.set(0, self.__queueName)
+        return len(deliveryTags)
+
+    def start(self, connection, channel=None, executor=None, queueName=None):
+        """Bind to the connection whose thread receives completions and start any worker pool.
+
+        :param channel: consumer channel, used to republish failed messages under a retry policy
+        :param executor: in thread mode, an externally owned executor providing submit() and resize() to use
+                         instead of a private WorkerThreadPool (e.g. a ConsumerHost lane).  It is not shut down
+                         with the dispatcher.
+        :param str queueName: name of the consumed queue, used as the metrics label
+
+        """
+        self.__connection = connection
+        self.__channel = channel
+        self.__queueName = queueName or ""
+        self.__closing = False
+        if self.__stageContext and self.__stageConfirm and channel is not None:
+            channel.confirm_delivery()
+        if self.__mode == "process" and self.__executor is None:
+            self.__executor = self.__createProcessPool()
+        elif self.__mode == "thread" and self.__threadPool is None:
+            if executor is not None:
+                self.__threadPool = executor
+                self.__threadPool.resize(self.__numWorkers)
+                self.__ownsThreadPool = False
+            else:
+                self.__threadPool = WorkerThreadPool(self.__numWorkers, setupHook=self.__consumer.workerSetup, teardownHook=self.__consumer.workerTeardown)
+                self.__ownsThreadPool = True
+
+    def resize(self, numWorkers):
+        """Change the number of concurrent workers of a running dispatcher.
+
+        Worker threads are added or retired in place.  A process pool cannot be resized, so a new pool
+        is started for subsequent deliveries while the old one completes the work already submitted to it.
+
+        """
+        numWorkers = max(1, int(numWorkers))
+        if numWorkers == self.__numWorkers:
+            return
+        self.__numWorkers = numWorkers
+        if self.__threadPool is not None:
+            self.__threadPool.resize(numWorkers)
+        elif self.__executor is not None:
+            oldExecutor = self.__executor
+            self.__executor = self.__createProcessPool()
+            self.__shutdownProcessPool(oldExecutor, wait=False)
+        self.__startWaiting()
+
+    def shutdown(self, wait=True):
+        self.__closing = True
+        self.__cancelBatchTimer()
+        for timer in self.__timers.values():
+            self.__connection.remove_timeout(timer)
+        self.__timers = {}
+        if self.__executor is not None:
+            logger.info("Shutting down process pool")
+            self.__shutdownProcessPool(self.__executor, wait=wait)
+            self.__executor = None
+        if self.__threadPool is not None:
+            if self.__ownsThreadPool:
+                logger.info("Shutting down worker threads")
+                self.__threadPool.shutdown(wait=wait)
+            self.__threadPool = None
+
+    def dispatch(self, basic_deliver, properties, body):
+        """Start workerMethod for the delivery (or add it to the current batch) and return without waiting."""
+        if MessageMetrics.REGISTRY.enabled:
+            MessageMetrics.CONSUMED_MESSAGES.inc(1, self.__queueName)
+            MessageMetrics.CONSUMED_BYTES.inc(len(body), self.__queueName)
+        if self.__batchSize > 1:
+            self.__batch.append((basic_deliver, properties, body))
+            if len(self.__batch) >= self.__batchSize:
+                self.__flushBatch()
+            elif self.__batchTimer is None:
+                self.__batchTimer = self.__connection.call_later(self.__batchWaitMs / 1000.0, self.__onBatchTimer)
+            return
+        if self.__priorityBufferSize:
+            priority = properties.priority if properties is not None and properties.priority is not None else 0
+            sortKey = time.time() / self.__agingSeconds - priority
+            heapq.heappush(self.__priorityHeap, (sortKey, next(self.__arrivalSeq), (basic_deliver, properties, body)))
+            self.__startWaiting()
+            return
+        self.__submitOne(basic_deliver, properties, body)
+
+    def __startWaiting(self):
+        """Hand buffered deliveries to free workers, highest aged priority first."""
+        while self.__priorityHeap and len(self.__inFlight) < self.__numWorkers:
+            _sortKey, _seqNo, delivery = heapq.heappop(self.__priorityHeap)
+            self.__submitOne(*delivery)
+
+    def __submitOne(self, basic_deliver, properties, body):
+        deliveryTag = basic_deliver.delivery_tag
+        trace = self.__startTrace(basic_deliver, properties)
+        kwargs = {"trace": trace} if self.__tracing else {}
+        if self.__stageContext:
+            context = StageContext(deliveryTag, properties, publishFn=self.__queueStagePublish if self.__mode == "thread" else None, trace=trace)
+            self.__contexts[deliveryTag] = context
+            if self.__mode == "process":
+                self.__submit([(basic_deliver, properties, body)], False, _runProcessStageWorker, body, deliveryTag, context, **kwargs)
+            else:
+                self.__submit([(basic_deliver, properties, body)], False, self.__consumer.workerMethod, body, deliveryTag=deliveryTag, context=context, **kwargs)
+            return
+        if self.__mode == "process":
+            self.__submit([(basic_deliver, properties, body)], False, _runProcessWorker, body, basic_deliver.delivery_tag, **kwargs)
+        else:
+            self.__submit([(basic_deliver, properties, body)], False, self.__consumer.workerMethod, body, deliveryTag=basic_deliver.delivery_tag, **kwargs)
+
+    def __startTrace(self, basic_deliver, properties):
+        """Return the trace context of a delivery being handed to a worker and record its time in the queue."""
+        trace = TraceContext.fromProperties(properties)
+        self.__traces[basic_deliver.delivery_tag] = trace
+        queueWait = trace.getQueueWait()
+        if queueWait is not None:
+            MessageMetrics.QUEUE_WAIT_SECONDS.observe(queueWait, self.__queueName)
+            logger.info("Message %s (trace %s) waited %.3f seconds in queue", basic_deliver.delivery_tag, trace.traceId, queueWait)
+        return trace
+
+    def __onBatchTimer(self):
+        self.__batchTimer = None
+        self.__flushBatch()
+
+    def __cancelBatchTimer(self):
+        if self.__batchTimer is not None:
+            self.__connection.remove_timeout(self.__batchTimer)
+            self.__batchTimer = None
+
+    def __flushBatch(self):
+        self.__cancelBatchTimer()
+        if not self.__batch:
+            return
+        deliveries = self.__batch
+        msgBodies = [tup[2] for tup in deliveries]
+        deliveryTags = [tup[0].delivery_tag for tup in deliveries]
+        self.__batch = []
+        logger.info("Dispatching batch of %d messages", len(deliveryTags))
+        for basic_deliver, properties, _body in deliveries:
+            self.__startTrace(basic_deliver, properties)
+        if self.__mode == "process":
+            self.__submit(deliveries, True, _runProcessBatchWorker, msgBodies, deliveryTags)
+        else:
+            self.__submit(deliveries, True, self.__consumer.workerMethodBatch, msgBodies, deliveryTags)
+
+    def __submit(self, deliveries, isBatch, fn, *args, **kwargs):
+        executor = self.__executor if self.__mode == "process" else self.__threadPool
+        if self.__profiler is not None and self.__mode == "thread":
+            future = executor.submit(self.__profiler.run, fn, *args, **kwargs)
+        else:
+            future = executor.submit(fn, *args, **kwargs)
+        for tup in deliveries:
+            self.__inFlight[tup[0].delivery_tag] = future
+        self.__startTimes[future] = time.time()
+        if MessageMetrics.REGISTRY.enabled:
+            MessageMetrics.WORKER_IN_FLIGHT.set(len(self.__inFlight), self.__queueName)
+        timeout = self.__getTimeout(deliveries)
+        if timeout is not None:
+            self.__timers[future] = self.__connection.call_later(timeout, functools.partial(self.__onTimeout, deliveries, executor, future, timeout))
+        future.add_done_callback(functools.partial(self.__onFutureDone, deliveries, isBatch, executor))
+
+    def __getTimeout(self, deliveries):
+        """Return the deadline for a set of deliveries dispatched together - the longest of their individual deadlines."""
+        timeouts = []
+        for _basic_deliver, properties, _body in deliveries:
+            timeout = self.__timeout
+            if self.__timeoutHeader and properties is not None and properties.headers and self.__timeoutHeader in properties.headers:
+                try:
+                    timeout = float(properties.headers[self.__timeoutHeader])
+                except (TypeError, ValueError):
+                    logger.warning("Ignoring invalid %s header %r", self.__timeoutHeader, properties.headers[self.__timeoutHeader])
+            if timeout is None:
+                return None
+            timeouts.append(timeout)
+        return max(timeouts) if timeouts else None
+
+    def __onTimeout(self, deliveries, executor, future, timeout):
+        """Connection thread - a worker missed its deadline; free its slot and dispose of its deliveries."""
+        self.__timers.pop(future, None)
+        deliveryTags = [tup[0].delivery_tag for tup in deliveries]
+        if future.done() or deliveryTags[0] not in self.__inFlight:
+            return
+        logger.error("Worker for messages %r exceeded its deadline of %.1f seconds", deliveryTags, timeout)
+        for deliveryTag in deliveryTags:
+            self.__inFlight.pop(deliveryTag, None)
+            context = self.__contexts.pop(deliveryTag, None)
+            if context is not None:
+                context.closed = True
+            try:
+                self.__consumer.workerTimeout(deliveryTag)
+            except Exception:
+                logger.exception("Worker timeout hook failing for message %s", deliveryTag)
+        self.__recordWorkerDone(deliveries, future)
+        if self.__mode == "process":
+            if self.__executor is executor and not self.__closing:
+                self.__executor = self.__createProcessPool()
+            self.__killProcessPool(executor)
+        elif hasattr(executor, "replaceWorker"):
+            executor.replaceWorker(future)
+        ackTags = []
+        for delivery in deliveries:
+            if not delivery[0].redelivered:
+                self.__reject(delivery[0].delivery_tag, requeue=True)
+            elif self.__fail(delivery, "timed out after %.1f seconds" % timeout):
+                ackTags.append(delivery[0].delivery_tag)
+        self.__acknowledge(ackTags)
+        if not self.__closing:
+            self.__startWaiting()
+
+    def __onFutureDone(self, deliveries, isBatch, executor, future):
+        """Worker side - hand the finished work to the connection thread."""
+        try:
+            self.__connection.add_callback_threadsafe(functools.partial(self.__complete, deliveries, isBatch, executor, future))
+        except pika.exceptions.ConnectionWrongStateError:
+            logger.warning("Connection closed before messages %r completed", [tup[0].delivery_tag for tup in deliveries])
+
+    def __complete(self, deliveries, isBatch, executor, future):
+        """Connection thread - decide the acknowledgements from the worker outcome."""
+        timer = self.__timers.pop(future, None)
+        if timer is not None:
+            self.__connection.remove_timeout(timer)
+        deliveryTags = [tup[0].delivery_tag for tup in deliveries]
+        if deliveryTags[0] not in self.__inFlight:
+            logger.info("Ignoring completion of abandoned messages %r", deliveryTags)
+            return
+        for deliveryTag in deliveryTags:
+            self.__inFlight.pop(deliveryTag, None)
+        self.__recordWorkerDone(deliveries, future)
+        ackTags = []
+        exc = future.exception()
+        result = future.result() if exc is None else None
+        context = self.__contexts.pop(deliveryTags[0], None) if not isBatch else None
+        if context is not None:
+            if exc is None and self.__mode == "process":
+                result, buffered = result
+                for item in buffered:
+                    self.__publishStage(context, item)
+            context.closed = True
+            if exc is None and context.failed:
+                logger.error("Downstream publish failed for message %s", deliveryTags[0])
+                if not deliveries[0][0].redelivered:
+                    self.__reject(deliveryTags[0], requeue=True)
+                elif self.__fail(deliveries[0], "downstream publish failed"):
+                    self.__acknowledge(deliveryTags)
+                if not self.__closing:
+                    self.__startWaiting()
+                return
+        handled = False
+        if not isBatch and hasattr(self.__consumer, "workerCompleted") and not isinstance(exc, BrokenProcessPool):
+            try:
+                handled = self.__consumer.workerCompleted(deliveries[0][1], result, exc) is True
+            except Exception:
+                logger.exception("Completion hook failing for message %s", deliveryTags[0])
+        if exc is None:
+            failedTags = set(result) if isBatch and result is not None and not isinstance(result, bool) else set()
+            for delivery in deliveries:
+                deliveryTag = delivery[0].delivery_tag
+                if deliveryTag not in failedTags:
+                    ackTags.append(deliveryTag)
+                else:
+                    logger.error("Worker failed message %s in batch", deliveryTag)
+                    if self.__fail(delivery, "failed in batch"):
+                        ackTags.append(deliveryTag)
+            logger.info("Done task")
+        elif isinstance(exc, BrokenProcessPool) and executor in self.__killedPools:
+            # Lost when the watchdog killed the pool over another delivery - not a failure of these messages
+            logger.warning("Requeueing messages %r lost with a process pool killed by the watchdog", deliveryTags)
+            for deliveryTag in deliveryTags:
+                self.__reject(deliveryTag, requeue=True)
+        elif isinstance(exc, BrokenProcessPool):
+            # A pool process died (e.g. killed or out of memory) - rebuild the pool and give the messages one more try
+            logger.error("Worker process for messages %r terminated abruptly", deliveryTags)
+            if self.__executor is executor and not self.__closing:
+                self.__shutdownProcessPool(executor, wait=False)
+                self.__executor = self.__createProcessPool()
+            for delivery in deliveries:
+                if not delivery[0].redelivered:
+                    self.__reject(delivery[0].delivery_tag, requeue=True)
+                elif self.__fail(delivery, repr(exc)):
+                    ackTags.append(delivery[0].delivery_tag)
+        elif handled:
+            logger.info("Worker failure of message %s handled by the consumer", deliveryTags[0])
+            ackTags.extend(deliveryTags)
+        else:
+            logger.error("Worker failing with exception for messages %r", deliveryTags, exc_info=exc)
+            for delivery in deliveries:
+                if self.__fail(delivery, repr(exc)):
+                    ackTags.append(delivery[0].delivery_tag)
+        self.__acknowledge(ackTags)
+        if not self.__closing:
+            self.__startWaiting()
+
+    def __queueStagePublish(self, context, item):
+        """Worker thread - pass a downstream publish to the connection thread."""
+        try:
+            self.__connection.add_callback_threadsafe(functools.partial(self.__publishStage, context, item))
+        except pika.exceptions.ConnectionWrongStateError:
+            logger.warning("Connection closed before downstream publish for message %s", context.deliveryTag)
+            context.failed = True
+
+    def __publishStage(self, context, item):
+        """Connection thread - publish a downstream message on the consumer channel."""
+        if context.closed:
+            logger.warning("Dropping downstream publish for settled message %s", context.deliveryTag)
+            return
+        exchangeName, routingKey, body, properties = item
+        try:
+            self.__channel.basic_publish(exchange=exchangeName, routing_key=routingKey, body=body, properties=properties, mandatory=self.__stageConfirm)
+            context.numPublished += 1
+        except Exception:
+            logger.exception("Downstream publish failing for message %s", context.deliveryTag)
+            context.failed = True
+
+    def __fail(self, delivery, reason):
+        """Dispose of a failed delivery.  Returns True if it should now be acknowledged (discarded, or republished under the retry policy)."""
+        basic_deliver, properties, body = delivery
+        if self.__retryPolicy is not None and self.__channel is not None:
+            try:
+                self.__retryPolicy.retry(self.__channel, properties, body, reason=reason)
+                return True
+            except Exception:
+                logger.exception("Retry publish failing for message %s", basic_deliver.delivery_tag)
+                self.__reject(basic_deliver.delivery_tag, requeue=True)
+                return False
+        if self.__rejectFailed:
+            self.__reject(basic_deliver.delivery_tag, requeue=False)
+            return False
+        logger.error("Discarding failed message %s: %s", basic_deliver.delivery_tag, reason)
+        return True
+
+    def __recordWorkerDone(self, deliveries, future):
+        startTime = self.__startTimes.pop(future, None)
+        traces = [self.__traces.pop(tup[0].delivery_tag, None) for tup in deliveries]
+        if startTime is not None:
+            workerSeconds = time.time() - startTime
+            MessageMetrics.WORKER_SECONDS.observe(workerSeconds, self.__queueName)
+            for tup, trace in zip(deliveries, traces):
+                if trace is not None:
+                    logger.info("Message %s (trace %s) spent %.3f seconds in worker", tup[0].delivery_tag, trace.traceId, workerSeconds)
+        if MessageMetrics.REGISTRY.enabled:
+            MessageMetrics.WORKER_IN_FLIGHT.set(len(self.__inFlight), self.__queueName)
+
+    def __reject(self, deliveryTag, requeue):
+        self.__consumer.rejectMessage(deliveryTag, requeue=requeue)
+        MessageMetrics.NACKS.inc(1, self.__queueName, str(requeue).lower())
+
+    def __acknowledge(self, deliveryTags):
+        """Acknowledge the input delivery tags, with a single multiple-ack if no other outstanding delivery precedes them."""
+        if not deliveryTags:
+            return
+        MessageMetrics.ACKS.inc(len(deliveryTags), self.__queueName)
+        maxTag = max(deliveryTags)
+        if len(deliveryTags) > 1 and all(tag > maxTag for tag in self.__inFlight) and all(tup[0].delivery_tag > maxTag for tup in self.__batch) and not self.__priorityHeap:
+            self.__consumer.acknowledgeMessage(maxTag, multiple=True)
+        else:
+            for deliveryTag in deliveryTags:
+                self.__consumer.acknowledgeMessage(deliveryTag)
+
+    def __createProcessPool(self):
+        startMethod = self.__startMethod
+        if startMethod is None:
+            startMethod = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        logger.info("Starting process pool with %d workers (%s)", self.__numWorkers, startMethod)
+        context = multiprocessing.get_context(startMethod)
+        pidQueue = context.SimpleQueue()
+        executor = ProcessPoolExecutor(
+            max_workers=self.__numWorkers,
+            mp_context=context,
+            initializer=_initProcessWorker,
+            initargs=(self.__consumer, self.__profiler, pidQueue),
+        )
+        self.__pidQueues[executor] = pidQueue
+        return executor
+
+    def __shutdownProcessPool(self, executor, wait=True):
+        """Shut down executor, cancelling work not yet started (its deliveries are requeued or redelivered)."""
+        self.__pidQueues.pop(executor, None)
+        if sys.version_info >= (3, 9):  # noqa: UP036
+            executor.shutdown(wait=wait, cancel_futures=True)
+        else:
+            executor.shutdown(wait=wait)
+
+    def __killProcessPool(self, executor):
+        """Kill the worker processes of executor, which cannot tell which of them runs a given task.
+
+        The pids are those reported by _initProcessWorker().  A process still starting up is terminated by the
+        executor itself once it finds the pool broken.  The other work submitted to the pool then fails with
+        BrokenProcessPool, and __complete() requeues it.
+
+        """
+        self.__killedPools.add(executor)
+        pidQueue = self.__pidQueues.pop(executor, None)
+        while pidQueue is not None and not pidQueue.empty():
+            pid = pidQueue.get()
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except OSError:
+                logger.debug("Worker process %d already gone", pid)
+        executor.shutdown(wait=False)
@@ -0,0 +1,283 @@
+#
+# File: MessageMetrics.py
+# Date:  19-Oct-2026
+#
+# Updates:
+#  19-Oct-2026       queue wait time histogram
+##
+"""
+Metrics registry for the message queue package - counters, gauges and fixed-bucket histograms exposed
+in the Prometheus text format.
+
+Metrics are disabled by default and each update then returns at once.  Enable them in the process
+running the publisher or consumer and expose them with one of:
+
+    from wwpdb.utils.message_queue.MessageMetrics import REGISTRY
+    REGISTRY.setEnabled(True)
+    REGISTRY.startHttpServer(9464)                        # http://127.0.0.1:9464/metrics
+    REGISTRY.startFileWriter("/var/lib/node_exporter/mq.prom", interval=15.0)   # textfile collector
+
+The package records:
+
+    mq_connect_seconds              histogram  time to open a publisher connection
+    mq_publish_seconds              histogram  publish request latency (connect, declare and publish)
+    mq_published_messages_total     counter    messages published, by exchange
+    mq_published_bytes_total        counter    message bytes published, by exchange
+    mq_publish_failures_total       counter    failed publish requests, by exchange
+    mq_consumed_messages_total      counter    messages delivered to consumers, by queue
+    mq_consumed_bytes_total         counter    message bytes delivered to consumers, by queue
+    mq_queue_wait_seconds           histogram  time from publication to worker start, by queue
+    mq_worker_seconds               histogram  workerMethod execution time (from dispatch to completion), by queue
+    mq_worker_in_flight             gauge      deliveries being worked on, by queue
+    mq_acks_total                   counter    acknowledged deliveries, by queue
+    mq_nacks_total                  counter    rejected deliveries, by queue and requeue
+
+This software was developed as part of the World Wide Protein Data Bank
+Common Deposition and Annotation System Project
+
+"""
+
+__docformat__ = "restructuredtext en"
+__license__ = "Creative Commons Attribution 3.0 Unported"
+__version__ = "V0.07"
+
+import bisect
+import logging
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger()
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+WORKER_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 1800.0, 3600.0)
+
+
+def _formatLabels(labelNames, labelValues, extra=None):
+    pairs = list(zip(labelNames, labelValues))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{%s}" % ",".join('%s="%s"' % (name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")) for name, value in pairs)
+
+
+def _formatValue(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """Base of the metric types - values are kept per tuple of label values."""
+
+    metricType = "untyped"
+
+    def __init__(self, registry, name, helpText, labelNames=()):
+        self._registry = registry
+        self.name = name
+        self.helpText = helpText
+        self.labelNames = tuple(labelNames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def render(self):
+        lines = ["# HELP %s %s" % (self.name, self.helpText), "# TYPE %s %s" % (self.name, self.metricType)]
+        with self._lock:
+            for labelValues, value in sorted(self._values.items()):
+                lines.append("%s%s %s" % (self.name, _formatLabels(self.labelNames, labelValues), _formatValue(value)))
+        return lines
+
+    def getValue(self, *labelValues):
+        with self._lock:
+            return self._values.get(tuple(labelValues), 0)
+
+
+class Counter(Metric):
+    metricType = "counter"
+
+    def inc(self, amount=1, *labelValues):
+        if not self._registry.enabled:
+            return
+        with self._lock:
+            self._values[labelValues] = self._values.get(labelValues, 0) + amount
+
+
+class Gauge(Metric):
+    metricType = "gauge"
+
+    def set(self, value, *labelValues):
+        if not self._registry.enabled:
+            return
+        with self._lock:
+            self._values[labelValues] = value
+
+    def inc(self, amount=1, *labelValues):
+        if not self._registry.enabled:
+            return
+        with self._lock:
+            self._values[labelValues] = self._values.get(labelValues, 0) + amount
+
+    def dec(self, amount=1, *labelValues):
+        self.inc(-amount, *labelValues)
+
+
+class Histogram(Metric):
+    """Fixed-bucket histogram - per label values, the count in each bucket, the sum and the count of observations."""
+
+    metricType = "histogram"
+
+    def __init__(self, registry, name, helpText, labelNames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(registry, name, helpText, labelNames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, *labelValues):
+        if not self._registry.enabled:
+            return
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labelValues)
+            if entry is None:
+                entry = self._values[labelValues] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][idx] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def getValue(self, *labelValues):
+        """Return (count, sum) of the observations."""
+        with self._lock:
+            entry = self._values.get(tuple(labelValues))
+            return (entry[2], entry[1]) if entry else (0, 0.0)
+
+    def render(self):
+        lines = ["# HELP %s %s" % (self.name, self.helpText), "# TYPE %s %s" % (self.name, self.metricType)]
+        with self._lock:
+            for labelValues, (counts, total, count) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, bucketCount in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += bucketCount
+                    lines.append("%s_bucket%s %d" % (self.name, _formatLabels(self.labelNames, labelValues, ("le", _formatValue(float(bound)))), cumulative))
+                lines.append("%s_sum%s %s" % (self.name, _formatLabels(self.labelNames, labelValues), repr(total)))
+                lines.append("%s_count%s %d" % (self.name, _formatLabels(self.labelNames, labelValues), count))
+        return lines
+
+
+class MetricsRegistry:
+    """Collection of metrics rendered together in the Prometheus text format -
+
+    :param bool enabled: record updates (when False every update is a no-op)
+
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.__metrics = {}
+        self.__lock = threading.Lock()
+        self.__httpServer = None
+        self.__writerStop = None
+
+    def setEnabled(self, enabled=True):
+        self.enabled = enabled
+        return True
+
+    def counter(self, name, helpText, labelNames=()):
+        return self.__register(Counter(self, name, helpText, labelNames))
+
+    def gauge(self, name, helpText, labelNames=()):
+        return self.__register(Gauge(self, name, helpText, labelNames))
+
+    def histogram(self, name, helpText, labelNames=(), buckets=LATENCY_BUCKETS):
+        return self.__register(Histogram(self, name, helpText, labelNames, buckets=buckets))
+
+    def __register(self, metric):
+        with self.__lock:
+            if metric.name in self.__metrics:
+                raise ValueError("Metric %s already registered" % metric.name)
+            self.__metrics[metric.name] = metric
+        return metric
+
+    def getMetric(self, name):
+        return self.__metrics.get(name)
+
+    def render(self):
+        """Return all metrics in the Prometheus text exposition format."""
+        with self.__lock:
+            metrics = list(self.__metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def writeTextFile(self, filePath):
+        """Write the metrics to filePath, replacing it atomically (for the node_exporter textfile collector)."""
+        tmpPath = filePath + ".tmp"
+        try:
+            with open(tmpPath, "w") as ofh:
+                ofh.write(self.render())
+            os.replace(tmpPath, filePath)
+        except OSError:
+            logger.exception("Writing metrics file %s failing", filePath)
+            return False
+        return True
+
+    def startFileWriter(self, filePath, interval=15.0):
+        """Rewrite filePath every interval seconds from a daemon thread until stop() is called."""
+        self.__writerStop = threading.Event()
+
+        def writeLoop(stopEvent):
+            while not stopEvent.wait(interval):
+                self.writeTextFile(filePath)
+            self.writeTextFile(filePath)
+
+        threading.Thread(target=writeLoop, args=(self.__writerStop,), name="MetricsFileWriter", daemon=True).start()
+        return True
+
+    def startHttpServer(self, port, address="127.0.0.1"):
+        """Serve the metrics at http://address:port/metrics from a daemon thread until stop() is called.  Returns the bound port."""
+        registry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):  # noqa: N802 pylint: disable=invalid-name
+                if self.path.split("?")[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = registry.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):  # noqa: A002 pylint: disable=redefined-builtin
+                logger.debug("Metrics request: " + format, *args)
+
+        self.__httpServer = ThreadingHTTPServer((address, port), MetricsHandler)
+        threading.Thread(target=self.__httpServer.serve_forever, name="MetricsHttpServer", daemon=True).start()
+        logger.info("Serving metrics at http://%s:%d/metrics", address, self.__httpServer.server_address[1])
+        return self.__httpServer.server_address[1]
+
+    def stop(self):
+        """Stop the HTTP server and file writer."""
+        if self.__httpServer is not None:
+            self.__httpServer.shutdown()
+            self.__httpServer.server_close()
+            self.__httpServer = None
+        if self.__writerStop is not None:
+            self.__writerStop.set()
+            self.__writerStop = None
+
+
+REGISTRY = MetricsRegistry()
+
+CONNECT_SECONDS = REGISTRY.histogram("mq_connect_seconds", "Time to open a publisher connection in seconds")
+PUBLISH_SECONDS = REGISTRY.histogram("mq_publish_seconds", "Publish request latency in seconds", ("exchange",))
+PUBLISHED_MESSAGES = REGISTRY.counter("mq_published_messages_total", "Messages published", ("exchange",))
+PUBLISHED_BYTES = REGISTRY.counter("mq_published_bytes_total", "Message bytes published", ("exchange",))
+PUBLISH_FAILURES = REGISTRY.counter("mq_publish_failures_total", "Failed publish requests", ("exchange",))
+CONSUMED_MESSAGES = REGISTRY.counter("mq_consumed_messages_total", "Messages delivered to consumers", ("queue",))
+CONSUMED_BYTES = REGISTRY.counter("mq_consumed_bytes_total", "Message bytes delivered to consumers", ("queue",))
+QUEUE_WAIT_SECONDS = REGISTRY.histogram("mq_queue_wait_seconds", "Time from publication to worker start in seconds", ("queue",), buckets=WORKER_BUCKETS)
+WORKER_SECONDS = REGISTRY.histogram("mq_worker_seconds", "workerMethod execution time in seconds", ("queue",), buckets=WORKER_BUCKETS)
+WORKER_IN_FLIGHT = REGISTRY.gauge("mq_worker_in_flight", "Deliveries being worked on", ("queue",))
+ACKS = REGISTRY.counter("mq_acks_total", "Acknowledged deliveries", ("queue",))
+NACKS = REGISTRY.counter("mq_nacks_total", "Rejected deliveries", ("queue", "requeue"))
@@ -0,0 +1,183 @@
+#
+# File: MessageProfiler.py
+# Date:  19-Oct-2026
+#
+# Updates:
+#  19-Oct-2026       update samples under the lock, never fail a worker call over profiler output
+#  19-Oct-2026       setPrefix()
+##
+"""
+Sampling profiler for workerMethod calls (see MessageConsumerBase.setProfiling()).
+
+Two opt-in modes keep the cost bounded in production:
+
+  - every Nth call is run under cProfile and its statistics written to a .prof file (read with pstats
+    or snakeviz).  At most one call per process is profiled at a time; calls arriving while one is being
+    profiled are not profiled.
+  - calls still running after slowSeconds have their stack sampled every sampleInterval seconds by a
+    single daemon thread per process, and the samples of each slow call are written as collapsed stacks
+    ("frame;frame;frame count" lines, for flamegraph.pl or speedscope) to a .collapsed file.  A call is
+    sampled at most maxSamples times.
+
+Files are named <prefix>_<pid>_<time>_<serial>.prof|.collapsed in outputDir (for detached consumers the
+ws-logs directory), and only the newest maxFiles of each kind are kept.  Errors writing the profiles are
+logged and never affect the result of the profiled call.
+
+This software was developed as part of the World Wide Protein Data Bank
+Common Deposition and Annotation System Project
+
+"""
+
+__docformat__ = "restructuredtext en"
+__license__ = "Creative Commons Attribution 3.0 Unported"
+__version__ = "V0.07"
+
+import cProfile
+import glob
+import itertools
+import logging
+import os
+import sys
+import threading
+import time
+
+logger = logging.getLogger()
+
+
+class MessageProfiler:
+    """Profile a sample of workerMethod calls -
+
+    :param str outputDir: directory for the profile files
+    :param int everyN: run every Nth call under cProfile (0 disables)
+    :param float slowSeconds: sample the stacks of calls running longer than this (None disables)
+    :param float sampleInterval: seconds between stack samples of a slow call
+    :param int maxSamples: maximum stack samples taken of one call
+    :param int maxFiles: number of files of each kind kept in outputDir
+    :param str prefix: file name prefix
+
+    """
+
+    def __init__(self, outputDir, everyN=0, slowSeconds=None, sampleInterval=0.05, maxSamples=2000, maxFiles=20, prefix="worker"):
+        self.__outputDir = outputDir
+        self.__everyN = int(everyN or 0)
+        self.__slowSeconds = slowSeconds
+        self.__sampleInterval = sampleInterval
+        self.__maxSamples = maxSamples
+        self.__maxFiles = maxFiles
+        self.__prefix = prefix
+        self.__initState()
+
+    def __initState(self):
+        self.__lock = threading.Lock()
+        self.__profileLock = threading.Lock()
+        self.__numCalls = 0
+        self.__serialNo = itertools.count(1)
+        self.__running = {}
+        self.__sampler = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for ky in ("_MessageProfiler__lock", "_MessageProfiler__profileLock", "_MessageProfiler__serialNo", "_MessageProfiler__running", "_MessageProfiler__sampler"):
+            del state[ky]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__initState()
+
+    def run(self, fn, *args, **kwargs):
+        """Call fn(*args, **kwargs), profiling or sampling it as configured, and return its result."""
+        with self.__lock:
+            self.__numCalls += 1
+            profileCall = self.__everyN > 0 and self.__numCalls % self.__everyN == 0
+        if self.__slowSeconds is not None:
+            self.__startSampler()
+        profiler = None
+        if profileCall and self.__profileLock.acquire(blocking=False):
+            profiler = cProfile.Profile()
+        threadId = threading.get_ident()
+        entry = [time.time(), {}, 0]
+        with self.__lock:
+            self.__running[threadId] = entry
+        try:
+            if profiler is None:
+                return fn(*args, **kwargs)
+            try:
+                return profiler.runcall(fn, *args, **kwargs)
+            finally:
+                self.__profileLock.release()
+                self.__write(".prof", profiler.dump_stats)
+        finally:
+            with self.__lock:
+                del self.__running[threadId]
+                samples, numSamples = dict(entry[1]), entry[2]
+            if numSamples:
+                self.__write(".collapsed", lambda filePath: self.__writeCollapsed(filePath, samples))
+                logger.info("Sampled %d stacks of worker call running %.3f seconds", numSamples, time.time() - entry[0])
+
+    def setPrefix(self, prefix):
+        """Set the file name prefix of the profiles written from now on."""
+        self.__prefix = prefix
+        return True
+
+    def getNumCalls(self):
+        return self.__numCalls
+
+    def __startSampler(self):
+        with self.__lock:
+            if self.__sampler is not None:
+                return
+            self.__sampler = threading.Thread(target=self.__sampleLoop, name="MessageProfilerSampler", daemon=True)
+        self.__sampler.start()
+
+    def __sampleLoop(self):
+        while True:
+            time.sleep(self.__sampleInterval)
+            now = time.time()
+            with self.__lock:
+                slow = [(threadId, entry) for threadId, entry in self.__running.items() if now - entry[0] >= self.__slowSeconds and entry[2] < self.__maxSamples]
+            if not slow:
+                continue
+            frames = sys._current_frames()  # noqa: SLF001 pylint: disable=protected-access
+            keys = []
+            for threadId, entry in slow:
+                frame = frames.get(threadId)
+                if frame is None:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append("%s (%s:%d)" % (frame.f_code.co_name, os.path.basename(frame.f_code.co_filename), frame.f_code.co_firstlineno))
+                    frame = frame.f_back
+                keys.append((threadId, entry, ";".join(reversed(stack))))
+            with self.__lock:
+                for threadId, entry, key in keys:
+                    # The call may have finished (and its samples been written) while its stack was walked
+                    if self.__running.get(threadId) is not entry:
+                        continue
+                    entry[1][key] = entry[1].get(key, 0) + 1
+                    entry[2] += 1
+
+    @staticmethod
+    def __writeCollapsed(filePath, samples):
+        with open(filePath, "w") as ofh:
+            ofh.writelines("%s %d\n" % (stack, count) for stack, count in sorted(samples.items()))
+
+    def __write(self, suffix, writeFn):
+        """Write a profile file with writeFn(filePath) and remove the oldest files of its kind beyond maxFiles."""
+        filePath = None
+        try:
+            fileName = "%s_%d_%s_%06d%s" % (self.__prefix, os.getpid(), time.strftime("%Y%m%d-%H%M%S"), next(self.__serialNo), suffix)
+            filePath = os.path.join(self.__outputDir, fileName)
+            os.makedirs(self.__outputDir, exist_ok=True)
+            writeFn(filePath)
+            logger.info("Wrote worker profile %s", filePath)
+            filePaths = sorted(glob.glob(os.path.join(self.__outputDir, "%s_*%s" % (self.__prefix, suffix))), key=os.path.getmtime)
+            for oldPath in filePaths[: max(0, len(filePaths) - self.__maxFiles)]:
+                try:
+                    os.remove(oldPath)
+                except FileNotFoundError:
+                    # Removed by another worker process sharing the directory
+                    pass
+        except Exception:
+            # Profiling is diagnostic only - a failure to write it must not fail the worker call
+            logger.exception("Writing worker profile %s failing", filePath)
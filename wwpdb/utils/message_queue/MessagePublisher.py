@@ -4,6 +4,10 @@
 #
 # Updates:
 #  18-Feb-2017  jdw  use default connection parameters
+#  19-Oct-2026       connect through a pluggable transport (default PikaTransport)
+#  19-Oct-2026       publishDirect() with a topic routing key or headers
+#  19-Oct-2026       record connect and publish metrics (see MessageMetrics.py)
+#  19-Oct-2026       stamp the publish time and trace context into message properties
 ##
 """
 Simple wrapper providing message publishing methods.
@@ -32,35 +36,69 @@ import time
 
 import pika
 
+from wwpdb.utils.message_queue import MessageMetrics
 from wwpdb.utils.message_queue.MessageQueueConnection import MessageQueueConnection
+from wwpdb.utils.message_queue.MessageTransport import PikaTransport
+from wwpdb.utils.message_queue.TraceContext import stampHeaders
 
 logger = logging.getLogger()
 
 
 class MessagePublisher:
-    def __init__(self, local=False):
+    def __init__(self, local=False, transport=None):
+        """Message publisher -
+
+        :param bool local: publish to a broker on localhost
+        :param transport: transport providing connections (default PikaTransport, see MessageTransport.py)
+
+        """
         self.__local = local
+        self.__transport = transport if transport is not None else PikaTransport()
         self.__subscriber_exchange_type = "direct"
         self.__subscriber_routing_key = "subscriber_routing_key"
 
-    def publish(self, message, exchangeName, queueName, routingKey, priority=None):
+    def __connect(self):
+        startTime = time.time()
+        if self.__local:
+            connection = self.__transport.connect(local=True)
+        else:
+            mqc = MessageQueueConnection()
+            parameters = mqc._getDefaultConnectionParameters()  # noqa: SLF001 pylint: disable=protected-access
+            connection = self.__transport.connect(parameters=parameters)
+        MessageMetrics.CONNECT_SECONDS.observe(time.time() - startTime)
+        return connection
+
+    @staticmethod
+    def __recordPublish(message, exchangeName, ok, elapsed):
+        if not MessageMetrics.REGISTRY.enabled:
+            return
+        if ok:
+            MessageMetrics.PUBLISH_SECONDS.observe(elapsed, exchangeName)
+            MessageMetrics.PUBLISHED_MESSAGES.inc(1, exchangeName)
+            MessageMetrics.PUBLISHED_BYTES.inc(len(message.encode("utf-8") if isinstance(message, str) else message), exchangeName)
+        else:
+            MessageMetrics.PUBLISH_FAILURES.inc(1, exchangeName)
+
+    def publish(self, message, exchangeName, queueName, routingKey, priority=None, trace=None):
+        """Publish to a work queue -
+
+        :param int priority: None or an integer between 1 and 10
+        :param trace: TraceContext of the message being worked on when publishing from a worker, so this message
+                      continues its trace (default a new trace, see TraceContext.py)
+
+        """
         # priority is either None or an integer between 1 and 10
         if priority and not re.match(r"^\d+$", str(priority)):
             priority = 1
-        return self.__publishMessage(message=message, exchangeName=exchangeName, queueName=queueName, routingKey=routingKey, priority=priority)
+        return self.__publishMessage(message=message, exchangeName=exchangeName, queueName=queueName, routingKey=routingKey, priority=priority, trace=trace)
 
-    def __publishMessage(self, message, exchangeName, queueName, routingKey, durableFlag=True, deliveryMode=2, priority=None):
+    def __publishMessage(self, message, exchangeName, queueName, routingKey, durableFlag=True, deliveryMode=2, priority=None, trace=None):
         """publish the input message -"""
         startTime = time.time()
         logger.debug("Starting to publish message ")
         ok = False
         try:
-            if self.__local:
-                connection = pika.BlockingConnection(pika.ConnectionParameters("localhost"))
-            else:
-                mqc = MessageQueueConnection()
-                parameters = mqc._getDefaultConnectionParameters()  # noqa: SLF001 pylint: disable=protected-access
-                connection = pika.BlockingConnection(parameters)
+            connection = self.__connect()
 
             channel = connection.channel()
             channel.exchange_declare(exchange=exchangeName, exchange_type="topic", durable=True, auto_delete=False)
@@ -83,12 +121,13 @@ class MessagePublisher:
 
             channel.queue_bind(exchange=exchangeName, queue=result.method.queue, routing_key=routingKey)
 
+            headers, timestamp = stampHeaders(parent=trace)
             if priority:
                 channel.basic_publish(
                     exchange=exchangeName,
                     routing_key=routingKey,
                     body=message,
-                    properties=pika.BasicProperties(delivery_mode=deliveryMode, priority=priority),  # set message persistence
+                    properties=pika.BasicProperties(delivery_mode=deliveryMode, priority=priority, timestamp=timestamp, headers=headers),  # set message persistence
                 )
             else:
                 channel.basic_publish(
@@ -97,6 +136,8 @@ class MessagePublisher:
                     body=message,
                     properties=pika.BasicProperties(
                         delivery_mode=deliveryMode,  # set message persistence
+                        timestamp=timestamp,
+                        headers=headers,
                     ),
                 )
             ok = True
@@ -106,35 +147,49 @@ class MessagePublisher:
 
         endTime = time.time()
         logger.debug("Completed publish request in (%f seconds) status %r", endTime - startTime, ok)
+        self.__recordPublish(message, exchangeName, ok, endTime - startTime)
         return ok
 
     # direct exchange pattern having extensive reliance on exchanges, with no queue declare or queue bind from publisher
 
-    def publishDirect(self, message, exchangeName):
-        return self.__publishDirect(message=message, exchangeName=exchangeName)
+    def publishDirect(self, message, exchangeName, routingKey=None, headers=None, trace=None):
+        """Publish to subscribers of exchangeName (see MessageSubscriberBase) -
+
+        :param str routingKey: routing key matched against the topic patterns of subscribers (topic exchange)
+        :param dict headers: message headers matched against the header filters of subscribers (headers exchange)
+        :param trace: TraceContext of the message being worked on, continued by this message (default a new trace)
 
-    def __publishDirect(self, message, exchangeName, durableFlag=True, deliveryMode=2):  # noqa: ARG002 pylint: disable=unused-argument
+        Without routingKey or headers the message goes to all subscribers bound without filters (direct exchange).
+
+        """
+        return self.__publishDirect(message=message, exchangeName=exchangeName, routingKey=routingKey, headers=headers, trace=trace)
+
+    def __publishDirect(self, message, exchangeName, routingKey=None, headers=None, durableFlag=True, deliveryMode=2, trace=None):  # noqa: ARG002 pylint: disable=unused-argument
         """publish the input message -"""
         startTime = time.time()
         logger.debug("Starting to publish message ")
         ok = False
         try:
-            if self.__local:
-                connection = pika.BlockingConnection(pika.ConnectionParameters("localhost"))
-            else:
-                mqc = MessageQueueConnection()
-                parameters = mqc._getDefaultConnectionParameters()  # noqa: SLF001 pylint: disable=protected-access
-                connection = pika.BlockingConnection(parameters)
+            connection = self.__connect()
 
             channel = connection.channel()
-            channel.exchange_declare(exchange=exchangeName, exchange_type=self.__subscriber_exchange_type, durable=True, auto_delete=False)
+            if headers:
+                exchangeType, routingKey = "headers", ""
+            elif routingKey:
+                exchangeType = "topic"
+            else:
+                exchangeType, routingKey = self.__subscriber_exchange_type, self.__subscriber_routing_key
+            channel.exchange_declare(exchange=exchangeName, exchange_type=exchangeType, durable=True, auto_delete=False)
 
+            headers, timestamp = stampHeaders(headers, parent=trace)
             channel.basic_publish(
                 exchange=exchangeName,
-                routing_key=self.__subscriber_routing_key,
+                routing_key=routingKey,
                 body=message,
                 properties=pika.BasicProperties(
                     delivery_mode=deliveryMode,  # set message persistence
+                    timestamp=timestamp,
+                    headers=headers,
                 ),
             )
             ok = True
@@ -144,4 +199,5 @@ class MessagePublisher:
 
         endTime = time.time()
         logger.debug("Completed publish request in (%f seconds) status %r", endTime - startTime, ok)
+        self.__recordPublish(message, exchangeName, ok, endTime - startTime)
         return ok
@@ -0,0 +1,118 @@
+#
+# File: MessageRetryPolicy.py
+# Date:  19-Oct-2026
+#
+# Updates:
+##
+"""
+Failure policy for consumers - tiered retry queues with TTL back off and a dead-letter queue.
+
+For a work queue "Q" and retry delays (10, 60, 600) seconds the following durable queues are declared:
+
+    Q.retry.10000    x-message-ttl=10000   dead-letters back to Q
+    Q.retry.60000    x-message-ttl=60000   dead-letters back to Q
+    Q.retry.600000   x-message-ttl=600000  dead-letters back to Q
+    Q.dead           messages that failed every attempt
+
+A failed message is republished (with its original properties) to the retry queue for its attempt,
+and the delivery acknowledged.  When the TTL expires the broker returns the message to Q.  The number of
+previous attempts is carried in the x-retry-count header.  Once maxAttempts is reached the message
+is parked in the dead-letter queue, so poison messages stop consuming worker time.
+
+This software was developed as part of the World Wide Protein Data Bank
+Common Deposition and Annotation System Project
+
+"""
+
+__docformat__ = "restructuredtext en"
+__license__ = "Creative Commons Attribution 3.0 Unported"
+__version__ = "V0.07"
+
+import logging
+
+import pika
+
+logger = logging.getLogger()
+
+
+class MessageRetryPolicy:
+    """Route failed messages to tiered retry queues and finally to a dead-letter queue -
+
+    :param retryDelays: sequence of retry delays in seconds, one per retry tier
+    :param int maxAttempts: total number of attempts before dead-lettering (default len(retryDelays) + 1);
+                            attempts beyond the last tier reuse the longest delay
+    :param str deadLetterQueue: name of the dead-letter queue (default "<queue>.dead")
+
+    """
+
+    COUNT_HEADER = "x-retry-count"
+    ERROR_HEADER = "x-last-error"
+
+    def __init__(self, retryDelays=(10, 60, 600), maxAttempts=None, deadLetterQueue=None):
+        self.__retryDelaysMs = [int(float(delay) * 1000) for delay in retryDelays]
+        self.__maxAttempts = maxAttempts if maxAttempts is not None else len(self.__retryDelaysMs) + 1
+        self.__deadLetterQueue = deadLetterQueue
+        self.__queueName = None
+
+    def getRetryQueueName(self, delayMs):
+        return "%s.retry.%d" % (self.__queueName, delayMs)
+
+    def getDeadLetterQueueName(self):
+        return self.__deadLetterQueue or "%s.dead" % self.__queueName
+
+    def declare(self, channel, queueName):
+        """Declare the retry and dead-letter queues for the work queue queueName."""
+        self.__queueName = queueName
+        for delayMs in self.__retryDelaysMs:
+            channel.queue_declare(
+                queue=self.getRetryQueueName(delayMs),
+                durable=True,
+                arguments={"x-message-ttl": delayMs, "x-dead-letter-exchange": "", "x-dead-letter-routing-key": queueName},
+            )
+        channel.queue_declare(queue=self.getDeadLetterQueueName(), durable=True)
+
+    @classmethod
+    def getAttemptCount(cls, properties):
+        """Return the number of failed attempts already recorded for the message."""
+        headers = properties.headers if properties is not None and properties.headers else {}
+        try:
+            return int(headers.get(cls.COUNT_HEADER, 0))
+        except (TypeError, ValueError):
+            return 0
+
+    def retry(self, channel, properties, body, reason=None):
+        """Republish a failed message to its next retry queue, or the dead-letter queue when attempts are exhausted.
+
+        The caller acknowledges the original delivery once this returns.
+
+        :returns: name of the queue the message was published to
+
+        """
+        attempt = self.getAttemptCount(properties) + 1
+        if attempt >= self.__maxAttempts or not self.__retryDelaysMs:
+            targetQueue = self.getDeadLetterQueueName()
+            logger.warning("Message failed %d attempts - moving to %s", attempt, targetQueue)
+        else:
+            delayMs = self.__retryDelaysMs[min(attempt, len(self.__retryDelaysMs)) - 1]
+            targetQueue = self.getRetryQueueName(delayMs)
+            logger.info("Message failed attempt %d - retrying in %.1f seconds", attempt, delayMs / 1000.0)
+
+        headers = dict(properties.headers) if properties is not None and properties.headers else {}
+        headers[self.COUNT_HEADER] = attempt
+        if reason is not None:
+            headers[self.ERROR_HEADER] = str(reason)[:1024]
+        newProperties = pika.BasicProperties(
+            content_type=properties.content_type if properties else None,
+            content_encoding=properties.content_encoding if properties else None,
+            headers=headers,
+            delivery_mode=properties.delivery_mode if properties and properties.delivery_mode else 2,
+            priority=properties.priority if properties else None,
+            correlation_id=properties.correlation_id if properties else None,
+            reply_to=properties.reply_to if properties else None,
+            message_id=properties.message_id if properties else None,
+            timestamp=properties.timestamp if properties else None,
+            type=properties.type if properties else None,
+            app_id=properties.app_id if properties else None,
+        )
+        channel.basic_publish(exchange="", routing_key=targetQueue, body=body, properties=newProperties)
+        return targetQueue
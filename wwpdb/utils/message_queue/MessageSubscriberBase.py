@@ -3,6 +3,13 @@
 # Date:  21-Mar-2023   J. Smith
 #
 # Updates:
+#  19-Oct-2026       optional named subscription group sharing one durable queue
+#  19-Oct-2026       topic and header filters in add_exchange()
+#  19-Oct-2026       bounded backlog of messages published while a subscriber group is away
+#  19-Oct-2026       pass the queue name to the dispatcher for metrics labels
+#  19-Oct-2026       setTracing() passing the trace context of each message to workerMethod
+#  19-Oct-2026       setProfiling() sampling profiler around workerMethod
+#  19-Oct-2026       raise ValueError when a group queue exists with other backlog bounds
 ##
 """
 Async message consumer  -
@@ -19,10 +26,13 @@ __license__ = "Creative Commons Attribution 3.0 Unported"
 __version__ = "V0.07"
 
 import logging
-import threading
 
 import pika
 
+from wwpdb.utils.message_queue.MessageDispatcher import MessageDispatcher
+from wwpdb.utils.message_queue.MessageProfiler import MessageProfiler
+from wwpdb.utils.message_queue.MessageTransport import PikaTransport
+
 try:
     import exceptions  # type: ignore[import-not-found]
 except ImportError:
@@ -39,61 +49,153 @@ the publisher and subscriber must use unique names for the exchanges that are no
 the routing keys of each exchange published to by the producer must match the routing keys used by the consumer
 hence, a default key has been set so that the producer and consumer must only coordinate their exchange names
 the publishDirect method has been implemented in the MessagePublisher class for the purpose of publishing to a subscriber
+alternatively, subscribers created with the same group name share one durable queue named after the group
+messages are then load balanced across the members of the group, and messages published while no member is running are kept
+add_exchange may instead bind with topic routing key patterns or header filters, so that the broker only delivers the messages
+the subscriber needs - such exchanges are topic or headers exchanges, and the publisher must use publishDirect with a
+routing key or headers accordingly
+a group may also be given a backlog bound (backlogLength messages and/or backlogMinutes) - its queue then retains at most
+the latest backlogLength messages, each for at most backlogMinutes, while no member is running, and a (re)joining member
+first works through this backlog before receiving new messages, instead of the group queue growing without limit
+this is retention by an already existing group queue, not replay - there is no offset to restart from, and messages
+published before the group queue was first declared, or before a private subscriber connected, are never delivered to it
 """
 
 
 class MessageSubscriberBase:
-    def __init__(self, amqpUrl, local=False):
+    def __init__(self, amqpUrl, local=False, transport=None, group=None, prefetchCount=1, backlogLength=None, backlogMinutes=None):
+        """Subscriber -
+
+        :param str amqpUrl: AMQP url of the broker
+        :param bool local: connect to a broker on localhost
+        :param transport: transport providing connections (default PikaTransport, see MessageTransport.py)
+        :param str group: name of a subscription group - members share a durable queue of this name
+                          (default None, a private exclusive queue deleted when the subscriber disconnects)
+        :param int prefetchCount: number of unacknowledged messages delivered to this subscriber at a time
+        :param int backlogLength: retain at most this many of the latest undelivered messages for the group (requires group)
+        :param float backlogMinutes: discard messages not delivered to the group within this many minutes (requires group)
+
+        The backlog bounds are queue arguments (x-max-length, x-message-ttl) - a group must always be created with the
+        same bounds, a subscriber giving other bounds than the existing group queue raises ValueError.  They limit what
+        the group queue retains while no member is running; they do not provide replay.  Messages dropped or expired
+        from the backlog are lost, a new group only receives messages published after its queue is first declared,
+        and a private subscriber (no group) never sees messages published before it connected.
+
+        """
+        if (backlogLength or backlogMinutes) and not group:
+            raise ValueError("a backlog bound requires a subscription group")
         self._url = amqpUrl
         self._closing = False
         self._consumerTag = None
         self.local = local
+        self.__transport = transport if transport is not None else PikaTransport()
 
         self.__exchange_type = "direct"
         self.__routing_key = "subscriber_routing_key"
         self.__exchanges = []
+        self.__group = group
+        self.__prefetchCount = prefetchCount
+        self.__dispatcher = MessageDispatcher(self)
 
         self._connection = self.connect()
         self._channel = self._connection.channel()
         try:
-            result = self._channel.queue_declare(queue="", exclusive=True, durable=True)
+            if self.__group:
+                arguments = {}
+                if backlogLength:
+                    arguments["x-max-length"] = int(backlogLength)
+                if backlogMinutes:
+                    arguments["x-message-ttl"] = int(backlogMinutes * 60000)
+                result = self._channel.queue_declare(queue=self.__group, durable=True, arguments=arguments or None)
+            else:
+                result = self._channel.queue_declare(queue="", exclusive=True, durable=True)
+        except pika.exceptions.ChannelClosedByBroker as e:
+            self._connection.close()
+            if self.__group and e.reply_code == 406:
+                raise ValueError(
+                    "subscription group %s already exists with different queue arguments than %r (backlogLength/backlogMinutes) - %s"
+                    % (self.__group, arguments or None, e.reply_text)
+                ) from e
+            logger.critical("error - mixing of priority queues and non-priority queues")
+            return
         except:  # noqa: E722 pylint: disable=bare-except
             self._connection.close()
             logger.critical("error - mixing of priority queues and non-priority queues")
             return
         self.__queue_name = result.method.queue
-        self._channel.basic_qos(prefetch_count=1)
+        if self.__group and result.method.message_count:
+            logger.info("Subscriber group %s starting with a backlog of %d messages", self.__group, result.method.message_count)
+        self._channel.basic_qos(prefetch_count=self.__prefetchCount)
+
+    def add_exchange(self, exchange, routingKeys=None, headers=None, matchAll=True):
+        """Bind the subscriber queue to exchange -
+
+        :param str exchange: exchange name
+        :param list routingKeys: topic patterns (e.g. "deposition.*.uploaded", "annotation.#") - binds to a topic exchange
+        :param dict headers: header values to match (None matches any value of the header) - binds to a headers exchange
+        :param bool matchAll: with headers, require all (True) or any (False) of the headers to match
+
+        Without routingKeys or headers every message published with publishDirect(message, exchange) is received.
 
-    def add_exchange(self, exchange):
+        """
         self.__exchanges.append(exchange)
-        self._channel.exchange_declare(exchange=exchange, exchange_type=self.__exchange_type, passive=False, durable=True)
-        self._channel.queue_bind(exchange=exchange, queue=self.__queue_name, routing_key=self.__routing_key)
+        if headers:
+            arguments = dict(headers)
+            arguments["x-match"] = "all" if matchAll else "any"
+            self._channel.exchange_declare(exchange=exchange, exchange_type="headers", passive=False, durable=True)
+            self._channel.queue_bind(exchange=exchange, queue=self.__queue_name, routing_key="", arguments=arguments)
+        elif routingKeys:
+            self._channel.exchange_declare(exchange=exchange, exchange_type="topic", passive=False, durable=True)
+            for routingKey in [routingKeys] if isinstance(routingKeys, str) else routingKeys:
+                self._channel.queue_bind(exchange=exchange, queue=self.__queue_name, routing_key=routingKey)
+        else:
+            self._channel.exchange_declare(exchange=exchange, exchange_type=self.__exchange_type, passive=False, durable=True)
+            self._channel.queue_bind(exchange=exchange, queue=self.__queue_name, routing_key=self.__routing_key)
+
+    def getQueueName(self):
+        return self.__queue_name
+
+    def setTracing(self, enabled=True):
+        """Call workerMethod as workerMethod(msgBody, deliveryTag=..., trace=TraceContext) (see MessageConsumerBase.setTracing())."""
+        self.__dispatcher.setTracing(enabled)
+        return True
+
+    def setProfiling(self, outputDir, everyN=0, slowSeconds=None, sampleInterval=0.05, maxFiles=20):
+        """Profile a sample of workerMethod calls into outputDir (see MessageConsumerBase.setProfiling())."""
+        profiler = MessageProfiler(outputDir, everyN=everyN, slowSeconds=slowSeconds, sampleInterval=sampleInterval, maxFiles=maxFiles, prefix="subscriber")
+        self.__dispatcher.setProfiler(profiler)
+        return True
 
     def run(self):
         if len(self.__exchanges) == 0:
             logger.info("error - no exchanges")
             return
 
+        self.__dispatcher.start(self._connection, self._channel, queueName=self.__queue_name)
         self._channel.basic_consume(queue=self.__queue_name, on_message_callback=self.onMessage)
-        self._channel.start_consuming()
+        try:
+            self._channel.start_consuming()
+        finally:
+            self.__dispatcher.shutdown()
 
     def workerMethod(self, msgBody, deliveryTag=None):
         raise exceptions.NotImplementedError
 
+    def workerSetup(self):
+        """Optional hook run once in the worker thread before it processes any message."""
+
+    def workerTeardown(self):
+        """Optional hook run once in the worker thread when the subscriber shuts down."""
+
     def connect(self):
         logger.info("Connecting to %s", self._url)
 
-        if self.local:
-            return pika.BlockingConnection(pika.ConnectionParameters("localhost"))
-
-        return pika.BlockingConnection(
-            pika.URLParameters(self._url),
-        )
+        return self.__transport.connect(url=self._url, local=self.local)
 
     def onChannelOpen(self, channel):
         logger.info("Channel opened")
         self._channel = channel
-        self._channel.basic_qos(prefetch_count=1)
+        self._channel.basic_qos(prefetch_count=self.__prefetchCount)
         self._channel.add_on_close_callback(self.onChannelClosed)
 
     def startConsuming(self):
@@ -103,20 +205,15 @@ class MessageSubscriberBase:
 
     def onMessage(self, unused_channel, basic_deliver, properties, body):  # noqa: ARG002
         logger.info("Received message # %s from %s: %s", basic_deliver.delivery_tag, properties.app_id, body)
-        try:
-            thread = threading.Thread(target=self.workerMethod, args=(body, basic_deliver.delivery_tag))
-            thread.start()
-            while thread.is_alive():
-                self._channel._connection.sleep(1.0)  # noqa: SLF001 pylint: disable=protected-access
-        except Exception as e:
-            logger.exception("Worker failing with exception")
-            logger.exception(e)
-        logging.info("Done task")
-        self.acknowledgeMessage(basic_deliver.delivery_tag)
-
-    def acknowledgeMessage(self, deliveryTag):
-        logger.info("Acknowledging message %s", deliveryTag)
-        self._channel.basic_ack(deliveryTag)
+        self.__dispatcher.dispatch(basic_deliver, properties, body)
+
+    def acknowledgeMessage(self, deliveryTag, multiple=False):
+        logger.info("Acknowledging message %s (multiple=%r)", deliveryTag, multiple)
+        self._channel.basic_ack(deliveryTag, multiple=multiple)
+
+    def rejectMessage(self, deliveryTag, requeue=False):
+        logger.info("Rejecting message %s (requeue=%r)", deliveryTag, requeue)
+        self._channel.basic_nack(deliveryTag, requeue=requeue)
 
     @staticmethod
     def onConnectionOpenError(*args, **kw):    # noqa: ARG002,ARG004 pylint: disable=unused-argument
@@ -0,0 +1,68 @@
+#
+# File: MessageTransport.py
+# Date:  19-Oct-2026
+#
+# Updates:
+##
+"""
+Transport layer providing broker connections to the publisher and consumers.
+
+A transport has a method connect(url=None, local=False, parameters=None), returning an object with the
+pika BlockingConnection interface, and a method connectAsync(loop, on_open_callback, on_open_error_callback=None,
+on_close_callback=None, url=None, local=False, parameters=None), returning a connection driven by the asyncio
+event loop with the callback style pika AsyncioConnection interface (used by AsyncMessageConsumerBase).
+PikaTransport, the default, connects to RabbitMQ.  InMemoryBroker implements the same interface within the
+process (see InMemoryBroker.py), so that the publish/consume flow can be tested and profiled without a
+broker or network.
+
+This software was developed as part of the World Wide Protein Data Bank
+Common Deposition and Annotation System Project
+
+"""
+
+__docformat__ = "restructuredtext en"
+__license__ = "Creative Commons Attribution 3.0 Unported"
+__version__ = "V0.07"
+
+import logging
+
+import pika
+from pika.adapters.asyncio_connection import AsyncioConnection
+
+logger = logging.getLogger()
+
+
+class PikaTransport:
+    """Connections to a RabbitMQ broker with pika.BlockingConnection or pika AsyncioConnection."""
+
+    @staticmethod
+    def connect(url=None, local=False, parameters=None):
+        """Open a connection -
+
+        :param str url: AMQP url of the broker
+        :param bool local: connect to a broker on localhost (overrides url)
+        :param parameters: pika connection parameters (overrides url and local)
+
+        """
+        if parameters is None:
+            parameters = pika.ConnectionParameters("localhost") if local else pika.URLParameters(url)
+        return pika.BlockingConnection(parameters)
+
+    @staticmethod
+    def connectAsync(loop, on_open_callback, on_open_error_callback=None, on_close_callback=None, url=None, local=False, parameters=None):
+        """Open a connection driven by an asyncio event loop -
+
+        :param loop: asyncio event loop running the connection and its callbacks
+        :param on_open_callback: called with the connection once it is open
+        :param on_open_error_callback: called with the connection and the error if it cannot be opened
+        :param on_close_callback: called with the connection and the reason when it closes
+        :param str url: AMQP url of the broker
+        :param bool local: connect to a broker on localhost (overrides url)
+        :param parameters: pika connection parameters (overrides url and local)
+
+        """
+        if parameters is None:
+            parameters = pika.ConnectionParameters("localhost") if local else pika.URLParameters(url)
+        return AsyncioConnection(
+            parameters, on_open_callback=on_open_callback, on_open_error_callback=on_open_error_callback, on_close_callback=on_close_callback, custom_ioloop=loop
+        )
@@ -0,0 +1,190 @@
+#
+# File: RpcClient.py
+# Date:  19-Oct-2026
+#
+# Updates:
+##
+"""
+Request/reply client using RabbitMQ direct reply-to.
+
+Requests are published to the work queue of an RpcServer with reply_to set to the amq.rabbitmq.reply-to
+pseudo-queue, so no reply queue is declared per request.  A single connection, serviced by a background
+I/O thread, carries any number of concurrent calls; replies are matched to their callers by correlation id.
+
+    client = RpcClient(local=True)
+    reply = client.call("request body", "rpc_queue", timeout=10.0)
+    futures = [client.callAsync(body, "rpc_queue") for body in bodies]
+    client.close()
+
+This software was developed as part of the World Wide Protein Data Bank
+Common Deposition and Annotation System Project
+
+"""
+
+__docformat__ = "restructuredtext en"
+__license__ = "Creative Commons Attribution 3.0 Unported"
+__version__ = "V0.07"
+
+import functools
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+
+import pika
+
+from wwpdb.utils.message_queue.MessageQueueConnection import MessageQueueConnection
+from wwpdb.utils.message_queue.MessageTransport import PikaTransport
+
+logger = logging.getLogger()
+
+REPLY_TO = "amq.rabbitmq.reply-to"
+
+
+class RpcError(Exception):
+    """The server's workerMethod raised an exception for the request."""
+
+
+class RpcClient:
+    """Call RpcServer consumers and wait for their replies -
+
+    :param str amqpUrl: AMQP url of the broker (default connection parameters of MessageQueueConnection)
+    :param bool local: connect to a broker on localhost
+    :param transport: transport providing the connection (default PikaTransport, see MessageTransport.py)
+
+    """
+
+    def __init__(self, amqpUrl=None, local=False, transport=None):
+        self.__url = amqpUrl
+        self.__local = local
+        self.__transport = transport if transport is not None else PikaTransport()
+        self.__connection = None
+        self.__channel = None
+        self.__thread = None
+        self.__lock = threading.Lock()
+        self.__ready = threading.Event()
+        self.__closing = False
+        self.__startError = None
+        # correlation id -> (future, timer), used on the I/O thread only
+        self.__pending = {}
+
+    def call(self, message, queueName, timeout=30.0, exchangeName="", headers=None):
+        """Send a request and wait for the reply -
+
+        :param message: request body (str or bytes)
+        :param str queueName: routing key of the request - the work queue of the server for the default exchange
+        :param float timeout: seconds to wait for the reply.  The request expires unprocessed after this time.
+        :param str exchangeName: exchange to publish the request to (default "", routing by queue name)
+        :param dict headers: additional message headers
+
+        :returns: reply body (bytes)
+        :raises TimeoutError: no reply within timeout seconds
+        :raises RpcError: the server's workerMethod raised an exception
+
+        """
+        return self.callAsync(message, queueName, timeout=timeout, exchangeName=exchangeName, headers=headers).result()
+
+    def callAsync(self, message, queueName, timeout=30.0, exchangeName="", headers=None):
+        """Send a request and return a concurrent.futures.Future for the reply body (see call())."""
+        self.start()
+        future = Future()
+        future.set_running_or_notify_cancel()
+        try:
+            self.__connection.add_callback_threadsafe(functools.partial(self.__send, future, message, queueName, timeout, exchangeName, headers))
+        except pika.exceptions.ConnectionWrongStateError as exc:
+            future.set_exception(exc)
+        return future
+
+    def start(self):
+        """Connect and start the I/O thread (called by the first request)."""
+        with self.__lock:
+            if self.__thread is None:
+                self.__closing = False
+                self.__ready.clear()
+                self.__startError = None
+                self.__thread = threading.Thread(target=self.__run, name="RpcClientIO", daemon=True)
+                self.__thread.start()
+        self.__ready.wait()
+        if self.__startError is not None:
+            with self.__lock:
+                self.__thread = None
+            raise self.__startError
+
+    def close(self):
+        """Stop the I/O thread and close the connection.  Calls still waiting fail with ConnectionError."""
+        with self.__lock:
+            thread = self.__thread
+            self.__thread = None
+            self.__closing = True
+        if thread is None:
+            return
+        try:
+            self.__connection.add_callback_threadsafe(lambda: None)
+        except pika.exceptions.ConnectionWrongStateError:
+            pass
+        thread.join()
+
+    def __connect(self):
+        if self.__local:
+            return self.__transport.connect(local=True)
+        if self.__url:
+            return self.__transport.connect(url=self.__url)
+        mqc = MessageQueueConnection()
+        parameters = mqc._getDefaultConnectionParameters()  # noqa: SLF001 pylint: disable=protected-access
+        return self.__transport.connect(parameters=parameters)
+
+    def __run(self):
+        """I/O thread - owns the connection, publishes requests and receives replies."""
+        try:
+            self.__connection = self.__connect()
+            self.__channel = self.__connection.channel()
+            self.__channel.basic_consume(queue=REPLY_TO, on_message_callback=self.__onReply, auto_ack=True)
+        except Exception as exc:  # noqa: BLE001
+            logger.exception("RPC client connection failing")
+            self.__startError = exc
+            self.__ready.set()
+            return
+        self.__ready.set()
+        try:
+            while not self.__closing and self.__connection.is_open:
+                self.__connection.process_data_events(time_limit=1)
+        except Exception:
+            logger.exception("RPC client connection failing")
+        finally:
+            for future, _timer in self.__pending.values():
+                future.set_exception(ConnectionError("RPC client closed before the reply arrived"))
+            self.__pending.clear()
+            if self.__connection.is_open:
+                self.__connection.close()
+
+    def __send(self, future, message, queueName, timeout, exchangeName, headers):
+        correlationId = uuid.uuid4().hex
+        headers = dict(headers or {})
+        headers["x-rpc-deadline"] = int((time.time() + timeout) * 1000)
+        properties = pika.BasicProperties(reply_to=REPLY_TO, correlation_id=correlationId, expiration=str(max(1, int(timeout * 1000))), headers=headers)
+        try:
+            self.__channel.basic_publish(exchange=exchangeName, routing_key=queueName, body=message, properties=properties)
+        except Exception as exc:  # noqa: BLE001
+            future.set_exception(exc)
+            return
+        timer = self.__connection.call_later(timeout, functools.partial(self.__onTimeout, correlationId, timeout))
+        self.__pending[correlationId] = (future, timer)
+
+    def __onReply(self, channel, method, properties, body):  # noqa: ARG002 pylint: disable=unused-argument
+        entry = self.__pending.pop(properties.correlation_id, None)
+        if entry is None:
+            logger.info("Ignoring late or unknown reply %s", properties.correlation_id)
+            return
+        future, timer = entry
+        self.__connection.remove_timeout(timer)
+        error = (properties.headers or {}).get("x-rpc-error")
+        if error is not None:
+            future.set_exception(RpcError(error))
+        else:
+            future.set_result(body)
+
+    def __onTimeout(self, correlationId, timeout):
+        entry = self.__pending.pop(correlationId, None)
+        if entry is not None:
+            entry[0].set_exception(TimeoutError("No reply within %.1f seconds" % timeout))
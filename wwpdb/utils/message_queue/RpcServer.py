@@ -0,0 +1,82 @@
+#
+# File: RpcServer.py
+# Date:  19-Oct-2026
+#
+# Updates:
+#  19-Oct-2026       acknowledge failed requests once the error reply is sent; no batch mode
+##
+"""
+Consumer base class answering RpcClient requests.
+
+Subclasses implement workerMethod(msgBody, deliveryTag) as for MessageConsumerBase; its return value
+(bytes, str, or None for an empty reply) is published to the reply_to address of the request with the
+request's correlation id.  If workerMethod raises, the reply carries the error in its x-rpc-error header
+and RpcClient.call() raises RpcError; the request is then acknowledged, not retried (setRetryPolicy()) or
+rejected (setRejectFailed()), so that the caller gets exactly one reply.  Requests whose caller has already
+timed out are acknowledged without calling workerMethod.  Batch mode is not supported, as each request needs
+its own reply.
+
+    class EchoServer(RpcServer):
+        def workerMethod(self, msgBody, deliveryTag=None):
+            return msgBody
+
+    server = EchoServer(amqpUrl)
+    server.setQueue("rpc_queue", None)
+    server.setExecutionMode("thread", numWorkers=4)
+    server.run()
+
+This software was developed as part of the World Wide Protein Data Bank
+Common Deposition and Annotation System Project
+
+"""
+
+__docformat__ = "restructuredtext en"
+__license__ = "Creative Commons Attribution 3.0 Unported"
+__version__ = "V0.07"
+
+import logging
+import time
+
+import pika
+
+from wwpdb.utils.message_queue.MessageConsumerBase import MessageConsumerBase
+
+logger = logging.getLogger()
+
+
+class RpcServer(MessageConsumerBase):
+    """Message consumer replying to each request with the result of workerMethod (see MessageConsumerBase)."""
+
+    def onMessage(self, unused_channel, basic_deliver, properties, body):
+        deadline = (properties.headers or {}).get("x-rpc-deadline")
+        if deadline is not None and time.time() * 1000 > deadline:
+            logger.info("Skipping expired request %s", properties.correlation_id)
+            self.acknowledgeMessage(basic_deliver.delivery_tag)
+            return
+        super().onMessage(unused_channel, basic_deliver, properties, body)
+
+    def setBatch(self, batchSize, batchWaitMs=100):  # noqa: ARG002
+        logger.error("Batch mode is not supported by RpcServer")
+        return False
+
+    def workerCompleted(self, properties, result, exc):
+        """Publish the reply to the request (connection thread).  Returns True once an error reply is sent."""
+        if not properties.reply_to:
+            return False
+        headers = None
+        if exc is not None:
+            body = b""
+            headers = {"x-rpc-error": repr(exc)}
+        elif result is None:
+            body = b""
+        elif isinstance(result, (bytes, str)):
+            body = result
+        else:
+            body = str(result)
+        self._channel.basic_publish(
+            exchange="",
+            routing_key=properties.reply_to,
+            body=body,
+            properties=pika.BasicProperties(correlation_id=properties.correlation_id, headers=headers),
+        )
+        return exc is not None
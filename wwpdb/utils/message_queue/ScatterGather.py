@@ -0,0 +1,158 @@
+#
+# File: ScatterGather.py
+# Date:  19-Oct-2026
+#
+# Updates:
+##
+"""
+Scatter-gather of a job split into subtasks across RpcServer consumers.
+
+scatter() publishes one request per subtask through an RpcClient, all carrying the job id (x-job-id) and
+the subtask index and count (x-task-index, x-task-count) as headers.  Replies are collected by a
+ScatterGatherJob as they arrive: onResult is called for each finished subtask (partial results), and
+onComplete once every subtask has a result, an error or has timed out.
+
+    sg = ScatterGather(RpcClient(local=True))
+    job = sg.scatter(chainRequests, "validation_chain_queue", timeout=600.0, onResult=reportProgress)
+    job.wait()
+    results, errors = job.getResults(), job.getErrors()
+
+Callbacks run on the I/O thread of the RpcClient and must return quickly without making further calls on it.
+
+This software was developed as part of the World Wide Protein Data Bank
+Common Deposition and Annotation System Project
+
+"""
+
+__docformat__ = "restructuredtext en"
+__license__ = "Creative Commons Attribution 3.0 Unported"
+__version__ = "V0.07"
+
+import functools
+import logging
+import threading
+import uuid
+
+logger = logging.getLogger()
+
+
+class ScatterGatherJob:
+    """Results of a scattered job -
+
+    :param str jobId: job identifier
+    :param int numTasks: number of subtasks
+    :param onResult: callable onResult(job, index, result, exc) run as each subtask finishes
+    :param onComplete: callable onComplete(job) run once all subtasks have finished
+
+    """
+
+    def __init__(self, jobId, numTasks, onResult=None, onComplete=None):
+        self.__jobId = jobId
+        self.__numTasks = numTasks
+        self.__onResult = onResult
+        self.__onComplete = onComplete
+        self.__lock = threading.Lock()
+        self.__done = threading.Event()
+        self.__results = [None] * numTasks
+        self.__errors = {}
+        self.__numFinished = 0
+        if numTasks == 0:
+            self.__finish()
+
+    def getJobId(self):
+        return self.__jobId
+
+    def getNumTasks(self):
+        return self.__numTasks
+
+    def getNumFinished(self):
+        with self.__lock:
+            return self.__numFinished
+
+    def isDone(self):
+        return self.__done.is_set()
+
+    def wait(self, timeout=None):
+        """Wait for all subtasks to finish.  Returns True if the job is done."""
+        return self.__done.wait(timeout)
+
+    def getResults(self):
+        """Reply bodies by subtask index (None for subtasks that failed or timed out)."""
+        with self.__lock:
+            return list(self.__results)
+
+    def getErrors(self):
+        """Exceptions (RpcError, TimeoutError, ...) by subtask index."""
+        with self.__lock:
+            return dict(self.__errors)
+
+    def setResult(self, index, result=None, exc=None):
+        """Record the outcome of subtask index (called by ScatterGather)."""
+        with self.__lock:
+            if exc is None:
+                self.__results[index] = result
+            else:
+                self.__errors[index] = exc
+            self.__numFinished += 1
+            finished = self.__numFinished == self.__numTasks
+        if self.__onResult is not None:
+            try:
+                self.__onResult(self, index, result, exc)
+            except Exception:
+                logger.exception("Result callback failing for job %s task %d", self.__jobId, index)
+        if finished:
+            self.__finish()
+
+    def __finish(self):
+        logger.info("Job %s complete - %d tasks, %d failed", self.__jobId, self.__numTasks, len(self.__errors))
+        self.__done.set()
+        if self.__onComplete is not None:
+            try:
+                self.__onComplete(self)
+            except Exception:
+                logger.exception("Completion callback failing for job %s", self.__jobId)
+
+
+class ScatterGather:
+    """Fan subtasks out to RpcServer consumers and aggregate their replies -
+
+    :param rpcClient: RpcClient used to send the subtasks and receive the replies
+
+    """
+
+    def __init__(self, rpcClient):
+        self.__rpcClient = rpcClient
+
+    def scatter(self, messages, queueName, timeout=300.0, onResult=None, onComplete=None, jobId=None, exchangeName="", headers=None):
+        """Publish one subtask per message and return the ScatterGatherJob collecting the replies -
+
+        :param messages: subtask request bodies
+        :param str queueName: work queue (routing key) of the consumers
+        :param float timeout: seconds allowed for the whole job - unfinished subtasks then fail with TimeoutError
+        :param onResult: callable onResult(job, index, result, exc) run as each subtask finishes
+        :param onComplete: callable onComplete(job) run once all subtasks have finished
+        :param str jobId: job identifier (default a new uuid)
+        :param str exchangeName: exchange to publish to (default "", routing by queue name)
+        :param dict headers: additional headers for every subtask
+
+        """
+        messages = list(messages)
+        job = ScatterGatherJob(jobId or uuid.uuid4().hex, len(messages), onResult=onResult, onComplete=onComplete)
+        logger.info("Scattering job %s as %d tasks to %s", job.getJobId(), len(messages), queueName)
+        for index, message in enumerate(messages):
+            taskHeaders = dict(headers or {})
+            taskHeaders.update({"x-job-id": job.getJobId(), "x-task-index": index, "x-task-count": len(messages)})
+            future = self.__rpcClient.callAsync(message, queueName, timeout=timeout, exchangeName=exchangeName, headers=taskHeaders)
+            future.add_done_callback(functools.partial(self.__onTaskDone, job, index))
+        return job
+
+    def gather(self, messages, queueName, timeout=300.0, **kwargs):
+        """scatter() the messages and wait for the job - returns the finished ScatterGatherJob."""
+        job = self.scatter(messages, queueName, timeout=timeout, **kwargs)
+        job.wait()
+        return job
+
+    @staticmethod
+    def __onTaskDone(job, index, future):
+        exc = future.exception()
+        job.setResult(index, None if exc is not None else future.result(), exc)
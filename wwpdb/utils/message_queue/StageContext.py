@@ -0,0 +1,85 @@
+#
+# File: StageContext.py
+# Date:  19-Oct-2026
+#
+# Updates:
+#  19-Oct-2026       carry the trace of the input message into downstream publishes
+##
+"""
+Context passed to workerMethod in pipeline stage mode (see MessageConsumerBase.setPipelineStage()).
+
+A stage hands its output to the next stage with context.publish(), which uses the consumer's own broker
+connection and channel instead of a new MessagePublisher connection per message.  In thread mode the
+publish is passed to the connection thread with add_callback_threadsafe() at once; in process mode it is
+buffered in the worker process and carried out on the connection thread when workerMethod returns.  Either
+way all publishes of a message are made before its delivery is acknowledged, and a failed (or, with
+confirms, unconfirmed) publish requeues the input message instead of acknowledging it.  Downstream
+messages continue the trace of the input message (context.trace, see TraceContext.py).
+
+This software was developed as part of the World Wide Protein Data Bank
+Common Deposition and Annotation System Project
+
+"""
+
+__docformat__ = "restructuredtext en"
+__license__ = "Creative Commons Attribution 3.0 Unported"
+__version__ = "V0.07"
+
+import logging
+
+import pika
+
+from wwpdb.utils.message_queue.TraceContext import stampHeaders
+
+logger = logging.getLogger()
+
+
+class StageContext:
+    """Downstream publishing for one workerMethod call -
+
+    :param int deliveryTag: delivery tag of the input message
+    :param properties: properties of the input message (pika.BasicProperties)
+    :param publishFn: callable publishFn(context, item) passing a publish to the connection thread,
+                      or None to buffer publishes (process mode)
+    :param trace: TraceContext of the input message
+
+    """
+
+    def __init__(self, deliveryTag, properties, publishFn=None, trace=None):
+        self.deliveryTag = deliveryTag
+        self.properties = properties
+        self.trace = trace
+        self.__publishFn = publishFn
+        self.__buffer = []
+        self.closed = False
+        self.failed = False
+        self.numPublished = 0
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_StageContext__publishFn"] = None
+        return state
+
+    def publish(self, message, routingKey, exchangeName="", headers=None, priority=None, deliveryMode=2):
+        """Publish a message to the next stage -
+
+        :param message: message body (str or bytes)
+        :param str routingKey: routing key - the queue name of the next stage for the default exchange
+        :param str exchangeName: exchange (default "", routing by queue name)
+        :param dict headers: message headers
+        :param int priority: message priority
+        :param int deliveryMode: 2 for persistent messages
+
+        """
+        headers, timestamp = stampHeaders(headers, parent=self.trace)
+        item = (exchangeName, routingKey, message, pika.BasicProperties(delivery_mode=deliveryMode, priority=priority, timestamp=timestamp, headers=headers))
+        if self.__publishFn is None:
+            self.__buffer.append(item)
+        else:
+            self.__publishFn(self, item)
+        return True
+
+    def takeBuffered(self):
+        """Remove and return the buffered publishes (exchange, routingKey, body, properties)."""
+        buffered, self.__buffer = self.__buffer, []
+        return buffered
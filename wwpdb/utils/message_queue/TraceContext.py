@@ -0,0 +1,104 @@
+#
+# File: TraceContext.py
+# Date:  19-Oct-2026
+#
+# Updates:
+##
+"""
+Trace context carried in message headers for following a message across the stages of a pipeline.
+
+Publishers stamp each message with the publish time - the AMQP timestamp property (seconds) and an
+x-published-ms header (milliseconds) - and a W3C traceparent header "00-<trace id>-<span id>-01", where the
+span id identifies this message and the trace id the chain of messages it belongs to.  A message
+published from a worker with the trace of its input (MessagePublisher.publish(..., trace=trace) or
+StageContext.publish()) gets a new span id under the same trace id.
+
+On delivery the dispatcher recovers the trace with TraceContext.fromProperties(), records the time
+spent in the queue (publish to worker start) and the worker time against the trace id, so the latency
+of a job can be broken down per hop.
+
+This software was developed as part of the World Wide Protein Data Bank
+Common Deposition and Annotation System Project
+
+"""
+
+__docformat__ = "restructuredtext en"
+__license__ = "Creative Commons Attribution 3.0 Unported"
+__version__ = "V0.07"
+
+import logging
+import os
+import re
+import time
+
+logger = logging.getLogger()
+
+TRACE_HEADER = "traceparent"
+PUBLISHED_HEADER = "x-published-ms"
+
+_TRACEPARENT_RE = re.compile(r"^[0-9a-f]{2}-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+
+
+class TraceContext:
+    """Trace and span identifiers of a message -
+
+    :param str traceId: 32 hex digit trace id (default a new trace)
+    :param str spanId: 16 hex digit span id of the message (default a new span)
+    :param str parentSpanId: span id of the message this one was published from, if known
+    :param int publishedMs: publish time of the message in epoch milliseconds, if known
+
+    """
+
+    def __init__(self, traceId=None, spanId=None, parentSpanId=None, publishedMs=None):
+        self.traceId = traceId or os.urandom(16).hex()
+        self.spanId = spanId or os.urandom(8).hex()
+        self.parentSpanId = parentSpanId
+        self.publishedMs = publishedMs
+
+    def __repr__(self):
+        return "TraceContext(%s)" % self.toHeader()
+
+    @classmethod
+    def fromProperties(cls, properties):
+        """Return the trace context of a delivered message (a new trace if it carries none)."""
+        headers = (properties.headers if properties is not None else None) or {}
+        publishedMs = headers.get(PUBLISHED_HEADER)
+        if publishedMs is None and properties is not None and properties.timestamp:
+            publishedMs = properties.timestamp * 1000
+        traceparent = headers.get(TRACE_HEADER)
+        if isinstance(traceparent, bytes):
+            traceparent = traceparent.decode("ascii", "replace")
+        match = _TRACEPARENT_RE.match(traceparent) if isinstance(traceparent, str) else None
+        if match is None:
+            return cls(publishedMs=publishedMs)
+        return cls(traceId=match.group(1), spanId=match.group(2), publishedMs=publishedMs)
+
+    def child(self):
+        """Return the context for a message published from the one carrying this context."""
+        return TraceContext(traceId=self.traceId, parentSpanId=self.spanId)
+
+    def toHeader(self):
+        """Return the traceparent header value."""
+        return "00-%s-%s-01" % (self.traceId, self.spanId)
+
+    def getQueueWait(self, now=None):
+        """Seconds since the message was published, or None if the publish time is unknown."""
+        if self.publishedMs is None:
+            return None
+        return max(0.0, (time.time() if now is None else now) - self.publishedMs / 1000.0)
+
+
+def stampHeaders(headers=None, parent=None):
+    """Return (headers, timestamp) for a message being published now -
+
+    :param dict headers: message headers, copied and extended with the traceparent and x-published-ms headers
+    :param parent: TraceContext of the message being worked on, or None to start a new trace
+    :return: the headers and the AMQP timestamp property (epoch seconds)
+
+    """
+    nowMs = int(time.time() * 1000)
+    trace = parent.child() if parent is not None else TraceContext()
+    stamped = dict(headers) if headers else {}
+    stamped[TRACE_HEADER] = trace.toHeader()
+    stamped[PUBLISHED_HEADER] = nowMs
+    return stamped, nowMs // 1000